@@ -8,6 +8,12 @@ def create_app():
     from . import db
     db.init_app(app)
 
+    from . import cache
+    cache.init_app(app)
+
+    from . import snapshot
+    snapshot.init_app(app)
+
     from . import routes
     app.register_blueprint(routes.api_bp) # Register the API blueprint
     app.register_blueprint(routes.main_bp) # Register the main page blueprint
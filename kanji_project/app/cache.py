@@ -0,0 +1,111 @@
+import threading
+from collections import OrderedDict
+
+from flask import current_app
+
+from . import db
+
+# Sentinel for cache misses, so that None (e.g. "kanji not found") can be cached too.
+MISSING = object()
+
+class LRUCache:
+    """A thread-safe, size-bounded least-recently-used cache with hit/miss/eviction counters.
+
+    The cache is tied to a data generation (see db.get_data_generation()); calling
+    sync() with a different generation drops every entry. get() and put() take
+    the generation of the caller's request too: a value is only stored if it was
+    computed from the generation the cache holds, and only returned to a request
+    of that same generation. A slow request that read the old database therefore
+    cannot put its value back after the cache moved to the new one, nor be served
+    values of the new one, whatever the order in which requests call sync().
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.generation = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def sync(self, generation):
+        """Clears the cache if 'generation' differs from the one its entries were built from."""
+        if generation == self.generation:
+            return
+        with self._lock:
+            if generation != self.generation:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self.generation = generation
+
+    def get(self, key, generation, default=MISSING):
+        with self._lock:
+            if generation != self.generation:
+                self.misses += 1
+                return default
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, generation):
+        """Stores 'value', computed from the database of 'generation'; dropped if that is not the cache's."""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+def get_cache(name):
+    """Returns the named cache of the current app, emptied first if the database has changed."""
+    cache = current_app.extensions['kanji_caches'][name]
+    cache.sync(db.get_data_generation())
+    return cache
+
+def cached(name, key, loader):
+    """Returns the cached value for 'key', computing and storing it with loader() on a miss."""
+    cache = get_cache(name)
+    # The generation this request reads (memoized per request, like its connection's).
+    generation = db.get_data_generation()
+    value = cache.get(key, generation)
+    if value is MISSING:
+        value = loader()
+        cache.put(key, value, generation)
+    return value
+
+def all_stats():
+    return {name: cache.stats() for name, cache in current_app.extensions['kanji_caches'].items()}
+
+def init_app(app):
+    """Creates the per-app caches. Sizes come from the KANJI_CACHE_SIZE and SEARCH_CACHE_SIZE settings."""
+    app.extensions['kanji_caches'] = {
+        'kanji': LRUCache(app.config['KANJI_CACHE_SIZE']),
+        'search': LRUCache(app.config['SEARCH_CACHE_SIZE']),
+    }
@@ -1,7 +1,10 @@
 import sqlite3
 import pathlib
-import os # os is needed if DATABASE_PATH construction relies on it, but pathlib is preferred.
-from flask import current_app, g
+import os
+import threading
+from flask import g, has_app_context
+
+from . import migrations
 
 # Define Paths using pathlib for robustness
 # Assuming this db.py is in 'kanji_project/app/'
@@ -10,37 +13,143 @@ APP_DIR = pathlib.Path(__file__).resolve().parent
 BASE_PROJECT_DIR = APP_DIR.parent # This should point to kanji_project
 DATABASE_PATH = BASE_PROJECT_DIR / "kanji.db"
 
-def get_db_connection():
-    """Establishes a connection to the SQLite database."""
-    if not DATABASE_PATH.exists():
-        raise FileNotFoundError(f"Database file not found at {DATABASE_PATH}")
-    conn = sqlite3.connect(str(DATABASE_PATH)) # Ensure DATABASE_PATH is a string for connect
-    conn.row_factory = sqlite3.Row # Optional: to access columns by name
+# One read-only connection per thread (see get_db()).
+_local = threading.local()
+
+# (generation, data_version) pair memoized by get_data_version().
+_data_version = (None, None)
+
+# Connection settings, filled from the app config by init_app().
+_settings = {
+    'immutable': False,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_kib': 16 * 1024,
+    'cached_statements': 256,
+}
+
+def get_data_generation():
+    """Returns a value that changes whenever the database file is rewritten or replaced.
+
+    It is built from the file's inode, modification time and size, so checking it
+    costs a stat() call but no SQLite work. Within a request the value is computed
+    once and reused. Returns None if the file does not exist.
+    """
+    in_context = has_app_context()
+    if in_context and '_data_generation' in g:
+        return g._data_generation
+    try:
+        stat_result = os.stat(DATABASE_PATH)
+        generation = (stat_result.st_ino, stat_result.st_mtime_ns, stat_result.st_size)
+    except FileNotFoundError:
+        generation = None
+    if in_context:
+        g._data_generation = generation
+    return generation
+
+def get_data_version():
+    """Returns the 'data_version' stamp written by init_db.py, used to build HTTP ETags.
+
+    The stamp is read once per data generation, so repeated calls cost a stat()
+    rather than a query. Databases without a stamp get one derived from the
+    generation itself.
+    """
+    global _data_version
+    generation = get_data_generation()
+    cached_generation, data_version = _data_version
+    if generation == cached_generation:
+        return data_version
+    data_version = None
+    if generation is not None:
+        try:
+            row = get_db().execute("SELECT value FROM dataset_meta WHERE key = 'data_version'").fetchone()
+            data_version = row['value'] if row else None
+        except sqlite3.OperationalError:
+            pass # 'dataset_meta' is missing: the database predates it.
+        if data_version is None:
+            data_version = '{:x}-{:x}-{:x}'.format(*generation)
+    _data_version = (generation, data_version)
+    return data_version
+
+def _open_connection():
+    """Opens a read-only connection to the database with the serving pragmas applied."""
+    uri = f"{DATABASE_PATH.as_uri()}?mode=ro"
+    if _settings['immutable']:
+        # Tells SQLite the file cannot change: no locking and no change detection.
+        # Only safe when the file is replaced rather than written in place.
+        uri += "&immutable=1"
+    conn = sqlite3.connect(
+        uri,
+        uri=True,
+        detect_types=sqlite3.PARSE_DECLTYPES,
+        cached_statements=_settings['cached_statements'],
+    )
+    conn.row_factory = sqlite3.Row # Allows accessing columns by name
+    conn.execute("PRAGMA query_only = ON")
+    conn.execute(f"PRAGMA mmap_size = {int(_settings['mmap_size'])}")
+    conn.execute(f"PRAGMA cache_size = -{int(_settings['cache_kib'])}")
+    conn.execute("PRAGMA temp_store = MEMORY")
     return conn
 
 def get_db():
-    """Opens a new database connection if there is none yet for the current application context."""
-    if 'db' not in g:
-        db_path = get_db_path()
-        g.db = sqlite3.connect(
-            db_path,
-            detect_types=sqlite3.PARSE_DECLTYPES
-        )
-        g.db.row_factory = sqlite3.Row # Allows accessing columns by name
-    return g.db
+    """Returns this thread's read-only connection, opening or reopening it as needed.
+
+    Each WSGI worker thread keeps one connection for its lifetime instead of
+    connecting per request. The connection is reopened when the database file
+    changes (see get_data_generation()) and after a fork, since SQLite
+    connections must not be shared between processes.
+    """
+    generation = get_data_generation()
+    if generation is None:
+        raise FileNotFoundError(f"Database file not found at {DATABASE_PATH}")
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.generation == generation and _local.pid == os.getpid():
+        return conn
+    close_thread_connection()
+    _local.conn = _open_connection()
+    _local.generation = generation
+    _local.pid = os.getpid()
+    return _local.conn
 
-def close_db(e=None):
-    """Closes the database connection."""
-    db = g.pop('db', None)
-    if db is not None:
-        db.close()
+def close_thread_connection():
+    """Closes the current thread's connection, if any."""
+    conn = getattr(_local, 'conn', None)
+    _local.conn = None
+    if conn is not None and _local.pid == os.getpid():
+        conn.close()
 
 def init_app(app):
     """Register database functions with the Flask app. This is called by the application factory."""
-    app.teardown_appcontext(close_db)
+    _settings.update(
+        immutable=app.config['KANJI_DB_IMMUTABLE'],
+        mmap_size=app.config['KANJI_DB_MMAP_SIZE'],
+        cache_kib=app.config['KANJI_DB_CACHE_KIB'],
+        cached_statements=app.config['KANJI_DB_CACHED_STATEMENTS'],
+    )
+    warn_if_schema_outdated(app)
     # app.cli.add_command(init_db_command) # If you want a CLI command 'flask init-db'
     # For now, init_db.py script is used manually.
 
+def warn_if_schema_outdated(app):
+    """Logs a warning if kanji.db lacks schema migrations this code expects.
+
+    The app only reads the database, so it cannot migrate it; init_db.py does.
+    """
+    if not os.path.exists(DATABASE_PATH):
+        return
+    try:
+        conn = _open_connection()
+    except sqlite3.Error:
+        return
+    try:
+        schema_version = migrations.get_schema_version(conn)
+    finally:
+        conn.close()
+    if schema_version < migrations.LATEST_VERSION:
+        app.logger.warning(
+            "kanji.db is at schema version %d, but version %d is expected; run scripts/init_db.py to migrate it.",
+            schema_version, migrations.LATEST_VERSION,
+        )
+
 # Optional: If you want a CLI command to initialize the DB (requires init_db.py logic here)
 # def init_db():
 #     db = get_db()
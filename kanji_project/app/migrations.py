@@ -0,0 +1,158 @@
+"""Versioned schema migrations for kanji.db.
+
+Each migration is a (version, description, statements) entry in MIGRATIONS,
+applied in order and recorded in the 'schema_version' table, so an existing
+database gains new tables and indexes the next time scripts/init_db.py runs.
+The app uses the same list to warn when it is serving an outdated database.
+
+Like payloads.py, this module has no Flask dependency. Migrations are
+append-only: never edit one that has shipped, add a new version instead.
+"""
+import sqlite3
+
+MIGRATIONS = [
+    (1, "Base schema", [
+        # Kanji characters and their readings.
+        """
+        CREATE TABLE IF NOT EXISTS kanjis (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kanji_char TEXT UNIQUE NOT NULL,
+            unicode TEXT UNIQUE NOT NULL,
+            meanings TEXT,
+            kun_readings TEXT,
+            on_readings TEXT,
+            stroke_count INTEGER,
+            grade INTEGER,
+            jlpt_level INTEGER,
+            svg_filename TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS example_words (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            word TEXT NOT NULL,
+            reading TEXT NOT NULL,
+            meaning_es TEXT NOT NULL,
+            jlpt_level_word INTEGER,
+            UNIQUE(word, reading, meaning_es)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS kanji_example_word_assoc (
+            kanji_id INTEGER NOT NULL,
+            word_id INTEGER NOT NULL,
+            PRIMARY KEY (kanji_id, word_id),
+            FOREIGN KEY (kanji_id) REFERENCES kanjis (id) ON DELETE CASCADE,
+            FOREIGN KEY (word_id) REFERENCES example_words (id) ON DELETE CASCADE
+        )
+        """,
+        # Full-text index, one row per kanji (rowid = kanjis.id). The trigram
+        # tokenizer lets MATCH do substring lookups on Japanese text, which has
+        # no word boundaries for the default tokenizer to split on.
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS kanji_search USING fts5(
+            kanji_char,
+            meanings,
+            kun_readings,
+            on_readings,
+            example_words,
+            tokenize = 'trigram'
+        )
+        """,
+        # The final /api/kanji/<char> JSON, translated and serialized.
+        """
+        CREATE TABLE IF NOT EXISTS kanji_payload (
+            kanji_id INTEGER PRIMARY KEY,
+            kanji_char TEXT UNIQUE NOT NULL,
+            payload TEXT NOT NULL,
+            FOREIGN KEY (kanji_id) REFERENCES kanjis (id) ON DELETE CASCADE
+        )
+        """,
+        # Hash of the source record each kanji was last loaded from.
+        """
+        CREATE TABLE IF NOT EXISTS kanji_record_hash (
+            kanji_id INTEGER PRIMARY KEY,
+            content_hash TEXT NOT NULL,
+            FOREIGN KEY (kanji_id) REFERENCES kanjis (id) ON DELETE CASCADE
+        )
+        """,
+        # Key/value facts about the loaded data, such as the 'data_version'
+        # stamp the app uses for its HTTP ETags.
+        """
+        CREATE TABLE IF NOT EXISTS dataset_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+        """,
+    ]),
+    (2, "Index example word associations by word", [
+        # The primary key only serves kanji -> words lookups. Finding the kanjis
+        # of a word (orphan cleanup, cascading deletes) otherwise scans the table.
+        "CREATE INDEX IF NOT EXISTS idx_kanji_example_word_assoc_word_id ON kanji_example_word_assoc (word_id)",
+    ]),
+    (3, "Index one- and two-character search terms", [
+        # One row per kanji (rowid = kanjis.id) listing the tokens of every short
+        # substring of its 'kanji_search' text (see app/search_grams.py). Only
+        # the index is stored (content = ''), without positions (detail = none):
+        # a short term is answered by rowid alone.
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS kanji_search_short USING fts5(
+            grams,
+            content = '',
+            detail = none,
+            tokenize = 'ascii'
+        )
+        """,
+    ]),
+    (4, "Hash the source line of each kanji record", [
+        # Hash of the record's line in the dataset file, as read. init_db.py
+        # recognizes unchanged records by it without parsing their JSON.
+        "ALTER TABLE kanji_record_hash ADD COLUMN line_hash TEXT",
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def _ensure_version_table(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        description TEXT NOT NULL,
+        applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+def get_schema_version(conn):
+    """Returns the highest migration applied to 'conn' (0 for a new or pre-migration database)."""
+    try:
+        row = conn.execute("SELECT max(version) FROM schema_version").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0] or 0
+
+def pending_migrations(conn):
+    """Returns the (version, description, statements) entries not yet applied to 'conn'."""
+    current_version = get_schema_version(conn)
+    return [migration for migration in MIGRATIONS if migration[0] > current_version]
+
+def migrate(conn):
+    """Applies the pending migrations in order, each in its own transaction.
+
+    Returns the list of (version, description) pairs applied. The base schema
+    uses IF NOT EXISTS, so databases created before versioning are adopted as is.
+    """
+    _ensure_version_table(conn)
+    conn.commit()
+    applied = []
+    for version, description, statements in pending_migrations(conn):
+        conn.execute("BEGIN")
+        try:
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute("INSERT INTO schema_version (version, description) VALUES (?, ?)", (version, description))
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        applied.append((version, description))
+    return applied
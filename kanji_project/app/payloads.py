@@ -0,0 +1,116 @@
+"""Builds the JSON payloads served by the kanji API.
+
+This module has no Flask dependency so that scripts/init_db.py can use it to
+precompute the 'kanji_payload' table at ingest time, while app/routes.py uses
+the same functions as a fallback for databases that lack that table.
+"""
+import json
+
+from .translation_data import TRANSLATIONS_DICT # Import the dictionary
+
+try:
+    import orjson # Optional faster encoder, used by dumps_bytes() when installed.
+except ImportError:
+    orjson = None
+
+KANJI_COLUMNS = """
+    k.id as kanji_id, k.kanji_char, k.unicode, k.meanings, k.kun_readings, k.on_readings,
+    k.stroke_count, k.grade, k.jlpt_level, k.svg_filename
+"""
+
+def dumps_bytes(value):
+    """Serializes 'value' to compact, key-sorted UTF-8 JSON bytes, the encoding of every API response body.
+
+    orjson is used when it is installed and the standard library otherwise; both
+    produce the same bytes for what the API encodes (string keys, ints, strings,
+    lists, no floats). Values orjson rejects, such as non-string keys (which
+    the standard library sorts before converting) or lone surrogates, are left
+    to the standard library.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, option=orjson.OPT_SORT_KEYS)
+        except TypeError:
+            pass
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+def encode_payload(kanji_data):
+    """Serializes an API dict to the compact JSON text stored in 'kanji_payload'."""
+    return dumps_bytes(kanji_data).decode('utf-8')
+
+def _translate_gloss(english_meaning):
+    """Translates each '; '-separated part of an example word gloss, keeping unknown parts as-is."""
+    translated_parts = []
+    if english_meaning:
+        for part in english_meaning.split('; '):
+            # Attempt to translate, fallback to original part if not in dict
+            translated_parts.append(TRANSLATIONS_DICT.get(part.strip().lower(), part.strip()))
+    return '; '.join(translated_parts)
+
+EXAMPLE_WORDS_QUERY = """
+SELECT kwa.kanji_id, ew.word, ew.reading, ew.meaning_es
+FROM kanji_example_word_assoc kwa
+JOIN example_words ew ON ew.id = kwa.word_id
+WHERE kwa.kanji_id IN (SELECT value FROM json_each(?))
+ORDER BY kwa.kanji_id, ew.word, ew.reading
+"""
+
+def get_example_words_for_kanjis(kanji_ids, conn):
+    """Fetches the example words of several kanjis in one query.
+
+    Returns a dict mapping each kanji id to its list of formatted example words.
+    The ids are passed as a single JSON array parameter, so the statement text
+    (and SQLite's bound-variable limit) does not depend on how many there are.
+    """
+    example_words_by_kanji = {kanji_id: [] for kanji_id in kanji_ids}
+    if not example_words_by_kanji:
+        return example_words_by_kanji
+
+    cursor = conn.cursor()
+    cursor.execute(EXAMPLE_WORDS_QUERY, (json.dumps(list(example_words_by_kanji)),))
+    for row_word_data in cursor.fetchall():
+        example_words_by_kanji[row_word_data['kanji_id']].append(
+            f"{row_word_data['word']} ({row_word_data['reading']}): {_translate_gloss(row_word_data['meaning_es'])}"
+        )
+    return example_words_by_kanji
+
+def rows_to_dicts(rows, conn):
+    """Converts kanji rows to API dicts, expanding all their example words with one query."""
+    example_words_by_kanji = get_example_words_for_kanjis([row['kanji_id'] for row in rows], conn)
+    return [row_to_dict(row, example_words_by_kanji.get(row['kanji_id'], [])) for row in rows]
+
+# Helper functions (simplified)
+def _comma_separated_to_list(comma_str):
+    return [s.strip() for s in comma_str.split(',') if s.strip()] if comma_str else []
+
+def row_to_dict(row, example_words):
+    if not row:
+        return None
+
+    # Ensure that 'row' is a dictionary-like object (e.g., sqlite3.Row)
+    # If it's just a tuple, this direct conversion might not work as expected for dict(row)
+    # However, connections used here set conn.row_factory = sqlite3.Row, so it should be fine.
+    base_dict = dict(row)
+
+    english_meanings_str = base_dict.get('meanings')
+    english_meanings_list = _comma_separated_to_list(english_meanings_str)
+    translated_meanings_kanji = []
+    if english_meanings_list:
+        for meaning in english_meanings_list:
+            translated_meanings_kanji.append(TRANSLATIONS_DICT.get(meaning.lower(), meaning))
+
+    kanji_data = {
+        'kanji_id': base_dict.get('kanji_id'),
+        'kanji_char': base_dict.get('kanji_char'),
+        'unicode': base_dict.get('unicode'),
+        'stroke_count': base_dict.get('stroke_count'),
+        'grade': base_dict.get('grade'),
+        'jlpt_level': base_dict.get('jlpt_level'),
+        'svg_filename': base_dict.get('svg_filename'),
+        'meanings': translated_meanings_kanji,
+        'kun_readings': _comma_separated_to_list(base_dict.get('kun_readings')),
+        'on_readings': _comma_separated_to_list(base_dict.get('on_readings')),
+        'example_words': example_words if example_words is not None else []
+    }
+
+    return kanji_data
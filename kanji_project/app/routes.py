@@ -1,8 +1,17 @@
-from flask import Blueprint, jsonify, request, abort, render_template, current_app, send_from_directory
+from flask import Blueprint, jsonify, request, abort, render_template, current_app, send_from_directory, stream_with_context
 import os
 from . import db # Assuming db.py is in the same directory (app)
+from . import cache
+from . import snapshot
+from . import svg_store
 from .translation_data import TRANSLATIONS_DICT # Import the dictionary
+from .payloads import KANJI_COLUMNS, dumps_bytes, rows_to_dicts
+from .search_grams import SHORT_TERM_MAX_LENGTH, short_term_query
+from .text_analysis import TextAnalysis, iter_ideographs
+import hashlib
 import json
+import sqlite3
+from datetime import datetime, timezone
 from pathlib import Path
 
 # Processed dictionary to ensure unique English keys, keeping the first encountered translation.
@@ -26,60 +35,145 @@ def get_translation_example(english_term):
 main_bp = Blueprint('main', __name__)
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
-def get_example_words_for_kanji(kanji_id, conn):
-    cursor = conn.cursor()
-    query = """
-    SELECT ew.word, ew.reading, ew.meaning_es 
-    FROM example_words ew
-    JOIN kanji_example_word_assoc kwa ON ew.id = kwa.word_id
-    WHERE kwa.kanji_id = ?
-    ORDER BY ew.word, ew.reading
-    """
-    cursor.execute(query, (kanji_id,))
-    rows = cursor.fetchall()
-    
-    example_words_list = []
-    if rows:
-        for row_word_data in rows:
-            english_meaning = row_word_data['meaning_es']
-            
-            translated_parts = []
-            if english_meaning:
-                for part in english_meaning.split('; '):
-                    # Attempt to translate, fallback to original part if not in dict
-                    translated_parts.append(TRANSLATIONS_DICT.get(part.strip().lower(), part.strip()))
-            final_translated_meaning = '; '.join(translated_parts)
-
-            example_words_list.append(
-                f"{row_word_data['word']} ({row_word_data['reading']}): {final_translated_meaning}"
-            )
-    return example_words_list
-
 def get_kanji_from_db(kanji_char):
-    conn = db.get_db_connection()
+    conn = db.get_db()
     cursor = conn.cursor()
-    query = """ 
-    SELECT 
-        k.id as kanji_id, k.kanji_char, k.unicode, k.meanings, k.kun_readings, k.on_readings, 
-        k.stroke_count, k.grade, k.jlpt_level, k.svg_filename
+    query = f""" 
+    SELECT {KANJI_COLUMNS}
     FROM kanjis k
     WHERE k.kanji_char = ?
     """
     cursor.execute(query, (kanji_char,))
     row = cursor.fetchone()
-    processed_row = _row_to_dict(row, conn) if row else None # Pass conn
-    conn.close()
-    return processed_row
+    return rows_to_dicts([row], conn)[0] if row else None
 
-def search_kanjis_in_db(query_term):
-    conn = db.get_db_connection()
-    cursor = conn.cursor()
+# Statements of the request paths, kept at module level so that
+# scripts/check_query_plans.py can verify they are answered through indexes.
+KANJI_PAYLOAD_QUERY = "SELECT payload FROM kanji_payload WHERE kanji_char = ?"
+KANJI_PAYLOADS_QUERY = "SELECT kanji_char, payload FROM kanji_payload WHERE kanji_char IN (SELECT value FROM json_each(?))"
+
+def get_kanji_payload(kanji_char):
+    """Returns the precomputed JSON of 'kanji_char', encoded to UTF-8 bytes, or None if it is unknown.
+
+    Results (including misses) are kept in the 'kanji' LRU cache until the
+    database changes, so responses reuse the encoded bytes as they are.
+    In snapshot mode the payload comes straight from memory (see app/snapshot.py).
+    """
+    kanji_snapshot = snapshot.get_snapshot() if snapshot.is_enabled() else None
+    if kanji_snapshot is not None:
+        return kanji_snapshot.get_payload(kanji_char)
+    return cache.cached('kanji', kanji_char, lambda: _load_kanji_payload(kanji_char))
+
+def _load_kanji_payload(kanji_char):
+    conn = db.get_db()
+    try:
+        row = conn.execute(KANJI_PAYLOAD_QUERY, (kanji_char,)).fetchone()
+    except sqlite3.OperationalError:
+        # 'kanji_payload' is missing: the database predates it (re-run init_db.py).
+        kanji_dict = get_kanji_from_db(kanji_char)
+        return dumps_bytes(kanji_dict) if kanji_dict is not None else None
+    return row['payload'].encode('utf-8') if row else None
+
+def get_kanji_payloads(kanji_chars):
+    """Returns a dict mapping each found character of 'kanji_chars' to its encoded JSON payload.
+
+    Cached characters are served from the 'kanji' cache; all the others are
+    resolved together with a single set-based query, then cached as well.
+    """
+    kanji_snapshot = snapshot.get_snapshot() if snapshot.is_enabled() else None
+    if kanji_snapshot is not None:
+        return kanji_snapshot.get_payloads(kanji_chars)
+    kanji_cache = cache.get_cache('kanji')
+    generation = db.get_data_generation()
+    payloads = {}
+    missing_chars = []
+    for kanji_char in kanji_chars:
+        payload = kanji_cache.get(kanji_char, generation)
+        if payload is cache.MISSING:
+            missing_chars.append(kanji_char)
+        elif payload is not None:
+            payloads[kanji_char] = payload
+
+    if missing_chars:
+        loaded = _load_kanji_payloads(missing_chars)
+        for kanji_char in missing_chars:
+            payload = loaded.get(kanji_char)
+            kanji_cache.put(kanji_char, payload, generation)
+            if payload is not None:
+                payloads[kanji_char] = payload
+    return payloads
+
+def _load_kanji_payloads(kanji_chars):
+    conn = db.get_db()
+    chars_param = json.dumps(list(kanji_chars))
+    try:
+        rows = conn.execute(KANJI_PAYLOADS_QUERY, (chars_param,)).fetchall()
+        return {row['kanji_char']: row['payload'].encode('utf-8') for row in rows}
+    except sqlite3.OperationalError:
+        # 'kanji_payload' is missing: the database predates it (re-run init_db.py).
+        query = f"""
+        SELECT {KANJI_COLUMNS}
+        FROM kanjis k
+        WHERE k.kanji_char IN (SELECT value FROM json_each(?))
+        """
+        rows = conn.execute(query, (chars_param,)).fetchall()
+        return {kanji_data['kanji_char']: dumps_bytes(kanji_data) for kanji_data in rows_to_dicts(rows, conn)}
+
+def _parse_batch_chars(raw_chars):
+    """Normalizes the 'chars' batch parameter (a string or a list of strings) to a de-duplicated list of characters."""
+    if isinstance(raw_chars, str):
+        raw_chars = [raw_chars]
+    if not isinstance(raw_chars, list) or not all(isinstance(item, str) for item in raw_chars):
+        return None
+    kanji_chars = []
+    for item in raw_chars:
+        # Each item may hold several characters; separators are ignored.
+        kanji_chars.extend(c for c in item if not c.isspace() and c not in ',、')
+    return list(dict.fromkeys(kanji_chars))
+
+# Minimum term length the trigram FTS index can answer with MATCH.
+# Shorter terms (single kanji, two kana) are looked up in 'kanji_search_short',
+# which indexes every one- and two-character substring of the same text
+# (see app/search_grams.py), in kanji order.
+FTS_MIN_TERM_LENGTH = SHORT_TERM_MAX_LENGTH + 1
+SEARCH_RESULT_LIMIT = 20
+
+FTS_SEARCH_QUERY = """
+SELECT rowid FROM kanji_search
+WHERE kanji_search MATCH ?
+ORDER BY rank
+LIMIT ?
+"""
+SHORT_TERM_SEARCH_QUERY = """
+SELECT rowid FROM kanji_search_short
+WHERE kanji_search_short MATCH ?
+ORDER BY rowid
+LIMIT ?
+"""
+KANJI_PAYLOADS_BY_ID_QUERY = "SELECT kanji_id, payload FROM kanji_payload WHERE kanji_id IN (SELECT value FROM json_each(?))"
+KANJIS_BY_ID_QUERY = f"""
+SELECT {KANJI_COLUMNS}
+FROM kanjis k
+WHERE k.id IN (SELECT value FROM json_each(?))
+"""
+
+def _fts_phrase(term):
+    """Quotes a user term as a literal FTS5 phrase."""
+    return '"' + term.replace('"', '""') + '"'
+
+def _search_kanji_ids(cursor, query_term):
+    """Returns the ids of the kanjis matching 'query_term', using the 'kanji_search' indexes."""
+    if len(query_term) >= FTS_MIN_TERM_LENGTH:
+        cursor.execute(FTS_SEARCH_QUERY, (_fts_phrase(query_term), SEARCH_RESULT_LIMIT))
+    else:
+        cursor.execute(SHORT_TERM_SEARCH_QUERY, (short_term_query(query_term), SEARCH_RESULT_LIMIT))
+    return [row[0] for row in cursor.fetchall()]
+
+def _search_kanji_ids_legacy(cursor, query_term):
+    """Join-based search for databases created before the 'kanji_search' index existed."""
     like_query = f'%{query_term}%'
-    
     query = """
-    SELECT DISTINCT
-        k.id as kanji_id, k.kanji_char, k.unicode, k.meanings, k.kun_readings, k.on_readings, 
-        k.stroke_count, k.grade, k.jlpt_level, k.svg_filename
+    SELECT DISTINCT k.id
     FROM kanjis k
     LEFT JOIN kanji_example_word_assoc kwa ON k.id = kwa.kanji_id
     LEFT JOIN example_words ew ON kwa.word_id = ew.id
@@ -89,80 +183,282 @@ def search_kanjis_in_db(query_term):
           k.on_readings LIKE ? OR
           ew.word LIKE ? OR 
           ew.meaning_es LIKE ? 
-    LIMIT 20 
-    """ 
-    cursor.execute(query, (like_query, like_query, like_query, like_query, like_query, like_query))
-    raw_rows = cursor.fetchall()
-    
-    results = []
-    if raw_rows:
-        for row in raw_rows:
-            dict_row = _row_to_dict(row, conn) # Pass conn
-            if dict_row:
-                results.append(dict_row)
-    conn.close()
-    return results
-
-# Helper functions (simplified)
-def _comma_separated_to_list(comma_str):
-    return [s.strip() for s in comma_str.split(',') if s.strip()] if comma_str else []
-
-def _row_to_dict(row, conn): # Added conn parameter
-    if not row:
-        return None
-    
-    # Ensure that 'row' is a dictionary-like object (e.g., sqlite3.Row)
-    # If it's just a tuple, this direct conversion might not work as expected for dict(row)
-    # However, db.get_db_connection() sets conn.row_factory = sqlite3.Row, so it should be fine.
-    base_dict = dict(row) 
-    
-    english_meanings_str = base_dict.get('meanings')
-    english_meanings_list = _comma_separated_to_list(english_meanings_str)
-    translated_meanings_kanji = []
-    if english_meanings_list:
-        for meaning in english_meanings_list:
-            translated_meanings_kanji.append(TRANSLATIONS_DICT.get(meaning.lower(), meaning))
-    
-    kanji_data = {
-        'kanji_id': base_dict.get('kanji_id'),
-        'kanji_char': base_dict.get('kanji_char'),
-        'unicode': base_dict.get('unicode'),
-        'stroke_count': base_dict.get('stroke_count'),
-        'grade': base_dict.get('grade'),
-        'jlpt_level': base_dict.get('jlpt_level'),
-        'svg_filename': base_dict.get('svg_filename'),
-        'meanings': translated_meanings_kanji,
-        'kun_readings': _comma_separated_to_list(base_dict.get('kun_readings')),
-        'on_readings': _comma_separated_to_list(base_dict.get('on_readings'))
-    }
-
-    if conn and kanji_data.get('kanji_id'):
-        kanji_data['example_words'] = get_example_words_for_kanji(kanji_data['kanji_id'], conn)
-    else:
-        kanji_data['example_words'] = []
-        # Optional: print a warning if conn is None, though it should always be provided by calling functions
-        # if not conn: print("Warning: No DB connection passed to _row_to_dict for fetching example words.")
+    LIMIT ?
+    """
+    cursor.execute(query, (like_query,) * 6 + (SEARCH_RESULT_LIMIT,))
+    return [row[0] for row in cursor.fetchall()]
+
+def search_kanjis_json(query_term):
+    """Returns the JSON array of the payloads of the kanjis matching 'query_term', as bytes.
+
+    The array is assembled from the precomputed payloads instead of being
+    serialized again, and is cached per term until the database changes.
+    """
+    return cache.cached('search', query_term, lambda: _search_kanjis_uncached(query_term))
+
+def _search_kanjis_uncached(query_term):
+    kanji_snapshot = snapshot.get_snapshot() if snapshot.is_enabled() else None
+    if kanji_snapshot is not None:
+        kanji_ids = kanji_snapshot.search_ids(query_term, SEARCH_RESULT_LIMIT)
+        payloads_by_id = kanji_snapshot.get_payloads_by_id(kanji_ids)
+        return b'[' + b','.join(payloads_by_id[kanji_id] for kanji_id in kanji_ids) + b']'
 
-    return kanji_data
+    conn = db.get_db()
+    cursor = conn.cursor()
+    try:
+        kanji_ids = _search_kanji_ids(cursor, query_term)
+    except sqlite3.OperationalError:
+        # An index table is missing: the database predates it (re-run init_db.py).
+        kanji_ids = _search_kanji_ids_legacy(cursor, query_term)
+    if not kanji_ids:
+        return b'[]'
+
+    try:
+        cursor.execute(KANJI_PAYLOADS_BY_ID_QUERY, (json.dumps(kanji_ids),))
+        payloads_by_id = {row['kanji_id']: row['payload'].encode('utf-8') for row in cursor.fetchall()}
+    except sqlite3.OperationalError:
+        # 'kanji_payload' is missing: the database predates it (re-run init_db.py).
+        cursor.execute(KANJIS_BY_ID_QUERY, (json.dumps(kanji_ids),))
+        payloads_by_id = {kanji_data['kanji_id']: dumps_bytes(kanji_data)
+                          for kanji_data in rows_to_dicts(cursor.fetchall(), conn)}
+    # Keep the ranking order of the index
+    return b'[' + b','.join(payloads_by_id[kanji_id] for kanji_id in kanji_ids if kanji_id in payloads_by_id) + b']'
+
+def _apply_cache_headers(response, etag, max_age, immutable):
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    if immutable:
+        response.cache_control.immutable = True
+    generation = db.get_data_generation()
+    if generation is not None:
+        response.last_modified = datetime.fromtimestamp(generation[1] / 1e9, tz=timezone.utc)
+    return response
+
+def cacheable_api_response(etag_key, build_response):
+    """Wraps a GET API response in ETag/Last-Modified/Cache-Control headers.
+
+    The strong ETag combines the database's data version with 'etag_key', so a
+    matching If-None-Match is answered with 304 before build_response() (and the
+    database) is ever called. 'If-None-Match: *' matches any existing resource,
+    so it is only checked once build_response() has found one. Only successful
+    responses get caching headers.
+    """
+    etag = f"{db.get_data_version()}-{etag_key}"
+    max_age = current_app.config['API_CACHE_MAX_AGE']
+    immutable = current_app.config['API_CACHE_IMMUTABLE']
+    if not request.if_none_match.star_tag and request.if_none_match.contains(etag):
+        return _apply_cache_headers(current_app.response_class(status=304), etag, max_age, immutable)
+
+    response = current_app.make_response(build_response())
+    if response.status_code != 200:
+        return response
+    _apply_cache_headers(response, etag, max_age, immutable)
+    return response.make_conditional(request)
+
+def _hash_key(value):
+    return hashlib.sha1(value.encode('utf-8')).hexdigest()[:16]
 
 @main_bp.route('/')
 def index_page():
     return render_template('index.html')
 
+# Precompressed siblings written by scripts/compress_svgs.py, in order of preference.
+SVG_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+# Packed stores inside the data directory, written by scripts/pack_svgs.py and
+# scripts/build_stroke_docs.py.
+SVG_PACK_FILENAME = 'kanjivg_svgs.pack'
+STROKES_PACK_FILENAME = 'kanjivg_strokes.pack'
+
+def _choose_svg_variant(filename, variant_exists):
+    """Picks the best precompressed variant of 'filename' the client accepts.
+
+    Returns (variant filename, content encoding), with encoding None for the plain file.
+    """
+    accept_encodings = request.accept_encodings
+    for encoding, suffix in SVG_ENCODINGS:
+        if accept_encodings.quality(encoding) > 0 and variant_exists(filename + suffix):
+            return filename + suffix, encoding
+    return filename, None
+
+def _finish_svg_response(response, content_encoding):
+    if content_encoding:
+        response.content_encoding = content_encoding
+    response.vary.add('Accept-Encoding')
+    # Files are named after the kanji's codepoint and never change for a given
+    # name, so browsers and proxies may keep them for a long time.
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config['SVG_CACHE_MAX_AGE']
+    if current_app.config['SVG_CACHE_IMMUTABLE']:
+        response.cache_control.immutable = True
+    return response
+
+def _serve_packed(pack, filename, mimetype):
+    variant_filename, content_encoding = _choose_svg_variant(filename, pack.__contains__)
+    view, digest = pack.get(variant_filename)
+    # WSGI bodies must be bytes, so the slice of the mapping is copied once here;
+    # there is no file open, stat or read per request.
+    response = current_app.response_class(bytes(view), mimetype=mimetype)
+    response.set_etag(digest)
+    response.last_modified = pack.mtime
+    _finish_svg_response(response, content_encoding)
+    return response.make_conditional(request, accept_ranges=True, complete_length=len(view))
+
 @main_bp.route('/data/svgs/<path:filename>')
 def serve_svg(filename):
-    project_root = Path(current_app.root_path).parent
-    svg_dir = project_root / 'data' / 'kanjivg_svgs'
+    # Compressed variants are only served through Accept-Encoding negotiation,
+    # with their Content-Encoding; requested by name they would be mislabelled.
+    if not filename.endswith('.svg'):
+        abort(404)
+    data_dir = Path(current_app.root_path).parent / 'data'
+    # Prefer the pack built by scripts/pack_svgs.py; loose files are the fallback.
+    pack = svg_store.get_pack(str(data_dir / SVG_PACK_FILENAME))
+    if pack is not None and filename in pack:
+        return _serve_packed(pack, filename, 'image/svg+xml')
+
+    svg_dir = data_dir / 'kanjivg_svgs'
     if not (svg_dir / filename).is_file():
         abort(404)
-    return send_from_directory(str(svg_dir), filename, mimetype='image/svg+xml')
+    variant_filename, content_encoding = _choose_svg_variant(
+        filename, lambda name: (svg_dir / name).is_file())
+    response = send_from_directory(str(svg_dir), variant_filename, mimetype='image/svg+xml',
+                                   download_name=filename,
+                                   max_age=current_app.config['SVG_CACHE_MAX_AGE'])
+    return _finish_svg_response(response, content_encoding)
 
 @api_bp.route('/kanji/<string:kanji_char>', methods=['GET'])
 def get_kanji(kanji_char):
-    kanji_dict = get_kanji_from_db(kanji_char) 
-    if kanji_dict is None:
-        return jsonify({'error': f'Kanji "{kanji_char}" not found'}), 404
-    return jsonify(kanji_dict)
+    def build_response():
+        payload = get_kanji_payload(kanji_char)
+        if payload is None:
+            return jsonify({'error': f'Kanji "{kanji_char}" not found'}), 404
+        # Stored JSON built by init_db.py, sent as the cached bytes.
+        return current_app.response_class(payload, mimetype='application/json')
+    return cacheable_api_response(f"k-{_hash_key(kanji_char)}", build_response)
+
+@api_bp.route('/kanji/<string:kanji_char>/strokes', methods=['GET'])
+def get_kanji_strokes(kanji_char):
+    """Serves the compact stroke document of a kanji (see scripts/build_stroke_docs.py).
+
+    It holds the viewBox and, in stroke order, each stroke's id, minified path data
+    and precomputed length, so clients can animate without fetching the full SVG.
+    """
+    if len(kanji_char) != 1:
+        abort(404)
+    pack = svg_store.get_pack(str(Path(current_app.root_path).parent / 'data' / STROKES_PACK_FILENAME))
+    # Named like the SVGs: the zero-padded lowercase hex codepoint.
+    filename = f"{ord(kanji_char):05x}.json"
+    if pack is None or filename not in pack:
+        return jsonify({'error': f'No stroke data for "{kanji_char}"'}), 404
+    return _serve_packed(pack, filename, 'application/json')
+
+@api_bp.route('/kanji/batch', methods=['GET', 'POST'])
+def get_kanji_batch():
+    """Looks up many kanjis at once.
+
+    GET takes ?chars=日本人 (repeatable); POST takes a JSON body {"chars": "日本人"} or
+    {"chars": ["日", "本", "人"]}. The response maps each found character to its usual
+    /api/kanji/<char> payload and lists the characters that were not found.
+    """
+    if request.method == 'POST':
+        body = request.get_json(silent=True)
+        raw_chars = body.get('chars') if isinstance(body, dict) else None
+    else:
+        raw_chars = request.args.getlist('chars')
+    kanji_chars = _parse_batch_chars(raw_chars) if raw_chars else None
+    if not kanji_chars:
+        return jsonify({'error': 'Provide the kanjis to look up in "chars"'}), 400
+    max_chars = current_app.config['KANJI_BATCH_MAX_CHARS']
+    if len(kanji_chars) > max_chars:
+        return jsonify({'error': f'Too many kanjis requested ({len(kanji_chars)}), the maximum is {max_chars}'}), 400
+
+    def build_response():
+        payloads = get_kanji_payloads(kanji_chars)
+        not_found = [kanji_char for kanji_char in kanji_chars if kanji_char not in payloads]
+        # The payloads are already encoded JSON, so the response is assembled around them
+        # instead of decoding and re-encoding every one.
+        results_json = b','.join(dumps_bytes(kanji_char) + b':' + payloads[kanji_char]
+                                 for kanji_char in kanji_chars if kanji_char in payloads)
+        body = b'{"not_found":' + dumps_bytes(not_found) + b',"results":{' + results_json + b'}}'
+        return current_app.response_class(body, mimetype='application/json')
+    if request.method == 'POST':
+        return build_response()
+    return cacheable_api_response(f"b-{_hash_key(''.join(kanji_chars))}", build_response)
+
+def _resolve_analysis_batch(analysis, kanji_chars):
+    """Resolves newly seen kanjis in one batch, yielding (kanji_char, payload) for the found ones."""
+    payloads = get_kanji_payloads(kanji_chars)
+    for kanji_char in kanji_chars:
+        payload = payloads.get(kanji_char)
+        if payload is None:
+            analysis.not_found.append(kanji_char)
+            continue
+        analysis.add_resolved(payload)
+        yield kanji_char, payload
+
+def _run_text_analysis(analysis, text, batch_size):
+    """Scans 'text', yielding (kanji_char, payload) for each distinct known kanji as soon as its batch is resolved."""
+    pending_chars = []
+    for offset, kanji_char in iter_ideographs(text):
+        if analysis.add(kanji_char, offset):
+            pending_chars.append(kanji_char)
+            if len(pending_chars) >= batch_size:
+                yield from _resolve_analysis_batch(analysis, pending_chars)
+                pending_chars = []
+    if pending_chars:
+        yield from _resolve_analysis_batch(analysis, pending_chars)
+
+def _get_analysis_text():
+    """Reads the text to analyze from a JSON {"text": ...} body, a 'text' form field or a raw text body."""
+    if request.is_json:
+        body = request.get_json(silent=True)
+        text = body.get('text') if isinstance(body, dict) else None
+        return text if isinstance(text, str) else None
+    if 'text' in request.form:
+        return request.form['text']
+    return request.get_data(as_text=True)
+
+@api_bp.route('/analyze/text', methods=['POST'])
+def analyze_text():
+    """Breaks a Japanese text down into its distinct kanjis.
+
+    Returns the frequencies, JLPT level and grade histograms, and the payload of
+    every kanji found. With ?format=ndjson (or Accept: application/x-ndjson) the
+    result is streamed as one JSON object per line: a "kanji" record for each
+    kanji as soon as it is resolved, then a final "summary" record.
+    """
+    max_length = current_app.config['ANALYZE_MAX_TEXT_LENGTH']
+    max_bytes = current_app.config['MAX_CONTENT_LENGTH']
+    # Checked before the body is read, so an oversized text is never buffered.
+    if max_bytes is not None and (request.content_length or 0) > max_bytes:
+        return jsonify({'error': f'Request body is too large ({request.content_length} bytes), the maximum is {max_bytes}'}), 413
+    text = _get_analysis_text()
+    if not text:
+        return jsonify({'error': 'Text to analyze cannot be empty'}), 400
+    if len(text) > max_length:
+        return jsonify({'error': f'Text is too long ({len(text)} characters), the maximum is {max_length}'}), 413
+
+    batch_size = current_app.config['ANALYZE_BATCH_SIZE']
+    analysis = TextAnalysis()
+    records = _run_text_analysis(analysis, text, batch_size)
+    wants_ndjson = (request.args.get('format') == 'ndjson' or
+                    request.accept_mimetypes.best == 'application/x-ndjson')
+
+    if wants_ndjson:
+        def generate():
+            for kanji_char, payload in records:
+                yield (b'{"data":' + payload + b',"first_offset":%d,"kanji_char":' % analysis.first_offsets[kanji_char]
+                       + dumps_bytes(kanji_char) + b',"type":"kanji"}\n')
+            yield dumps_bytes(dict(analysis.summary(), type='summary')) + b'\n'
+        return current_app.response_class(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    kanji_json = b','.join(
+        b'{"count":%d,"data":' % analysis.counts[kanji_char] + payload
+        + b',"first_offset":%d,"kanji_char":' % analysis.first_offsets[kanji_char] + dumps_bytes(kanji_char) + b'}'
+        for kanji_char, payload in list(records) # Consume first: counts are final only at the end
+    )
+    body = b'{"kanji":[' + kanji_json + b'],"summary":' + dumps_bytes(analysis.summary()) + b'}'
+    return current_app.response_class(body, mimetype='application/json')
 
 @api_bp.route('/search/kanji', methods=['GET'])
 def search_kanji():
@@ -170,7 +466,15 @@ def search_kanji():
     if not query_term:
         return jsonify({'error': 'Search query cannot be empty'}), 400
     
-    results = search_kanjis_in_db(query_term) 
-    return jsonify(results)
+    return cacheable_api_response(
+        f"s-{_hash_key(query_term)}",
+        lambda: current_app.response_class(search_kanjis_json(query_term), mimetype='application/json'))
+
+@api_bp.route('/stats/cache', methods=['GET'])
+def cache_stats():
+    stats = cache.all_stats()
+    if snapshot.is_enabled():
+        stats['snapshot'] = snapshot.stats()
+    return jsonify(stats)
 
 # ... (rest of the file, if any, including blueprint registration if done here)
\ No newline at end of file
@@ -0,0 +1,51 @@
+"""Tokens of the short-term search index ('kanji_search_short').
+
+The trigram tokenizer of 'kanji_search' cannot match terms of one or two
+characters, which include the most common search of all: a single kanji.
+For those, every distinct one- and two-character substring of a kanji's
+search text is stored as a token of its own in a second, contentless FTS5
+table, so a short term is one index lookup instead of a scan of the text.
+
+Substrings are written as the hex codepoints of their characters, which keeps
+every token intact under FTS5's 'ascii' tokenizer whatever the characters
+are (punctuation included). Case is folded for ASCII letters only, as
+SQLite's LIKE does, and substrings containing whitespace are left out:
+search terms are stripped, so a term of two characters never holds any.
+
+Like payloads.py, this module has no Flask dependency: scripts/init_db.py
+builds the index with it, app/routes.py queries it and app/snapshot.py
+builds the same index in memory.
+"""
+import operator
+
+# Longest term answered by 'kanji_search_short'; longer ones go to the trigram index.
+SHORT_TERM_MAX_LENGTH = 2
+
+_ASCII_LOWER = str.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')
+
+def _token(gram):
+    return ''.join(['%06x' % ord(char) for char in gram])
+
+def fold_short_term(term):
+    """Returns 'term' case-folded the way short substrings are indexed (ASCII letters only)."""
+    return term.translate(_ASCII_LOWER)
+
+def short_term_grams(values):
+    """Returns the set of distinct short substrings of the text 'values' (None allowed), case-folded."""
+    pieces = set()
+    for value in values:
+        if value:
+            pieces.update(fold_short_term(value).split())
+    grams = set()
+    for piece in pieces:
+        grams.update(piece)
+        grams.update(map(operator.add, piece, piece[1:]))
+    return grams
+
+def short_term_tokens(values):
+    """Returns the space-separated tokens of every short substring of the text 'values' (None allowed)."""
+    return ' '.join(map(_token, short_term_grams(values)))
+
+def short_term_query(term):
+    """Returns the MATCH expression that finds 'term' (at most SHORT_TERM_MAX_LENGTH characters)."""
+    return '"' + _token(fold_short_term(term)) + '"'
@@ -0,0 +1,279 @@
+"""In-memory, read-only snapshot of the served dataset (enabled with KANJI_SNAPSHOT).
+
+The whole dataset is small and only changes when scripts/init_db.py publishes a
+new kanji.db, so in snapshot mode it is loaded once into dicts keyed by
+kanji_char and by id, and every lookup and search is answered from memory,
+without SQL. The snapshot is rebuilt when the database file is replaced (see
+db.get_data_generation()).
+
+Searches use in-memory inverted indexes of the same text and tokens as the
+SQL ones, so they return the same kanjis in the same order as
+routes._search_kanji_ids(): terms of up to SHORT_TERM_MAX_LENGTH characters
+are looked up among the short substrings of 'kanji_search_short' (see
+app/search_grams.py), in kanji order; longer ones are matched through
+trigrams, as the 'kanji_search' trigram index does, and ranked with the
+bm25 formula FTS5 uses for a phrase query. One difference remains: trigrams
+are case-folded with str.lower(), which may differ from SQLite's folding for
+a few non-ASCII letters.
+
+The load time and memory of the snapshot are logged and listed under
+'snapshot' by /api/stats/cache, to help choose the mode per deployment.
+"""
+import heapq
+import math
+import os
+import sqlite3
+import sys
+import threading
+import time
+from array import array
+
+from flask import current_app
+
+from . import db
+from .search_grams import SHORT_TERM_MAX_LENGTH, fold_short_term, short_term_grams
+
+# FTS5's bm25() parameters.
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Columns of 'kanji_search', in the order they are searched.
+SEARCH_COLUMNS = ('kanji_char', 'meanings', 'kun_readings', 'on_readings', 'example_words')
+
+SNAPSHOT_QUERY = f"""
+SELECT p.kanji_id, p.kanji_char, p.payload, {', '.join('s.' + column for column in SEARCH_COLUMNS)}
+FROM kanji_payload p
+JOIN kanji_search s ON s.rowid = p.kanji_id
+ORDER BY p.kanji_id
+"""
+
+# Separates the columns of a kanji's search text, so no match spans two of them.
+COLUMN_SEPARATOR = '\x1f'
+
+def _trigrams(text):
+    return map(''.join, zip(text, text[1:], text[2:]))
+
+def _add_postings(index, grams, record_index):
+    """Adds 'record_index' to the postings of 'grams' in 'index'.
+
+    Most grams occur in a single kanji, so a posting list starts as a bare
+    int and only becomes an array when a second kanji is added.
+    """
+    get = index.get
+    for gram in grams:
+        postings = get(gram)
+        if postings is None:
+            index[gram] = record_index
+        elif type(postings) is int:
+            index[gram] = array('I', (postings, record_index))
+        else:
+            postings.append(record_index)
+
+def _postings(index, gram):
+    postings = index.get(gram, ())
+    return (postings,) if type(postings) is int else postings
+
+def _count_overlapping(text, term):
+    count = 0
+    position = text.find(term)
+    while position != -1:
+        count += 1
+        position = text.find(term, position + 1)
+    return count
+
+class KanjiRecord:
+    """One kanji: its API payload (encoded JSON bytes) and its case-folded search text."""
+
+    __slots__ = ('kanji_id', 'kanji_char', 'payload', 'text', 'token_count')
+
+    def __init__(self, kanji_id, kanji_char, payload, text, token_count):
+        self.kanji_id = kanji_id
+        self.kanji_char = kanji_char
+        self.payload = payload
+        # The search columns, lowercased and joined by COLUMN_SEPARATOR.
+        self.text = text
+        # Trigrams in the row, the document length bm25() normalizes by.
+        self.token_count = token_count
+
+class KanjiSnapshot:
+    """The dataset of one database generation, held in memory.
+
+    'short_index' maps every short substring (as search_grams.short_term_grams()
+    lists them) and 'trigram_index' every lowercased trigram to the indexes in
+    'records' of the kanjis whose search text holds it, in kanji order.
+    """
+
+    def __init__(self, generation, records, short_index, trigram_index):
+        self.generation = generation
+        self.records = records # in kanji id order
+        self.by_char = {record.kanji_char: record for record in records}
+        self.by_id = {record.kanji_id: record for record in records}
+        self.short_index = short_index
+        self.trigram_index = trigram_index
+        self.average_token_count = (sum(record.token_count for record in records) / len(records)) if records else 0.0
+        # The length part of each kanji's bm25() denominator, which does not depend on the term.
+        average = self.average_token_count or 1.0
+        self.length_norms = [BM25_K1 * (1 - BM25_B + BM25_B * record.token_count / average) for record in records]
+        self.load_seconds = None
+        self.resident_bytes = None
+        self._approximate_bytes = None
+
+    @classmethod
+    def load(cls, conn, generation):
+        """Reads every kanji's payload and search text through 'conn' and indexes the text."""
+        records = []
+        short_index = {}
+        trigram_index = {}
+        for record_index, row in enumerate(conn.execute(SNAPSHOT_QUERY)):
+            values = row[3:]
+            columns = [(value or '').lower() for value in values]
+            trigrams = set()
+            for column in columns:
+                trigrams.update(_trigrams(column))
+            _add_postings(short_index, short_term_grams(values), record_index)
+            _add_postings(trigram_index, trigrams, record_index)
+            records.append(KanjiRecord(
+                row[0], sys.intern(row[1]), row[2].encode('utf-8'), COLUMN_SEPARATOR.join(columns),
+                sum(max(0, len(column) - 2) for column in columns),
+            ))
+        return cls(generation, records, short_index, trigram_index)
+
+    def __len__(self):
+        return len(self.records)
+
+    def get_payload(self, kanji_char):
+        record = self.by_char.get(kanji_char)
+        return record.payload if record is not None else None
+
+    def get_payloads(self, kanji_chars):
+        """Returns a dict mapping each found character of 'kanji_chars' to its encoded JSON payload."""
+        by_char = self.by_char
+        return {kanji_char: by_char[kanji_char].payload for kanji_char in kanji_chars if kanji_char in by_char}
+
+    def get_payloads_by_id(self, kanji_ids):
+        """Returns a dict mapping each found id of 'kanji_ids' to its encoded JSON payload."""
+        by_id = self.by_id
+        return {kanji_id: by_id[kanji_id].payload for kanji_id in kanji_ids if kanji_id in by_id}
+
+    def search_ids(self, query_term, limit):
+        """Returns the ids of the kanjis matching 'query_term', best first, at most 'limit' of them."""
+        if len(query_term) <= SHORT_TERM_MAX_LENGTH:
+            postings = _postings(self.short_index, fold_short_term(query_term))
+            return [self.records[record_index].kanji_id for record_index in postings[:limit]]
+
+        term = query_term.lower()
+        if COLUMN_SEPARATOR in term:
+            return [] # Would match across columns.
+        # Kanjis holding every trigram of the term, rarest trigram first...
+        postings = sorted((_postings(self.trigram_index, trigram) for trigram in set(_trigrams(term))), key=len)
+        candidates = set(postings[0]).intersection(*postings[1:])
+        # ...and the phrase frequency bm25() uses: occurrences of the whole term,
+        # overlapping ones included, in all columns (which all weigh 1). Only a
+        # term that can overlap itself ('aaa') needs more than str.count().
+        records = self.records
+        if any(term.startswith(term[shift:]) for shift in range(1, len(term))):
+            hits = [(record_index, _count_overlapping(records[record_index].text, term)) for record_index in candidates]
+        else:
+            hits = [(record_index, records[record_index].text.count(term)) for record_index in candidates]
+        hits = [hit for hit in hits if hit[1]]
+        if not hits:
+            return []
+
+        # bm25 of a single phrase, computed in the same order as FTS5 (more
+        # negative ranks first; ties in kanji order, as 'records' is).
+        idf = math.log((len(records) - len(hits) + 0.5) / (len(hits) + 0.5))
+        if idf <= 0:
+            idf = 1e-6
+        length_norms = self.length_norms
+        k1_plus_one = BM25_K1 + 1
+        ranked = heapq.nsmallest(limit, [
+            (-(idf * ((frequency * k1_plus_one) / (frequency + length_norms[record_index]))), record_index)
+            for record_index, frequency in hits
+        ])
+        return [records[record_index].kanji_id for _, record_index in ranked]
+
+    def approximate_size(self):
+        """Bytes held by the snapshot's own structures (dicts, records, indexes and strings), computed once."""
+        if self._approximate_bytes is None:
+            total = sys.getsizeof(self.by_char) + sys.getsizeof(self.by_id) + sys.getsizeof(self.records)
+            for record in self.records:
+                total += (sys.getsizeof(record) + sys.getsizeof(record.kanji_id) + sys.getsizeof(record.kanji_char)
+                          + sys.getsizeof(record.payload) + sys.getsizeof(record.text))
+            for index in (self.short_index, self.trigram_index):
+                total += sys.getsizeof(index) + sum(map(sys.getsizeof, index)) + sum(map(sys.getsizeof, index.values()))
+            self._approximate_bytes = total
+        return self._approximate_bytes
+
+    def stats(self):
+        return {
+            'kanjis': len(self.records),
+            'load_ms': round(self.load_seconds * 1000, 1) if self.load_seconds is not None else None,
+            'approximate_bytes': self.approximate_size(),
+            'resident_bytes_added': self.resident_bytes,
+        }
+
+def _resident_bytes():
+    """Returns this process's resident memory in bytes, or None where /proc is not available."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+_snapshot = None
+# Generation whose database could not be loaded, so the failure is only logged once.
+_failed_generation = None
+_lock = threading.Lock()
+
+def is_enabled():
+    return current_app.config['KANJI_SNAPSHOT']
+
+def get_snapshot():
+    """Returns the snapshot of the current database, loading it on first use or after the file was replaced.
+
+    Returns None when the database lacks the precomputed tables the snapshot is
+    built from (re-run init_db.py); callers then use SQL as usual.
+    """
+    global _snapshot, _failed_generation
+    generation = db.get_data_generation()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.generation == generation:
+        return snapshot
+    if generation == _failed_generation:
+        return None
+    with _lock:
+        if _snapshot is None or _snapshot.generation != generation:
+            # The previous snapshot is released first, so the resident memory delta is this one's.
+            _snapshot = None
+            resident_before = _resident_bytes()
+            started = time.perf_counter()
+            try:
+                snapshot = KanjiSnapshot.load(db.get_db(), generation)
+            except sqlite3.OperationalError as e:
+                current_app.logger.warning("Kanji snapshot unavailable, serving from SQL: %s", e)
+                _failed_generation = generation
+                return None
+            snapshot.load_seconds = time.perf_counter() - started
+            resident_after = _resident_bytes()
+            if resident_before is not None and resident_after is not None:
+                snapshot.resident_bytes = resident_after - resident_before
+            current_app.logger.info("Loaded kanji snapshot: %s", snapshot.stats())
+            _snapshot = snapshot
+    return _snapshot
+
+def stats():
+    """Returns the current snapshot's stats, or None if no snapshot is loaded."""
+    snapshot = _snapshot
+    return snapshot.stats() if snapshot is not None else None
+
+def init_app(app):
+    """Loads the snapshot at startup when KANJI_SNAPSHOT is set, so the first request does not pay for it."""
+    if not app.config['KANJI_SNAPSHOT']:
+        return
+    with app.app_context():
+        try:
+            get_snapshot()
+        except FileNotFoundError:
+            app.logger.warning("Kanji snapshot not loaded: %s does not exist yet", db.DATABASE_PATH)
+        finally:
+            db.close_thread_connection()
@@ -177,50 +177,100 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    const SVG_NS = 'http://www.w3.org/2000/svg';
+    // Small margin added to precomputed stroke lengths so rounding never leaves
+    // the tip of a stroke visible before it is drawn.
+    const STROKE_LENGTH_MARGIN = 1;
+
+    // Builds the drawing from the compact stroke document served by
+    // /api/kanji/<kanji>/strokes (minified paths with precomputed lengths).
+    // Returns null if there is no stroke document for this kanji.
+    async function loadStrokeDocument(kanjiChar) {
+        const response = await fetch(`/api/kanji/${encodeURIComponent(kanjiChar)}/strokes`);
+        if (!response.ok) {
+            return null;
+        }
+        const strokeDoc = await response.json();
+        if (!strokeDoc.strokes || strokeDoc.strokes.length === 0) {
+            return null;
+        }
+
+        const svgElement = document.createElementNS(SVG_NS, 'svg');
+        svgElement.setAttribute('viewBox', strokeDoc.viewBox);
+        const paths = strokeDoc.strokes.map(stroke => {
+            const path = document.createElementNS(SVG_NS, 'path');
+            path.setAttribute('d', stroke.d);
+            path.dataset.strokeId = stroke.id;
+            svgElement.appendChild(path);
+            return path;
+        });
+        const lengths = strokeDoc.strokes.map(stroke => stroke.length + STROKE_LENGTH_MARGIN);
+        return { svgElement, paths, lengths };
+    }
+
+    // Fallback: parses the full KanjiVG SVG. Lengths are measured once, after the
+    // SVG is in the document. Returns null if the SVG cannot be used.
+    async function loadFullSvg(svgFilename, targetDiv) {
+        const response = await fetch(`/data/svgs/${svgFilename}`);
+        if (!response.ok) {
+            throw new Error(`No se pudo cargar el archivo SVG: ${response.status} ${response.statusText}`);
+        }
+        const svgText = await response.text();
+
+        const parser = new DOMParser();
+        const svgDoc = parser.parseFromString(svgText, "image/svg+xml");
+        const svgElement = svgDoc.documentElement;
+
+        if (svgElement.nodeName === 'parsererror' || !svgElement.querySelector('path')) {
+            console.error("Error parsing SVG or SVG has no paths:", svgText);
+            return null;
+        }
+        svgElement.removeAttribute('id'); 
+
+        // getTotalLength() needs the element to be rendered.
+        targetDiv.appendChild(svgElement);
+        const paths = Array.from(svgElement.querySelectorAll('path'));
+        const lengths = paths.map(path => path.getTotalLength());
+        return { svgElement, paths, lengths };
+    }
+
     async function loadAndAnimateSvg(svgFilename, targetDiv, kanjiChar) {
         targetDiv.innerHTML = '<p>Cargando diagrama...</p>'; // Initial loading message
 
         try {
-            const response = await fetch(`/data/svgs/${svgFilename}`);
-            if (!response.ok) {
-                throw new Error(`No se pudo cargar el archivo SVG: ${response.status} ${response.statusText}`);
-            }
-            const svgText = await response.text();
-
+            let drawing = await loadStrokeDocument(kanjiChar);
             targetDiv.innerHTML = ''; // Clear loading message
-
-            const parser = new DOMParser();
-            const svgDoc = parser.parseFromString(svgText, "image/svg+xml");
-            const svgElement = svgDoc.documentElement;
-
-            if (svgElement.nodeName === 'parsererror' || !svgElement.querySelector('path')) {
-                console.error("Error parsing SVG or SVG has no paths:", svgText);
+            if (!drawing) {
+                drawing = await loadFullSvg(svgFilename, targetDiv);
+            }
+            if (!drawing) {
                 targetDiv.innerHTML = '<p>Error al procesar el diagrama de trazos.</p>';
                 return;
             }
-            
+
+            const { svgElement, paths, lengths } = drawing;
             svgElement.setAttribute('width', '100%');
             svgElement.setAttribute('height', '100%');
-            svgElement.removeAttribute('id'); 
-
-            targetDiv.appendChild(svgElement);
-
-            const paths = Array.from(svgElement.querySelectorAll('path'));
+            if (!svgElement.isConnected) {
+                targetDiv.appendChild(svgElement);
+            }
             
             // Prepare paths for animation (initial state)
-            paths.forEach(path => {
-                const length = path.getTotalLength();
+            paths.forEach((path, index) => {
+                const length = lengths[index];
                 path.style.strokeDasharray = length;
                 path.style.strokeDashoffset = length;
                 path.style.stroke = '#000000';
                 path.style.strokeWidth = '3';
+                path.style.strokeLinecap = 'round';
+                path.style.strokeLinejoin = 'round';
                 path.style.fill = 'none';
                 path.style.transition = 'none'; 
             });
 
             async function animateAllPathsSequentially() {
-                for (const path of paths) {
-                    const length = path.getTotalLength();
+                for (const [index, path] of paths.entries()) {
+                    const length = lengths[index];
                     // Ensure path is reset before animating if it's not the first loop
                     // This is mostly handled by the initial setup now.
                     // path.style.strokeDashoffset = length; // Reset for re-animation
@@ -241,9 +291,8 @@ document.addEventListener('DOMContentLoaded', () => {
                 await new Promise(resolve => setTimeout(resolve, 1000)); // 1 second delay before loop
 
                 // Reset all paths to their initial state for the loop
-                paths.forEach(path => {
-                    const length = path.getTotalLength();
-                    path.style.strokeDashoffset = length;
+                paths.forEach((path, index) => {
+                    path.style.strokeDashoffset = lengths[index];
                 });
                 
                 // Loop the animation
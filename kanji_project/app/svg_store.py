@@ -0,0 +1,74 @@
+"""Read access to the packed SVG store built by scripts/pack_svgs.py.
+
+Pack layout (all integers little-endian):
+
+    magic        8 bytes  b'KVGPACK1'
+    index_offset 8 bytes  uint64
+    index_length 8 bytes  uint64
+    blobs        the file contents, back to back
+    index        UTF-8 JSON object: {filename: [offset, length, sha1_hex]}
+
+Filenames are the loose file names ('04e00.svg', '04e00.svg.gz', ...), i.e. the
+kanji's zero-padded codepoint plus the variant suffix.
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+
+PACK_MAGIC = b'KVGPACK1'
+HEADER_FORMAT = '<8sQQ'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+class SvgPack:
+    """A memory-mapped, read-only view of a pack file."""
+
+    def __init__(self, path):
+        self.path = os.fspath(path)
+        with open(self.path, 'rb') as f:
+            stat_result = os.fstat(f.fileno())
+            self.generation = (stat_result.st_ino, stat_result.st_mtime_ns, stat_result.st_size)
+            self.mtime = stat_result.st_mtime
+            # The mapping stays valid after the file is closed, and after the pack
+            # is replaced on disk (the old inode lives on until it is unmapped).
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, index_offset, index_length = struct.unpack_from(HEADER_FORMAT, self._map, 0)
+        if magic != PACK_MAGIC:
+            raise ValueError(f"{self.path} is not an SVG pack")
+        self._index = json.loads(self._map[index_offset:index_offset + index_length].decode('utf-8'))
+        self._view = memoryview(self._map)
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def get(self, name):
+        """Returns (memoryview of the contents, sha1 hex) for 'name', or None if it is not packed."""
+        entry = self._index.get(name)
+        if entry is None:
+            return None
+        offset, length, digest = entry
+        return self._view[offset:offset + length], digest
+
+_lock = threading.Lock()
+_packs = {}
+
+def get_pack(path):
+    """Returns the SvgPack for 'path', reopened if the file was rebuilt, or None if there is no pack."""
+    try:
+        stat_result = os.stat(path)
+    except FileNotFoundError:
+        return None
+    generation = (stat_result.st_ino, stat_result.st_mtime_ns, stat_result.st_size)
+    pack = _packs.get(path)
+    if pack is not None and pack.generation == generation:
+        return pack
+    with _lock:
+        pack = _packs.get(path)
+        if pack is None or pack.generation != generation:
+            pack = SvgPack(path)
+            _packs[path] = pack
+    return pack
@@ -0,0 +1,64 @@
+"""Extracts and tallies the kanjis of a Japanese text for /api/analyze/text."""
+import json
+import re
+from collections import Counter
+
+# CJK Unified Ideographs (main block and extensions A-H) plus the compatibility blocks.
+IDEOGRAPH_RE = re.compile(
+    '['
+    '\u3400-\u4dbf'
+    '\u4e00-\u9fff'
+    '\uf900-\ufaff'
+    '\U00020000-\U0002a6df'
+    '\U0002a700-\U0002ee5f'
+    '\U0002f800-\U0002fa1f'
+    '\U00030000-\U000323af'
+    ']'
+)
+
+def iter_ideographs(text):
+    """Yields (offset, character) for every CJK ideograph in 'text'."""
+    for match in IDEOGRAPH_RE.finditer(text):
+        yield match.start(), match.group()
+
+def _level_key(value):
+    return str(value) if value is not None else 'unknown'
+
+class TextAnalysis:
+    """Running tally of the kanjis seen in a text."""
+
+    def __init__(self):
+        self.counts = Counter()
+        self.first_offsets = {}
+        self.jlpt_levels = Counter()
+        self.grades = Counter()
+        self.not_found = []
+
+    def add(self, kanji_char, offset):
+        """Counts one occurrence; returns True if it is the first one of this kanji."""
+        self.counts[kanji_char] += 1
+        if kanji_char in self.first_offsets:
+            return False
+        self.first_offsets[kanji_char] = offset
+        return True
+
+    def add_resolved(self, payload):
+        """Records the JLPT level and grade of a found kanji, from its JSON payload text."""
+        kanji_data = json.loads(payload)
+        self.jlpt_levels[_level_key(kanji_data.get('jlpt_level'))] += 1
+        self.grades[_level_key(kanji_data.get('grade'))] += 1
+
+    def summary(self):
+        """Returns the totals, frequencies (most frequent first) and histograms as a dict.
+
+        The histograms count distinct kanjis found in the database, keyed by level
+        ('unknown' when the level is not set).
+        """
+        return {
+            'total_kanji': sum(self.counts.values()),
+            'distinct_kanji': len(self.counts),
+            'frequencies': self.counts.most_common(),
+            'jlpt_levels': dict(self.jlpt_levels),
+            'grades': dict(self.grades),
+            'not_found': self.not_found,
+        }
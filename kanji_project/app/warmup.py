@@ -0,0 +1,51 @@
+"""Cache warm-up run once before a pre-forking server starts its workers (see serve.py).
+
+Everything loaded here is inherited by every worker through fork(), so the
+payload cache and the mapped SVG/stroke packs are read from shared
+copy-on-write pages instead of being built again by each worker on its first
+requests.
+"""
+import gc
+import sqlite3
+from pathlib import Path
+
+from . import cache, db, snapshot, svg_store
+from .routes import STROKES_PACK_FILENAME, SVG_PACK_FILENAME
+
+def warm_up(app):
+    """Fills the 'kanji' cache (or loads the snapshot) and opens the packs; returns what was loaded.
+
+    Must run in the parent process before forking. It closes the SQLite
+    connection it used, since connections must not cross a fork, and freezes
+    the objects created so far so the workers' garbage collector does not
+    write to (and so copy) the shared pages.
+    """
+    loaded = {'kanji_payloads': 0, 'packs': 0, 'snapshot': None}
+    with app.app_context():
+        data_dir = Path(app.root_path).parent / 'data'
+        for filename in (SVG_PACK_FILENAME, STROKES_PACK_FILENAME):
+            if svg_store.get_pack(str(data_dir / filename)) is not None:
+                loaded['packs'] += 1
+        try:
+            db.get_data_version()
+            if snapshot.is_enabled() and snapshot.get_snapshot() is not None:
+                # Lookups never reach the cache in snapshot mode.
+                loaded['snapshot'] = snapshot.stats()
+            else:
+                kanji_cache = cache.get_cache('kanji')
+                generation = db.get_data_generation()
+                rows = db.get_db().execute(
+                    "SELECT kanji_char, payload FROM kanji_payload ORDER BY kanji_id LIMIT ?",
+                    (max(0, kanji_cache.maxsize),)
+                )
+                for row in rows:
+                    kanji_cache.put(row['kanji_char'], row['payload'].encode('utf-8'), generation)
+                    loaded['kanji_payloads'] += 1
+        except (FileNotFoundError, sqlite3.Error) as e:
+            # Serving still works; the cache just fills on demand.
+            app.logger.warning("Skipping kanji cache warm-up: %s", e)
+        finally:
+            db.close_thread_connection()
+    gc.collect()
+    gc.freeze()
+    return loaded
@@ -2,6 +2,47 @@
 
 class Config:
     SQLALCHEMY_DATABASE_URI = 'sqlite:///kanji.db'
+    # Maximum number of entries kept by the in-process LRU caches (0 disables a cache).
+    # 'kanji' holds per-character API payloads, 'search' holds search results.
+    KANJI_CACHE_SIZE = 4096
+    SEARCH_CACHE_SIZE = 1024
+    # Maximum number of distinct characters accepted by /api/kanji/batch.
+    KANJI_BATCH_MAX_CHARS = 500
+    # /api/analyze/text: longest accepted text (in characters) and how many new
+    # kanjis are resolved per database round trip (and per streamed chunk).
+    ANALYZE_MAX_TEXT_LENGTH = 1_000_000
+    ANALYZE_BATCH_SIZE = 64
+    # Largest request body read at all (413 beyond it), so an oversized text is
+    # rejected before being buffered: ANALYZE_MAX_TEXT_LENGTH characters of up
+    # to 4 UTF-8 bytes each.
+    MAX_CONTENT_LENGTH = ANALYZE_MAX_TEXT_LENGTH * 4
+    # HTTP caching. API responses carry an ETag tied to the data version, so
+    # clients revalidate cheaply after API_CACHE_MAX_AGE seconds; SVG files never
+    # change for a given name and are cached for a year by default.
+    API_CACHE_MAX_AGE = 3600
+    API_CACHE_IMMUTABLE = False
+    SVG_CACHE_MAX_AGE = 365 * 24 * 3600
+    SVG_CACHE_IMMUTABLE = True
+    # Read-only SQLite connection settings (see app/db.py).
+    # KANJI_DB_IMMUTABLE skips all locking. The data scripts publish kanji.db by
+    # renaming a finished copy over it, never writing it in place, and the app
+    # reopens its connections when the file is replaced, so this is safe unless
+    # something else edits kanji.db directly while the app is running.
+    KANJI_DB_IMMUTABLE = True
+    KANJI_DB_MMAP_SIZE = 256 * 1024 * 1024 # bytes
+    KANJI_DB_CACHE_KIB = 16 * 1024 # page cache per connection
+    KANJI_DB_CACHED_STATEMENTS = 256
+    # Serve lookups and searches from an in-memory copy of the dataset and of its
+    # search indexes, loaded at startup and after every new kanji.db, instead of
+    # querying SQLite (see app/snapshot.py). Uses more memory per process and
+    # takes longer to load; the load time and size are logged.
+    KANJI_SNAPSHOT = False
+    # Production server (serve.py): listening address, worker processes
+    # (0 = one per CPU core) and threads per worker.
+    SERVE_HOST = '127.0.0.1'
+    SERVE_PORT = 8000
+    SERVE_WORKERS = 0
+    SERVE_THREADS = 4
     # Add other configuration variables as needed
     # For example, a secret key for sessions:
     # SECRET_KEY = 'your_secret_key'
@@ -0,0 +1,236 @@
+import gzip
+import json
+import math
+import re
+import sys
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+from pack_svgs import write_pack
+
+# Define Paths
+# Assuming this script is in kanji_project/scripts/
+BASE_DIR = Path(__file__).resolve().parent
+SVG_DIR = BASE_DIR.parent / 'data' / 'kanjivg_svgs'
+STROKES_PACK_PATH = BASE_DIR.parent / 'data' / 'kanjivg_strokes.pack'
+
+SVG_NAMESPACE = "http://www.w3.org/2000/svg"
+
+# Decimals kept in the minified path data. KanjiVG draws on a 109x109 grid, so
+# one decimal is well under a screen pixel at the sizes the front end uses.
+COORDINATE_PRECISION = 1
+# Line segments used to approximate each Bezier curve when measuring it.
+CURVE_SEGMENTS = 32
+
+PATH_TOKEN_RE = re.compile(r'([MmLlHhVvCcSsQqTtAaZz])|([-+]?(?:\d*\.\d+|\d+\.?)(?:[eE][-+]?\d+)?)')
+# Number of arguments taken by each path command.
+COMMAND_ARITY = {'M': 2, 'L': 2, 'H': 1, 'V': 1, 'C': 6, 'S': 4, 'Q': 4, 'T': 2, 'A': 7, 'Z': 0}
+
+def parse_path(d):
+    """Splits SVG path data into (command, [numbers]) pairs, expanding implicit repetitions."""
+    commands = []
+    command = None
+    numbers = []
+
+    def flush():
+        if command is None:
+            return
+        arity = COMMAND_ARITY[command.upper()]
+        if arity == 0:
+            commands.append((command, []))
+            return
+        for start in range(0, len(numbers) - arity + 1, arity):
+            # Extra pairs after a moveto are implicit linetos.
+            repeated = command if start == 0 or command not in 'Mm' else ('L' if command == 'M' else 'l')
+            commands.append((repeated, numbers[start:start + arity]))
+
+    for letter, number in PATH_TOKEN_RE.findall(d):
+        if letter:
+            flush()
+            command, numbers = letter, []
+        else:
+            numbers.append(float(number))
+    flush()
+    return commands
+
+def _cubic_length(p0, p1, p2, p3):
+    length = 0.0
+    previous = p0
+    for i in range(1, CURVE_SEGMENTS + 1):
+        t = i / CURVE_SEGMENTS
+        mt = 1 - t
+        point = (
+            mt * mt * mt * p0[0] + 3 * mt * mt * t * p1[0] + 3 * mt * t * t * p2[0] + t * t * t * p3[0],
+            mt * mt * mt * p0[1] + 3 * mt * mt * t * p1[1] + 3 * mt * t * t * p2[1] + t * t * t * p3[1],
+        )
+        length += math.dist(previous, point)
+        previous = point
+    return length
+
+def _quadratic_length(p0, q, p3):
+    # A quadratic Bezier is the cubic with control points 2/3 of the way to q.
+    return _cubic_length(p0, _lerp(p0, q, 2 / 3), _lerp(p3, q, 2 / 3), p3)
+
+def path_length(commands):
+    """Returns the length of parsed path data, as getTotalLength() would report it.
+
+    Arcs, which KanjiVG does not use, are measured as straight lines.
+    """
+    length = 0.0
+    x = y = 0.0
+    start_x = start_y = 0.0
+    # Last control point of the previous command, reflected by S (cubic) and T (quadratic).
+    cubic_control = quadratic_control = None
+
+    for command, args in commands:
+        upper = command.upper()
+        ox, oy = (x, y) if command != upper else (0.0, 0.0)
+        current = (x, y)
+        next_cubic_control = next_quadratic_control = None
+
+        if upper == 'M':
+            x, y = ox + args[0], oy + args[1]
+            start_x, start_y = x, y
+        elif upper in ('L', 'A'):
+            x, y = ox + args[-2], oy + args[-1]
+            length += math.dist(current, (x, y))
+        elif upper == 'H':
+            x = ox + args[0]
+            length += abs(x - current[0])
+        elif upper == 'V':
+            y = oy + args[0]
+            length += abs(y - current[1])
+        elif upper in ('C', 'S'):
+            if upper == 'C':
+                c1 = (ox + args[0], oy + args[1])
+                args = args[2:]
+            elif cubic_control:
+                c1 = (2 * x - cubic_control[0], 2 * y - cubic_control[1])
+            else:
+                c1 = current
+            c2 = (ox + args[0], oy + args[1])
+            x, y = ox + args[2], oy + args[3]
+            length += _cubic_length(current, c1, c2, (x, y))
+            next_cubic_control = c2
+        elif upper in ('Q', 'T'):
+            if upper == 'Q':
+                q = (ox + args[0], oy + args[1])
+                args = args[2:]
+            elif quadratic_control:
+                q = (2 * x - quadratic_control[0], 2 * y - quadratic_control[1])
+            else:
+                q = current
+            x, y = ox + args[0], oy + args[1]
+            length += _quadratic_length(current, q, (x, y))
+            next_quadratic_control = q
+        elif upper == 'Z':
+            x, y = start_x, start_y
+            length += math.dist(current, (x, y))
+
+        cubic_control, quadratic_control = next_cubic_control, next_quadratic_control
+    return length
+
+def _lerp(a, b, t):
+    return (a[0] + (b[0] - a[0]) * t, a[1] + (b[1] - a[1]) * t)
+
+def format_number(value, precision=COORDINATE_PRECISION):
+    """Formats a coordinate with at most 'precision' decimals and no redundant characters."""
+    text = f"{round(value, precision):.{precision}f}".rstrip('0').rstrip('.')
+    if text in ('', '-0', '-'):
+        return '0'
+    if text.startswith('0.'):
+        return text[1:]
+    if text.startswith('-0.'):
+        return '-' + text[2:]
+    return text
+
+def minify_path(commands, precision=COORDINATE_PRECISION):
+    """Re-serializes parsed path data with reduced precision and minimal separators."""
+    parts = []
+    previous_command = None
+    for command, args in commands:
+        # A repeated command (other than moveto) can be left implicit.
+        if command != previous_command or command in 'Mm':
+            parts.append(command)
+            previous_token = command
+        for value in args:
+            token = format_number(value, precision)
+            # A separator is only needed when the next number could merge with the previous one.
+            if not previous_token.isalpha() and not token.startswith('-') and \
+               not (token.startswith('.') and '.' in previous_token):
+                parts.append(',')
+            parts.append(token)
+            previous_token = token
+        previous_command = command
+    return ''.join(parts)
+
+def build_stroke_doc(svg_path, precision=COORDINATE_PRECISION):
+    """
+    Builds the compact stroke document of one KanjiVG SVG: the viewBox plus, in
+    stroke order, each stroke's short id ('s1', 's2', ...), minified path data
+    and precomputed length. Stroke numbers and kvg: metadata are dropped.
+    """
+    root = ET.parse(str(svg_path)).getroot()
+    strokes = []
+    for index, path_element in enumerate(root.iter(f"{{{SVG_NAMESPACE}}}path"), start=1):
+        d = path_element.get('d')
+        if not d:
+            continue
+        minified = minify_path(parse_path(d), precision)
+        stroke_id = (path_element.get('id') or '').rpartition('-')[2] or f"s{index}"
+        strokes.append({
+            'id': stroke_id,
+            'd': minified,
+            # Measured on the minified path, which is what the browser will draw.
+            'length': round(path_length(parse_path(minified)), 2),
+        })
+    return {
+        'viewBox': root.get('viewBox', '0 0 109 109'),
+        'strokes': strokes,
+    }
+
+def build_all_stroke_docs():
+    """
+    Writes the stroke document of every SVG in SVG_DIR, as compact JSON plus a gzip
+    variant, into STROKES_PACK_PATH ('<codepoint>.json' / '<codepoint>.json.gz').
+    Run it after set_svg_animation_loop.py.
+    """
+    if not SVG_DIR.exists():
+        print(f"SVG directory not found: {SVG_DIR}")
+        return
+
+    svg_files = sorted(SVG_DIR.glob('*.svg'))
+    if not svg_files:
+        print(f"No SVG files found in {SVG_DIR}")
+        return
+
+    entries = []
+    error_count = 0
+    svg_bytes = 0
+    doc_bytes = 0
+    for svg_file_path in svg_files:
+        try:
+            doc = build_stroke_doc(svg_file_path)
+        except (ET.ParseError, ValueError, IndexError) as e:
+            print(f"Error building stroke document for {svg_file_path.name}: {e}")
+            error_count += 1
+            continue
+        data = json.dumps(doc, separators=(',', ':')).encode('utf-8')
+        name = svg_file_path.stem + '.json'
+        entries.append((name, data))
+        entries.append((name + '.gz', gzip.compress(data, compresslevel=9, mtime=0)))
+        svg_bytes += svg_file_path.stat().st_size
+        doc_bytes += len(data)
+
+    write_pack(STROKES_PACK_PATH, entries)
+    print(f"\nBuilt {len(entries) // 2} stroke documents into {STROKES_PACK_PATH}.")
+    if svg_bytes:
+        print(f"Uncompressed size: {doc_bytes} bytes ({doc_bytes / svg_bytes:.0%} of {svg_bytes} bytes of SVG).")
+    if error_count > 0:
+        print(f"Encountered errors with {error_count} SVG files.")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    print("Starting stroke document build...")
+    build_all_stroke_docs()
+    print("Stroke document build finished.")
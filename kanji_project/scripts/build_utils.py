@@ -0,0 +1,42 @@
+"""Small file helpers shared by the data build scripts."""
+import contextlib
+import hashlib
+import os
+import tempfile
+
+# Permissions of published files; mkstemp() would otherwise leave them private (0600).
+OUTPUT_FILE_MODE = 0o644
+
+
+@contextlib.contextmanager
+def atomic_output(path):
+    """Yields a binary file object whose contents replace 'path' when the block exits cleanly.
+
+    The data goes to a temporary file in the same directory that is renamed over
+    'path' at the end, so readers (such as the running app) see either the old file
+    or the complete new one, never a partially written file. On error the
+    temporary file is removed and 'path' is left untouched.
+    """
+    path = os.fspath(path)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix='.tmp-', suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            yield f
+        os.chmod(tmp_path, OUTPUT_FILE_MODE)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write_bytes(path, data):
+    """Writes 'data' to 'path' atomically (see atomic_output())."""
+    with atomic_output(path) as f:
+        f.write(data)
+
+
+def sha256_bytes(data):
+    return hashlib.sha256(data).hexdigest()
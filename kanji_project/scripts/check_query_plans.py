@@ -0,0 +1,88 @@
+import argparse
+import pathlib
+import re
+import sqlite3
+import sys
+
+# Define Paths
+BASE_PROJECT_DIR = pathlib.Path(__file__).resolve().parent.parent
+DATABASE_PATH = BASE_PROJECT_DIR / "kanji.db"
+
+# The statements are imported from the app so the check always sees the real SQL.
+sys.path.insert(0, str(BASE_PROJECT_DIR))
+from app import migrations, payloads, routes, search_grams # noqa: E402
+
+# (name, SQL, sample parameters) of every statement on a request path, plus the
+# lookups init_db.py relies on. The parameters only need the right types.
+CHECKED_QUERIES = [
+    ("kanji payload by character", routes.KANJI_PAYLOAD_QUERY, ('一',)),
+    ("kanji payloads by characters", routes.KANJI_PAYLOADS_QUERY, ('["一", "二"]',)),
+    ("kanji payloads by id", routes.KANJI_PAYLOADS_BY_ID_QUERY, ('[1, 2]',)),
+    ("kanjis by id", routes.KANJIS_BY_ID_QUERY, ('[1, 2]',)),
+    ("example words of kanjis", payloads.EXAMPLE_WORDS_QUERY, ('[1, 2]',)),
+    ("full-text search", routes.FTS_SEARCH_QUERY, ('"water"', routes.SEARCH_RESULT_LIMIT)),
+    ("short-term search", routes.SHORT_TERM_SEARCH_QUERY,
+     (search_grams.short_term_query('一'), routes.SEARCH_RESULT_LIMIT)),
+    ("kanjis of an example word", "SELECT kanji_id FROM kanji_example_word_assoc WHERE word_id = ?", (1,)),
+    ("example word by key", "SELECT id FROM example_words WHERE word = ? AND reading = ? AND meaning_es = ?",
+     ('一つ', 'ひとつ', 'one')),
+]
+
+# Virtual tables that only walk the JSON parameter they are given.
+PARAMETER_TABLES = ('json_each', 'json_tree')
+
+# "SCAN <table> VIRTUAL TABLE INDEX <idxNum>:<idxStr>"
+VIRTUAL_SCAN_PATTERN = re.compile(r'SCAN (\S+) VIRTUAL TABLE INDEX \d+:(\S*)')
+
+def full_table_scans(plan_details):
+    """Returns the plan steps that read a whole table.
+
+    Scans of the json_each() parameter lists are expected and not reported.
+    An FTS5 table is only searched through its index when its idxStr carries
+    a MATCH ('M') or rowid ('=') constraint; without one (such as a LIKE, 'L')
+    FTS5 reads every row too.
+    """
+    scans = []
+    for detail in plan_details:
+        if not detail.startswith('SCAN ') or 'CONSTANT ROW' in detail:
+            continue
+        virtual_scan = VIRTUAL_SCAN_PATTERN.match(detail)
+        if virtual_scan:
+            table, constraints = virtual_scan.groups()
+            if table in PARAMETER_TABLES or 'M' in constraints or '=' in constraints:
+                continue
+        scans.append(detail)
+    return scans
+
+def check_query_plans(conn):
+    """Prints the plan of every checked statement; returns the number that scan a table."""
+    failures = 0
+    for name, sql, params in CHECKED_QUERIES:
+        plan_details = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+        scans = full_table_scans(plan_details)
+        print(f"{'FAIL' if scans else 'ok  '} {name}")
+        for detail in plan_details:
+            print(f"       {detail}")
+        if scans:
+            failures += 1
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Verifies with EXPLAIN QUERY PLAN that the API queries use indexes.")
+    parser.add_argument('database', nargs='?', default=str(DATABASE_PATH), help="Database to check (default: kanji.db).")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(pathlib.Path(args.database).resolve().as_uri() + "?mode=ro", uri=True)
+    try:
+        schema_version = migrations.get_schema_version(conn)
+        print(f"Schema version: {schema_version} (latest: {migrations.LATEST_VERSION})")
+        failures = check_query_plans(conn)
+    finally:
+        conn.close()
+    if failures:
+        print(f"\n{failures} queries read a whole table; add an index in app/migrations.py.")
+        sys.exit(1)
+    print("\nAll checked queries use indexes.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import gzip
+import json
+import pathlib
+import sys
+
+try:
+    import brotli # Optional: pip install brotli
+except ImportError:
+    brotli = None
+
+from build_utils import atomic_write_bytes, sha256_bytes
+
+# Define Paths
+BASE_PROJECT_DIR = pathlib.Path(__file__).resolve().parent.parent
+SVG_DIR = BASE_PROJECT_DIR / 'data' / 'kanjivg_svgs'
+
+# Precompressed siblings written next to each SVG: (suffix, compress function).
+# serve_svg in app/routes.py picks one of them according to Accept-Encoding.
+GZIP_SUFFIX = '.gz'
+BROTLI_SUFFIX = '.br'
+ALL_SUFFIXES = (GZIP_SUFFIX, BROTLI_SUFFIX)
+# Records, for each SVG, its size, mtime and SHA-256 and the SHA-256 each of its
+# variants was built from: {svg name: [size, mtime_ns, sha256, {suffix: sha256}]}.
+MANIFEST_FILENAME = 'compressed_variants.json'
+
+def _gzip(data):
+    # mtime=0 keeps the output identical across runs for identical input.
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+def _brotli(data):
+    return brotli.compress(data, quality=11)
+
+def compressed_variants():
+    variants = [(GZIP_SUFFIX, _gzip)]
+    if brotli is not None:
+        variants.append((BROTLI_SUFFIX, _brotli))
+    return variants
+
+def load_manifest(manifest_path):
+    """Reads the manifest of built variants, or returns an empty one if there is none (or it is unreadable)."""
+    try:
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return manifest if isinstance(manifest, dict) else {}
+
+def remove_orphaned_variants(svg_dir):
+    """Deletes .svg.gz/.svg.br files whose SVG no longer exists. Returns how many were removed."""
+    removed_count = 0
+    for suffix in ALL_SUFFIXES:
+        for variant_path in sorted(svg_dir.glob(f'*.svg{suffix}')):
+            if not variant_path.with_name(variant_path.name[:-len(suffix)]).exists():
+                variant_path.unlink()
+                removed_count += 1
+    return removed_count
+
+def compress_all_svgs():
+    """
+    Writes .svg.gz (and .svg.br when the brotli module is installed) next to every SVG.
+    A variant is rebuilt when it is missing or its SVG's content changed since it
+    was built, as recorded in the manifest; the SVG is only hashed again when its
+    size or mtime differ from the recorded ones. Variants whose SVG is gone, and
+    stale .br files that cannot be rebuilt without brotli, are removed. This
+    should run after download_svgs.py and set_svg_animation_loop.py.
+    """
+    if not SVG_DIR.exists():
+        print(f"SVG directory not found: {SVG_DIR}")
+        return
+
+    variants = compressed_variants()
+    if brotli is None:
+        print("brotli module not installed; writing gzip variants only.")
+
+    manifest_path = SVG_DIR / MANIFEST_FILENAME
+    old_manifest = load_manifest(manifest_path)
+    manifest = {}
+    removed_count = remove_orphaned_variants(SVG_DIR)
+    svg_files = sorted(SVG_DIR.glob('*.svg'))
+    written_count = 0
+    up_to_date_count = 0
+    error_count = 0
+    original_bytes = 0
+    compressed_bytes = {suffix: 0 for suffix, _ in variants}
+
+    for svg_file_path in svg_files:
+        try:
+            stat = svg_file_path.stat()
+            data = None
+            entry = old_manifest.get(svg_file_path.name)
+            if isinstance(entry, list) and len(entry) == 4 and entry[:2] == [stat.st_size, stat.st_mtime_ns]:
+                digest, built_from = entry[2], entry[3]
+            else:
+                data = svg_file_path.read_bytes()
+                digest = sha256_bytes(data)
+                built_from = entry[3] if isinstance(entry, list) and len(entry) == 4 else {}
+            built_now = {}
+            for suffix, compress in variants:
+                variant_path = svg_file_path.with_name(svg_file_path.name + suffix)
+                if built_from.get(suffix) == digest and variant_path.exists():
+                    up_to_date_count += 1
+                    compressed_bytes[suffix] += variant_path.stat().st_size
+                    built_now[suffix] = digest
+                    continue
+                if data is None:
+                    data = svg_file_path.read_bytes()
+                compressed = compress(data)
+                atomic_write_bytes(variant_path, compressed)
+                written_count += 1
+                compressed_bytes[suffix] += len(compressed)
+                built_now[suffix] = digest
+            # Variants this run cannot build (.br without brotli) are kept while still current.
+            for suffix in ALL_SUFFIXES:
+                variant_path = svg_file_path.with_name(svg_file_path.name + suffix)
+                if suffix in built_now or not variant_path.exists():
+                    continue
+                if built_from.get(suffix) == digest:
+                    built_now[suffix] = digest
+                else:
+                    variant_path.unlink()
+                    removed_count += 1
+            manifest[svg_file_path.name] = [stat.st_size, stat.st_mtime_ns, digest, built_now]
+            original_bytes += stat.st_size
+        except OSError as e:
+            print(f"Error compressing {svg_file_path.name}: {e}")
+            error_count += 1
+
+    atomic_write_bytes(manifest_path, json.dumps(manifest, sort_keys=True).encode('utf-8'))
+
+    print(f"\nProcessed {len(svg_files)} SVG files.")
+    print(f"Compressed variants written: {written_count}, already up to date: {up_to_date_count}, "
+          f"stale or orphaned removed: {removed_count}")
+    for suffix, total in compressed_bytes.items():
+        if original_bytes:
+            print(f"  {suffix}: {total} bytes ({total / original_bytes:.0%} of {original_bytes} bytes)")
+    if error_count > 0:
+        print(f"Encountered errors with {error_count} SVG files.")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    print("Starting SVG precompression...")
+    compress_all_svgs()
+    print("SVG precompression finished.")
@@ -1,60 +1,50 @@
+import argparse
 import os
 import json
 import requests
 import pathlib
+import shutil
 import sys
+import tarfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from build_utils import atomic_output, atomic_write_bytes
+from http_utils import HttpClient
+from kanji_records import find_kanji_data_file, iter_records
 
 # Define Paths and URLs
 BASE_PROJECT_DIR = pathlib.Path(__file__).resolve().parent.parent
-KANJI_DATA_JSON_PATH = BASE_PROJECT_DIR / 'data' / 'kanji_data.json' # Updated path
+DATA_DIR = BASE_PROJECT_DIR / 'data'
 SVG_OUTPUT_DIR = BASE_PROJECT_DIR / 'data' / 'kanjivg_svgs'
-KANJIVG_BASE_URL = "https://raw.githubusercontent.com/KanjiVG/kanjivg/master/kanji/"
-
-def download_all_svgs():
-    """
-    Downloads Kanji SVG files from KanjiVG based on data from kanji_data.json.
-    """
-    # Ensure output directory exists
-    try:
-        SVG_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-        print(f"Ensured SVG output directory exists at: {SVG_OUTPUT_DIR}")
-    except OSError as e:
-        print(f"Error creating SVG output directory {SVG_OUTPUT_DIR}: {e}")
-        sys.exit(1)
-
-    # Load Kanji data
-    if not KANJI_DATA_JSON_PATH.exists():
-        print(f"Error: Kanji data file {KANJI_DATA_JSON_PATH} not found. Please run fetch_kanji_data.py first.")
-        sys.exit(1)
+# Can be pointed at a local stand-in server with --base-url or KANJIVG_BASE_URL.
+KANJIVG_BASE_URL = os.environ.get("KANJIVG_BASE_URL", "https://raw.githubusercontent.com/KanjiVG/kanjivg/master/kanji/")
 
-    try:
-        with open(KANJI_DATA_JSON_PATH, 'r', encoding='utf-8') as f:
-            kanji_data_list = json.load(f)
-        print(f"Successfully loaded Kanji data from {KANJI_DATA_JSON_PATH}")
-    except json.JSONDecodeError as e:
-        print(f"Error: Invalid JSON in {KANJI_DATA_JSON_PATH}: {e}")
-        sys.exit(1)
-    except IOError as e:
-        print(f"Error reading Kanji data file {KANJI_DATA_JSON_PATH}: {e}")
-        sys.exit(1)
+# Politeness limits towards the SVG host (overridable from the command line).
+DEFAULT_REQUESTS_PER_SECOND = 20.0
+DEFAULT_CONCURRENCY = 8
+# Seconds before a single SVG request is abandoned (and retried by HttpClient).
+REQUEST_TIMEOUT = 10
 
-    if not isinstance(kanji_data_list, list):
-        print(f"Error: Kanji data in {KANJI_DATA_JSON_PATH} is not a list as expected.")
-        sys.exit(1)
+def svg_filename_for(unicode_hex_value):
+    """Returns the KanjiVG file name of a kanji, e.g. '4e00' -> '04e00.svg'.
 
-    # Initialize counters
-    downloaded_count = 0
-    skipped_count = 0
-    error_count = 0
-    not_found_count = 0
+    The Unicode value is hex; KanjiVG uses it in lowercase, zero-padded to 5 digits.
+    """
+    return f"{unicode_hex_value.lower().zfill(5)}.svg"
 
-    print(f"\nStarting SVG download process. Total Kanji entries to process: {len(kanji_data_list)}")
+def collect_missing_svgs(kanji_data_path, counters):
+    """Returns a dict svg_filename -> kanji of the SVGs the dataset needs that are not on disk yet.
 
-    # Iterate and Download
-    for index, kanji_entry in enumerate(kanji_data_list):
+    Records are streamed from 'kanji_data_path'; 'counters' is updated with the
+    entries processed, skipped because the SVG exists, and invalid.
+    """
+    missing = {}
+    for index, kanji_entry in enumerate(iter_records(kanji_data_path)):
+        counters['processed'] += 1
         if not isinstance(kanji_entry, dict):
             print(f"Warning: Entry at index {index} is not a dictionary. Skipping.")
-            error_count +=1
+            counters['errors'] += 1
             continue
 
         unicode_hex_value = kanji_entry.get('unicode')
@@ -62,59 +52,187 @@ def download_all_svgs():
 
         if not unicode_hex_value or not isinstance(unicode_hex_value, str):
             print(f"Warning: Missing or invalid 'unicode' value for Kanji entry '{kanji_char}' (index {index}). Skipping.")
-            error_count += 1
+            counters['errors'] += 1
             continue
 
-        # Format the SVG filename
-        # The Unicode value is hex. Convert it to lowercase.
-        # Ensure it's 5 digits, zero-padded (e.g., "04e00").
-        # Append .svg (e.g., "04e00.svg").
-        svg_filename = f"{unicode_hex_value.lower().zfill(5)}.svg"
-        target_svg_path = SVG_OUTPUT_DIR / svg_filename
-        download_url = KANJIVG_BASE_URL + svg_filename
-
+        svg_filename = svg_filename_for(unicode_hex_value)
         # Check if SVG already exists
-        if target_svg_path.exists():
-            # print(f"Skipping {svg_filename} for Kanji '{kanji_char}', already exists.")
-            skipped_count += 1
+        if (SVG_OUTPUT_DIR / svg_filename).exists():
+            counters['skipped'] += 1
             continue
+        missing[svg_filename] = kanji_char
+    return missing
 
-        # Download
-        print(f"Downloading {svg_filename} for Kanji '{kanji_char}' from {download_url}...")
-        try:
-            response = requests.get(download_url, timeout=10) # 10 second timeout
-            if response.status_code == 200:
-                with open(target_svg_path, 'wb') as f:
-                    f.write(response.content)
-                downloaded_count += 1
-                # print(f"Successfully downloaded {svg_filename}")
-            elif response.status_code == 404:
-                print(f"Warning: SVG {svg_filename} for Kanji '{kanji_char}' not found at source (404). Skipping.")
-                not_found_count += 1
+def download_svg(client, svg_filename, base_url=KANJIVG_BASE_URL):
+    """Downloads one SVG into SVG_OUTPUT_DIR. Returns (status, message); status is 'downloaded', 'not_found' or 'error'."""
+    download_url = base_url + svg_filename
+    try:
+        response = client.get(download_url)
+        if response.status_code == 200:
+            atomic_write_bytes(SVG_OUTPUT_DIR / svg_filename, response.content)
+            return 'downloaded', None
+        if response.status_code == 404:
+            return 'not_found', "not found at source (404)"
+        return 'error', f"Status {response.status_code}"
+    except requests.exceptions.Timeout:
+        return 'error', "Request timed out"
+    except requests.exceptions.RequestException as e:
+        return 'error', str(e)
+    except IOError as e:
+        return 'error', f"could not write {SVG_OUTPUT_DIR / svg_filename}: {e}"
+
+def download_missing_svgs(missing, counters, base_url=KANJIVG_BASE_URL,
+                          requests_per_second=DEFAULT_REQUESTS_PER_SECOND, concurrency=DEFAULT_CONCURRENCY):
+    """Downloads the 'missing' SVGs with 'concurrency' threads sharing one pooled, rate-limited client."""
+    base_url = base_url if base_url.endswith('/') else base_url + '/'
+    print(f"Downloading {len(missing)} SVGs from {base_url} ({concurrency} at a time)...")
+    with HttpClient(requests_per_second=requests_per_second, max_per_host=concurrency, timeout=REQUEST_TIMEOUT) as client, \
+         ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {executor.submit(download_svg, client, svg_filename, base_url): svg_filename
+                   for svg_filename in missing}
+        for index, future in enumerate(as_completed(futures), start=1):
+            svg_filename = futures[future]
+            status, message = future.result()
+            if status == 'downloaded':
+                counters['downloaded'] += 1
+            elif status == 'not_found':
+                print(f"Warning: SVG {svg_filename} for Kanji '{missing[svg_filename]}' {message}. Skipping.")
+                counters['not_found'] += 1
             else:
-                print(f"Error downloading {svg_filename} for Kanji '{kanji_char}': Status {response.status_code}. Skipping.")
-                error_count += 1
-        except requests.exceptions.Timeout:
-            print(f"Error downloading {svg_filename} for Kanji '{kanji_char}': Request timed out. Skipping.")
-            error_count += 1
-        except requests.exceptions.RequestException as e:
-            print(f"Error downloading {svg_filename} for Kanji '{kanji_char}': {e}. Skipping.")
-            error_count += 1
-        except IOError as e:
-            print(f"Error writing SVG file {target_svg_path} for Kanji '{kanji_char}': {e}. Skipping.")
-            error_count +=1
+                print(f"Error downloading {svg_filename} for Kanji '{missing[svg_filename]}': {message}. Skipping.")
+                counters['errors'] += 1
+            if index % 500 == 0 or index == len(missing):
+                print(f"Processed {index}/{len(missing)} SVGs...")
+
+def _iter_archive_members(archive_path):
+    """Yields (member name, open binary file) for every regular file of a zip or tar archive.
+
+    Members are read in place, one at a time: nothing is extracted to disk. Tar
+    archives (optionally gz/bz2/xz compressed) are read as a stream.
+    """
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    with archive.open(info) as member_file:
+                        yield info.filename, member_file
+        return
+    with tarfile.open(archive_path, mode='r|*') as archive:
+        for member in archive:
+            if member.isfile():
+                yield member.name, archive.extractfile(member)
+
+def _is_safe_member_name(member_name):
+    """False for archive member names that are absolute or climb out of the archive ('..')."""
+    parts = member_name.replace('\\', '/').split('/')
+    return not (member_name.startswith(('/', '\\')) or ':' in parts[0] or '..' in parts)
+
+def import_missing_svgs(missing, counters, archive_path):
+    """Copies the 'missing' SVGs out of a local KanjiVG release archive (zip or tar.gz).
+
+    Release archives keep the SVGs under a 'kanji/' directory; files are matched
+    by name, so variants such as '04e00-Kaisho.svg' and other directories are ignored.
+    Members with an absolute path or a '..' component are rejected with a warning.
+    """
+    print(f"Importing {len(missing)} SVGs from {archive_path}...")
+    found = set()
+    try:
+        for member_name, member_file in _iter_archive_members(archive_path):
+            if not _is_safe_member_name(member_name):
+                print(f"Warning: archive member '{member_name}' has an unsafe path. Skipping.")
+                continue
+            svg_filename = member_name.rsplit('/', 1)[-1]
+            if svg_filename not in missing or svg_filename in found:
+                continue
+            try:
+                with atomic_output(SVG_OUTPUT_DIR / svg_filename) as f:
+                    shutil.copyfileobj(member_file, f)
+            except IOError as e:
+                print(f"Error writing SVG file {SVG_OUTPUT_DIR / svg_filename}: {e}. Skipping.")
+                counters['errors'] += 1
+                continue
+            found.add(svg_filename)
+            counters['downloaded'] += 1
+            if len(found) == len(missing):
+                break
+    except (zipfile.BadZipFile, tarfile.TarError) as e:
+        print(f"Error: could not read archive {archive_path}: {e}")
+        sys.exit(1)
+    for svg_filename in missing.keys() - found:
+        print(f"Warning: SVG {svg_filename} for Kanji '{missing[svg_filename]}' not found in the archive. Skipping.")
+        counters['not_found'] += 1
+
+def download_all_svgs(base_url=KANJIVG_BASE_URL, requests_per_second=DEFAULT_REQUESTS_PER_SECOND,
+                      concurrency=DEFAULT_CONCURRENCY, archive_path=None):
+    """
+    Downloads Kanji SVG files from KanjiVG based on the fetched kanji data.
+
+    SVGs already on disk are kept. With 'archive_path', the missing ones are
+    taken from a local KanjiVG release archive instead of the network.
+    """
+    # Ensure output directory exists
+    try:
+        SVG_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+        print(f"Ensured SVG output directory exists at: {SVG_OUTPUT_DIR}")
+    except OSError as e:
+        print(f"Error creating SVG output directory {SVG_OUTPUT_DIR}: {e}")
+        sys.exit(1)
 
+    # Locate Kanji data (records are streamed, not loaded all at once)
+    kanji_data_path = find_kanji_data_file(DATA_DIR)
+    if kanji_data_path is None:
+        print(f"Error: Kanji data file (kanji_data.jsonl or kanji_data.json) not found in {DATA_DIR}. Please run fetch_kanji_data.py first.")
+        sys.exit(1)
+    print(f"Reading Kanji data from {kanji_data_path}")
+    if archive_path is not None and not os.path.isfile(archive_path):
+        print(f"Error: archive {archive_path} not found.")
+        sys.exit(1)
+
+    # Initialize counters
+    counters = {'downloaded': 0, 'skipped': 0, 'errors': 0, 'not_found': 0, 'processed': 0}
+
+    try:
+        missing = collect_missing_svgs(kanji_data_path, counters)
+    except (json.JSONDecodeError, ValueError) as e:
+        print(f"Error: Invalid JSON in {kanji_data_path}: {e}")
+        sys.exit(1)
+    except IOError as e:
+        print(f"Error reading Kanji data file {kanji_data_path}: {e}")
+        sys.exit(1)
+
+    if missing:
+        print("\nStarting SVG download process.")
+        if archive_path is not None:
+            import_missing_svgs(missing, counters, archive_path)
+        else:
+            download_missing_svgs(missing, counters, base_url, requests_per_second, concurrency)
 
     # Print Summary
     print("\n--- SVG Download Summary ---")
-    print(f"Successfully downloaded: {downloaded_count}")
-    print(f"Skipped (already exist): {skipped_count}")
-    print(f"Not found at source (404): {not_found_count}")
-    print(f"Other errors: {error_count}")
-    print(f"Total Kanji entries processed: {len(kanji_data_list)}")
+    print(f"Successfully {'imported' if archive_path else 'downloaded'}: {counters['downloaded']}")
+    print(f"Skipped (already exist): {counters['skipped']}")
+    print(f"Not found at source{'' if archive_path else ' (404)'}: {counters['not_found']}")
+    print(f"Other errors: {counters['errors']}")
+    print(f"Total Kanji entries processed: {counters['processed']}")
     print("---------------------------\n")
+    if counters['errors']:
+        # Exit non-zero so launch.py does not stamp the stage and the failed SVGs
+        # are retried next time. SVGs missing at the source (404) are not errors.
+        print(f"{counters['errors']} SVGs could not be obtained; run the script again to retry them.")
+        sys.exit(1)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Downloads the KanjiVG SVG of every fetched kanji.")
+    parser.add_argument('--archive', default=None,
+                        help="Take the SVGs from a local KanjiVG release archive (.zip or .tar.gz) instead of downloading them.")
+    parser.add_argument('--base-url', default=KANJIVG_BASE_URL,
+                        help=f"Directory URL the SVGs are downloaded from (default: {KANJIVG_BASE_URL}).")
+    parser.add_argument('--rate', type=float, default=DEFAULT_REQUESTS_PER_SECOND,
+                        help=f"Maximum requests per second (default: {DEFAULT_REQUESTS_PER_SECOND}; 0 = unlimited).")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"Downloads in flight at once (default: {DEFAULT_CONCURRENCY}).")
+    args = parser.parse_args()
     print("Starting Kanji SVG download script...")
-    download_all_svgs()
+    download_all_svgs(base_url=args.base_url, requests_per_second=args.rate,
+                      concurrency=args.concurrency, archive_path=args.archive)
     print("Kanji SVG download script finished.")
@@ -1,36 +1,66 @@
-import requests
+import argparse
 import json
 import os
-import time # Import time for adding delays
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+
+from build_utils import atomic_output
+from http_utils import HttpClient
+from kanji_records import DEFAULT_KANJI_DATA_FILENAME, write_records
 
 # KANJI_LIST will be populated from the API
 KANJI_LIST = []
 
 # print(f"Total unique Kanji in KANJI_LIST: {len(KANJI_LIST)}") # For debugging/verification
 
-BASE_URL = "https://kanjiapi.dev/v1/kanji/"
-ALL_KANJI_URL = "https://kanjiapi.dev/v1/kanji/all" # URL for fetching all kanji characters
-WORDS_BASE_URL = "https://kanjiapi.dev/v1/words/" # URL for fetching example words
-OUTPUT_DIR = os.path.join("kanji_project", "data") # Ensure the base path is correct
-OUTPUT_FILE = os.path.join(OUTPUT_DIR, "kanji_data.json") # Updated output filename
+# Root of the API; can be pointed at a local stand-in server with --base-url or KANJI_API_BASE_URL.
+DEFAULT_API_BASE_URL = os.environ.get("KANJI_API_BASE_URL", "https://kanjiapi.dev/v1")
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+OUTPUT_DIR = os.path.join(os.path.dirname(SCRIPT_DIR), "data") # kanji_project/data, whatever the working directory
+OUTPUT_FILE = os.path.join(OUTPUT_DIR, DEFAULT_KANJI_DATA_FILENAME) # JSON Lines; see kanji_records.py
+# Checkpoint log: one JSON line per fetched kanji, appended as results arrive.
+# A rerun only fetches what the journal lacks, and OUTPUT_FILE is assembled from it.
+JOURNAL_FILE = os.path.join(OUTPUT_DIR, "kanji_fetch_journal.jsonl")
 
-def fetch_kanji_data(kanji_char):
+# Politeness limits towards the API (overridable from the command line).
+DEFAULT_REQUESTS_PER_SECOND = 10.0
+DEFAULT_CONCURRENCY = 8
+
+def _api_urls(base_url):
+    base_url = base_url.rstrip('/')
+    return {
+        'kanji': f"{base_url}/kanji/",
+        'all_kanji': f"{base_url}/kanji/all", # URL for fetching all kanji characters
+        'words': f"{base_url}/words/", # URL for fetching example words
+    }
+
+def fetch_kanji_data(client, kanji_char, base_url=DEFAULT_API_BASE_URL):
     """Fetches data for a single kanji character from KanjiAPI.dev."""
-    url = f"{BASE_URL}{kanji_char}"
+    url = f"{_api_urls(base_url)['kanji']}{kanji_char}"
     try:
-        response = requests.get(url)
+        response = client.get(url)
         response.raise_for_status()  # Raise an exception for bad status codes (4xx or 5xx)
         return response.json()
     except requests.exceptions.RequestException as e:
         print(f"Error fetching data for {kanji_char}: {e}")
         return None
+    except json.JSONDecodeError as e:
+        print(f"Error decoding JSON for {kanji_char}: {e}")
+        return None
 
-def fetch_example_words(kanji_char):
-    """Fetches example words for a single kanji character from KanjiAPI.dev."""
-    url = f"{WORDS_BASE_URL}{kanji_char}"
-    print(f"Fetching example words for {kanji_char} from {url}...")
+def fetch_example_words(client, kanji_char, base_url=DEFAULT_API_BASE_URL):
+    """Fetches example words for a single kanji character from KanjiAPI.dev.
+
+    Returns [] when the API has no words for the kanji (404), and None when
+    they could not be fetched, so the kanji is retried instead of being saved
+    without its words.
+    """
+    url = f"{_api_urls(base_url)['words']}{kanji_char}"
     try:
-        response = requests.get(url)
+        response = client.get(url)
         response.raise_for_status()
         return response.json()  # This will be a list of example words
     except requests.exceptions.HTTPError as e:
@@ -39,19 +69,20 @@ def fetch_example_words(kanji_char):
             return [] # Return empty list if no words found, common case
         else:
             print(f"HTTP error fetching example words for {kanji_char}: {e}")
-            return [] # Return empty list on other HTTP errors
+            return None
     except requests.exceptions.RequestException as e:
         print(f"Request error fetching example words for {kanji_char}: {e}")
-        return [] # Return empty list on other request errors
+        return None
     except json.JSONDecodeError as e:
         print(f"Error decoding JSON for example words of {kanji_char}: {e}")
-        return []
+        return None
 
-def fetch_all_kanji_list():
+def fetch_all_kanji_list(client, base_url=DEFAULT_API_BASE_URL):
     """Fetches the list of all kanji characters from KanjiAPI.dev."""
-    print(f"Fetching all kanji list from {ALL_KANJI_URL}...")
+    all_kanji_url = _api_urls(base_url)['all_kanji']
+    print(f"Fetching all kanji list from {all_kanji_url}...")
     try:
-        response = requests.get(ALL_KANJI_URL)
+        response = client.get(all_kanji_url)
         response.raise_for_status()
         kanji_list = response.json()
         print(f"Successfully fetched {len(kanji_list)} kanji characters.")
@@ -63,65 +94,186 @@ def fetch_all_kanji_list():
         print(f"Error decoding JSON from all kanji list: {e}")
         return []
 
-def main():
-    """Main function to fetch data for all kanji and save it to a JSON file."""
+def fetch_kanji_record(client, kanji_char, base_url=DEFAULT_API_BASE_URL):
+    """Fetches one kanji and its example words; returns the record to save, or None on failure."""
+    data = fetch_kanji_data(client, kanji_char, base_url)
+    if not data:
+        return None
+
+    example_words = [] # Default to empty list
+    if data.get("kanji"): # Proceed only if kanji data was fetched successfully
+        # The API uses the kanji character itself in the URL for words
+        example_words = fetch_example_words(client, data.get("kanji"), base_url)
+        if example_words is None:
+            return None
+
+    # Extract required fields, handling missing ones with None
+    return {
+        "kanji": data.get("kanji"),
+        "grade": data.get("grade"),
+        "stroke_count": data.get("stroke_count"),
+        "meanings": data.get("meanings"),
+        "kun_readings": data.get("kun_readings"),
+        "on_readings": data.get("on_readings"),
+        "jlpt": data.get("jlpt"),
+        "unicode": data.get("unicode"),
+        "example_words": example_words # Add the fetched example words
+    }
+
+def load_journal(journal_path=JOURNAL_FILE):
+    """Indexes the checkpoint log: returns a dict kanji -> (fetched_at, byte offset of its line).
+
+    Only the index is kept in memory; records are read back from the file when
+    the output is assembled. Later lines win, and a truncated last line (from an
+    interrupted run) is ignored.
+    """
+    journal = {}
+    try:
+        with open(journal_path, 'rb') as f:
+            offset = 0
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    journal[entry['kanji']] = (entry['fetched_at'], offset)
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    pass
+                offset += len(line)
+    except FileNotFoundError:
+        pass
+    return journal
+
+def _open_journal_for_append(journal_path=JOURNAL_FILE):
+    """Opens the checkpoint log for appending, first terminating a truncated last line."""
+    f = open(journal_path, 'a+b')
+    if f.tell() > 0:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b'\n':
+            f.write(b'\n')
+    return f
+
+def plan_fetch(kanji_list, journal, refresh_ttl=None, now=None):
+    """Returns the kanjis that must be fetched: those missing from the journal or older than refresh_ttl seconds."""
+    now = time.time() if now is None else now
+    return [
+        kanji_char for kanji_char in kanji_list
+        if kanji_char not in journal
+        or (refresh_ttl is not None and now - journal[kanji_char][0] > refresh_ttl)
+    ]
+
+def main(base_url=DEFAULT_API_BASE_URL, requests_per_second=DEFAULT_REQUESTS_PER_SECOND,
+         concurrency=DEFAULT_CONCURRENCY, refresh_ttl=None, restart=False, output_file=None):
+    """Main function to fetch data for all kanji and save it to a JSON Lines file.
+
+    Kanjis are fetched by 'concurrency' threads sharing one pooled HTTP client,
+    limited to 'requests_per_second' overall. Each record is appended to the
+    journal as soon as it arrives, so an interrupted run resumes where it
+    stopped; with 'refresh_ttl' (seconds), records older than that are fetched
+    again. The output is assembled from the journal in the API's order, and is
+    compressed when 'output_file' ends in '.gz' or '.xz' (see kanji_records).
+    """
     global KANJI_LIST # Declare KANJI_LIST as global to modify it
-    all_kanji_data = []
-    processed_count = 0
-    fetch_delay = 0.1 # Small delay of 100ms between requests to be polite to the API
-
-    # Fetch the full list of kanji characters first
-    KANJI_LIST = fetch_all_kanji_list()
-
-    if not KANJI_LIST:
-        print("No kanji list fetched. Exiting.")
-        return
-
-    # Ensure the output directory exists
-    if not os.path.exists(OUTPUT_DIR):
-        os.makedirs(OUTPUT_DIR)
-        print(f"Created directory: {OUTPUT_DIR}")
-
-    for kanji_char in KANJI_LIST:
-        print(f"Fetching data for {kanji_char}...")
-        data = fetch_kanji_data(kanji_char)
-        time.sleep(fetch_delay) # Add delay after kanji data fetch
-
-        example_words = [] # Default to empty list
-        if data and data.get("kanji"): # Proceed only if kanji data was fetched successfully
-            # Fetch example words for the kanji
-            # The API uses the kanji character itself in the URL for words
-            example_words = fetch_example_words(data.get("kanji"))
-            time.sleep(fetch_delay) # Add delay after example words fetch
-
-        if data:
-            # Extract required fields, handling missing ones with None
-            extracted_data = {
-                "kanji": data.get("kanji"),
-                "grade": data.get("grade"),
-                "stroke_count": data.get("stroke_count"),
-                "meanings": data.get("meanings"),
-                "kun_readings": data.get("kun_readings"),
-                "on_readings": data.get("on_readings"),
-                "jlpt": data.get("jlpt"),
-                "unicode": data.get("unicode"),
-                "example_words": example_words # Add the fetched example words
-            }
-            all_kanji_data.append(extracted_data)
-            processed_count += 1
-        else:
-            # Add a placeholder if fetching failed to maintain list integrity if needed,
-            # or simply skip. For now, skipping.
-            print(f"Skipping {kanji_char} due to previous error.")
+    output_file = output_file or OUTPUT_FILE
+
+    with HttpClient(requests_per_second=requests_per_second, max_per_host=concurrency) as client:
+        # Fetch the full list of kanji characters first
+        KANJI_LIST = fetch_all_kanji_list(client, base_url)
 
-    # Save the collected data to a JSON file
+        if not KANJI_LIST:
+            print("No kanji list fetched. Exiting.")
+            sys.exit(1)
+
+        # Ensure the output directory exists
+        if not os.path.exists(OUTPUT_DIR):
+            os.makedirs(OUTPUT_DIR)
+            print(f"Created directory: {OUTPUT_DIR}")
+
+        journal = {} if restart else load_journal(JOURNAL_FILE)
+        pending = plan_fetch(KANJI_LIST, journal, refresh_ttl)
+        print(f"{len(KANJI_LIST) - len(pending)} kanji already in {JOURNAL_FILE}; fetching {len(pending)}.")
+
+        failed_count = 0
+        if restart and os.path.exists(JOURNAL_FILE):
+            os.remove(JOURNAL_FILE)
+        with _open_journal_for_append(JOURNAL_FILE) as journal_file:
+            def save_result(kanji_char, record):
+                nonlocal failed_count
+                if record:
+                    entry = {'kanji': kanji_char, 'fetched_at': time.time(), 'record': record}
+                    journal_file.seek(0, os.SEEK_END)
+                    offset = journal_file.tell()
+                    journal_file.write(json.dumps(entry, ensure_ascii=False).encode('utf-8') + b'\n')
+                    journal_file.flush()
+                    journal[kanji_char] = (entry['fetched_at'], offset)
+                else:
+                    # Not journaled, so the next run tries it again.
+                    print(f"Skipping {kanji_char} due to previous error.")
+                    failed_count += 1
+
+            executor = ThreadPoolExecutor(max_workers=concurrency)
+            futures = {}
+            saved = set()
+            try:
+                for kanji_char in pending:
+                    futures[executor.submit(fetch_kanji_record, client, kanji_char, base_url)] = kanji_char
+                for index, future in enumerate(as_completed(futures), start=1):
+                    kanji_char = futures[future]
+                    save_result(kanji_char, future.result())
+                    saved.add(future)
+                    if index % 500 == 0 or index == len(pending):
+                        print(f"Fetched {index}/{len(pending)} kanji...")
+            except KeyboardInterrupt:
+                # Drop the queued kanjis (leaving the executor would fetch them all first),
+                # then journal the ones that were already in flight.
+                print("\nInterrupted; waiting for the requests in flight...")
+                executor.shutdown(wait=True, cancel_futures=True)
+                for future, kanji_char in futures.items():
+                    if future not in saved and future.done() and not future.cancelled() and future.exception() is None:
+                        save_result(kanji_char, future.result())
+                print(f"{len(journal)} kanji are in {JOURNAL_FILE}; run the script again to fetch the rest.")
+                sys.exit(130)
+            finally:
+                executor.shutdown(wait=False)
+
+    if not any(kanji_char in journal for kanji_char in KANJI_LIST):
+        # Exit non-zero without writing an empty output, which launch.py would take as a finished download.
+        print(f"\nNo kanji could be fetched ({failed_count} failed); run the script again to retry them.")
+        sys.exit(1)
+
+    # Stream the output from the journal, compacting the journal to the current kanji list on the way.
     try:
-        with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-            json.dump(all_kanji_data, f, ensure_ascii=False, indent=4)
-        print(f"\nSuccessfully processed {processed_count} kanji.")
-        print(f"Data saved to {OUTPUT_FILE}")
+        with open(JOURNAL_FILE, 'rb') as old_journal, atomic_output(JOURNAL_FILE) as new_journal:
+            def journaled_records():
+                for kanji_char in KANJI_LIST:
+                    if kanji_char in journal:
+                        old_journal.seek(journal[kanji_char][1])
+                        line = old_journal.readline()
+                        new_journal.write(line)
+                        yield json.loads(line)['record']
+
+            saved_count = write_records(output_file, journaled_records())
+        print(f"\nSuccessfully processed {saved_count} kanji ({len(pending) - failed_count} fetched in this run).")
+        if failed_count:
+            print(f"{failed_count} kanji failed; run the script again to retry them.")
+        print(f"Data saved to {output_file}")
     except IOError as e:
         print(f"Error writing data to file: {e}")
+        sys.exit(1)
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Downloads kanji data and example words from kanjiapi.dev.")
+    parser.add_argument('--base-url', default=DEFAULT_API_BASE_URL,
+                        help=f"API root (default: {DEFAULT_API_BASE_URL}).")
+    parser.add_argument('--rate', type=float, default=DEFAULT_REQUESTS_PER_SECOND,
+                        help=f"Maximum requests per second (default: {DEFAULT_REQUESTS_PER_SECOND}; 0 = unlimited).")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"Requests in flight at once (default: {DEFAULT_CONCURRENCY}).")
+    parser.add_argument('--refresh-days', type=float, default=None,
+                        help="Also re-fetch kanji whose journaled data is older than this many days.")
+    parser.add_argument('--restart', action='store_true',
+                        help="Discard the journal and fetch everything again.")
+    parser.add_argument('--output', default=None,
+                        help=f"Output file (default: {OUTPUT_FILE}); a .gz or .xz suffix compresses it.")
+    args = parser.parse_args()
+    refresh_ttl = args.refresh_days * 24 * 3600 if args.refresh_days is not None else None
+    main(base_url=args.base_url, requests_per_second=args.rate, concurrency=args.concurrency,
+         refresh_ttl=refresh_ttl, restart=args.restart, output_file=args.output)
@@ -0,0 +1,130 @@
+"""HTTP helpers shared by the data download scripts.
+
+HttpClient wraps one keep-alive requests.Session that many threads can use at
+once. It limits the overall request rate with a token bucket and the number of
+requests in flight per host with a semaphore. Responses with status 429 or 5xx,
+and connection errors, are retried with exponential backoff and full jitter,
+honouring Retry-After when the server sends one.
+"""
+import email.utils
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class TokenBucket:
+    """Allows 'rate' acquisitions per second on average, with bursts of up to 'capacity'."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a token is available and takes it. A rate <= 0 disables the limit."""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def _retry_after_seconds(response):
+    """Returns the delay requested by a Retry-After header (seconds or HTTP date), or None."""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class HttpClient:
+    """A thread-safe, rate-limited HTTP client with retries (see the module docstring)."""
+
+    def __init__(self, requests_per_second=10.0, max_per_host=8, max_retries=5,
+                 backoff_base=0.5, backoff_max=30.0, timeout=30.0, user_agent=None):
+        self.bucket = TokenBucket(requests_per_second)
+        self.max_per_host = max_per_host
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.session = requests.Session()
+        # Keep enough pooled connections for every request a host may have in flight.
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(1, max_per_host))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if user_agent:
+            self.session.headers['User-Agent'] = user_agent
+        self._host_slots = {}
+        self._host_slots_lock = threading.Lock()
+
+    def _host_slot(self, url):
+        host = urlsplit(url).netloc
+        with self._host_slots_lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = self._host_slots[host] = threading.BoundedSemaphore(self.max_per_host)
+            return slot
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def get(self, url, **kwargs):
+        """GETs 'url', retrying transient failures.
+
+        Returns the last response, whatever its status (callers use
+        raise_for_status() as with requests.get()). Raises the last
+        requests.exceptions.RequestException if the connection never succeeded.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        slot = self._host_slot(url)
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            try:
+                with slot:
+                    response = self.session.get(url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    return response
+                retry_after = _retry_after_seconds(response)
+                delay = min(self.backoff_max, retry_after) if retry_after is not None else self._backoff(attempt)
+                response.close()
+            attempt += 1
+            time.sleep(delay)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,68 +1,256 @@
+import argparse
+import contextlib
 import sqlite3
 import json
 import os
 import pathlib
+import sys
+import tempfile
+import time
+import hashlib
+import uuid
+from collections import Counter
 
 # Define Paths using pathlib for robustness
 BASE_PROJECT_DIR = pathlib.Path(__file__).resolve().parent.parent
 DATABASE_PATH = BASE_PROJECT_DIR / "kanji.db"
-JSON_DATA_PATH = BASE_PROJECT_DIR / "data" / "kanji_data.json"
+DATA_DIR = BASE_PROJECT_DIR / "data"
 TRANSLATIONS_PATH = BASE_PROJECT_DIR / "data" / "traducciones_es.json"
 SVG_BASE_DIR_IN_STATIC = "svgs"
 
-def get_db_connection():
+# The API payload builder lives in the app package so both sides share it.
+sys.path.insert(0, str(BASE_PROJECT_DIR))
+from app import migrations # noqa: E402
+from app.payloads import KANJI_COLUMNS, encode_payload, rows_to_dicts # noqa: E402
+from app.search_grams import short_term_tokens # noqa: E402
+from build_utils import OUTPUT_FILE_MODE # noqa: E402
+from kanji_records import find_kanji_data_file, iter_record_lines # noqa: E402
+from optimize_db import ( # noqa: E402
+    finalize_database, needs_compaction, page_size_argument, print_size_report, refresh_statistics,
+)
+
+# Kanjis per batch when precomputing 'kanji_payload' rows.
+PAYLOAD_BATCH_SIZE = 500
+# Kanji records buffered before each round of executemany() calls in bulk_load().
+BULK_BATCH_SIZE = 1000
+# Tables written by bulk_load(); their secondary indexes are rebuilt after the load.
+BULK_LOAD_TABLES = ('kanjis', 'example_words', 'kanji_example_word_assoc', 'kanji_record_hash')
+
+class DatabaseCheckError(Exception):
+    """Raised when a freshly built database fails verify_database(); the live file is left alone."""
+
+def get_db_connection(path=None):
     """Establishes a connection to the SQLite database."""
-    conn = sqlite3.connect(DATABASE_PATH)
+    conn = sqlite3.connect(path or DATABASE_PATH)
     conn.row_factory = sqlite3.Row
     return conn
 
+def verify_database(conn, thorough=True):
+    """Checks a built database before it is published. Returns a list of problems (empty if none).
+
+    Without 'thorough', the page-level integrity_check and the FTS index
+    checks, which read the whole file, are skipped: an incremental build starts
+    from a copy of the live database, which passed them when it was published.
+    """
+    problems = []
+    if thorough:
+        integrity = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+        if integrity != ['ok']:
+            problems.extend(integrity)
+    if conn.execute("PRAGMA foreign_key_check").fetchone():
+        problems.append("foreign key violations found")
+    for table in ('kanji_search', 'kanji_search_short') if thorough else ():
+        try:
+            conn.execute(f"INSERT INTO {table} ({table}) VALUES ('integrity-check')")
+        except sqlite3.DatabaseError as e:
+            problems.append(f"{table}: {e}")
+    kanji_count = conn.execute("SELECT count(*) FROM kanjis").fetchone()[0]
+    if kanji_count == 0:
+        problems.append("no kanjis loaded")
+    for table in ('kanji_payload', 'kanji_search', 'kanji_search_short'):
+        table_count = conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+        if table_count != kanji_count:
+            problems.append(f"{table} has {table_count} rows for {kanji_count} kanjis")
+    if not conn.execute("SELECT 1 FROM dataset_meta WHERE key = 'data_version'").fetchone():
+        problems.append("no data_version stamp")
+    return problems
+
+@contextlib.contextmanager
+def staged_database(db_path=None, copy_existing=True, page_size=None, publish_unchanged=False, compact=None):
+    """Yields a connection to a private build copy of the database, published when the block succeeds.
+
+    The copy is a temporary file next to 'db_path', seeded from the current
+    database through SQLite's backup API when 'copy_existing' is true. On a
+    clean exit it is checked with verify_database() and renamed over 'db_path'
+    in one atomic step, so the running app never sees a half-built database; it
+    notices the new file and reopens its connections (see app/db.py). On any
+    error the build copies are deleted and the live database is untouched. An
+    unchanged copy is not published unless 'publish_unchanged' is set.
+
+    'compact' decides whether the copy is finalized first (full checks,
+    statistics and a compacted copy, optionally with a new 'page_size'; see
+    optimize_db.py). By default that happens for a database built from
+    scratch, a new 'page_size', a schema migration or a copy with many free
+    pages (see optimize_db.needs_compaction()); a small incremental change is
+    published as is after the cheap checks, so its cost does not grow with
+    the dataset.
+    """
+    db_path = os.fspath(db_path or DATABASE_PATH)
+    fd, build_path = tempfile.mkstemp(dir=os.path.dirname(db_path) or '.', prefix='.kanji-build-', suffix='.db')
+    os.close(fd)
+    compact_path = build_path + '-compact'
+    conn = None
+    try:
+        conn = get_db_connection(build_path)
+        if copy_existing and os.path.exists(db_path):
+            source = sqlite3.connect(pathlib.Path(db_path).resolve().as_uri() + "?mode=ro", uri=True)
+            try:
+                source.backup(conn)
+            finally:
+                source.close()
+        incremental = copy_existing and os.path.exists(db_path)
+        schema_version = migrations.get_schema_version(conn)
+        yield conn
+        if incremental and conn.total_changes == 0 and not publish_unchanged:
+            return # Nothing changed: republishing would only make the app reload.
+        if compact is None:
+            compact = (not incremental or page_size is not None
+                       or migrations.get_schema_version(conn) != schema_version or needs_compaction(conn))
+        problems = verify_database(conn, thorough=compact)
+        if problems:
+            raise DatabaseCheckError("; ".join(problems))
+        if compact:
+            finalize_database(conn, compact_path, page_size)
+            publish_path = compact_path
+        else:
+            refresh_statistics(conn)
+            publish_path = build_path
+        conn.close()
+        conn = None
+        os.chmod(publish_path, OUTPUT_FILE_MODE)
+        os.replace(publish_path, db_path)
+    finally:
+        if conn is not None:
+            conn.close()
+        for leftover in (build_path, build_path + '-journal', compact_path, compact_path + '-journal'):
+            try:
+                os.unlink(leftover)
+            except FileNotFoundError:
+                pass
+
 def ensure_schema(conn):
-    """Ensures all necessary tables exist in the database."""
-    cursor = conn.cursor()
+    """Brings the database schema up to date (see app/migrations.py).
 
-    # Create 'kanjis' table
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS kanjis (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        kanji_char TEXT UNIQUE NOT NULL,
-        unicode TEXT UNIQUE NOT NULL,
-        meanings TEXT,
-        kun_readings TEXT,
-        on_readings TEXT,
-        stroke_count INTEGER,
-        grade INTEGER,
-        jlpt_level INTEGER,
-        svg_filename TEXT
-    )
-    """)
-    # print("Table 'kanjis' ensured to exist.")
-
-    # Create 'example_words' table
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS example_words (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        word TEXT NOT NULL,
-        reading TEXT NOT NULL,
-        meaning_es TEXT NOT NULL,
-        jlpt_level_word INTEGER,
-        UNIQUE(word, reading, meaning_es)
-    )
-    """)
-    # print("Table 'example_words' ensured to exist.")
-
-    # Create 'kanji_example_word_assoc' table
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS kanji_example_word_assoc (
-        kanji_id INTEGER NOT NULL,
-        word_id INTEGER NOT NULL,
-        PRIMARY KEY (kanji_id, word_id),
-        FOREIGN KEY (kanji_id) REFERENCES kanjis (id) ON DELETE CASCADE,
-        FOREIGN KEY (word_id) REFERENCES example_words (id) ON DELETE CASCADE
+    Returns the (version, description) pairs of the migrations applied.
+    """
+    return migrations.migrate(conn)
+
+def _search_rows(conn, id_filter, params):
+    """Yields (rowid, short-term tokens) for the 'kanji_search' rows selected by 'id_filter'."""
+    cursor = conn.execute(f"""
+    SELECT rowid, kanji_char, meanings, kun_readings, on_readings, example_words
+    FROM kanji_search {id_filter}
+    """, params)
+    for row in cursor:
+        yield row[0], short_term_tokens(row[1:])
+
+def rebuild_search_index(conn, kanji_ids=None):
+    """Rebuilds the 'kanji_search' FTS index (and 'kanji_search_short') from the kanjis and example word tables.
+
+    Example words are flattened into one text column per kanji, one word per line,
+    so a search never has to walk the association table at query time. With
+    'kanji_ids', only those kanjis' rows are refreshed (ids of deleted kanjis
+    just lose their row) and the number of rows written is returned.
+    """
+    cursor = conn.cursor()
+    if kanji_ids is None:
+        cursor.execute("DELETE FROM kanji_search")
+        cursor.execute("INSERT INTO kanji_search_short (kanji_search_short) VALUES ('delete-all')")
+        id_filter, rowid_filter, params = "", "", ()
+    else:
+        ids_json = json.dumps(list(kanji_ids))
+        id_filter = "WHERE k.id IN (SELECT value FROM json_each(?))"
+        rowid_filter = "WHERE rowid IN (SELECT value FROM json_each(?))"
+        params = (ids_json,)
+        # A contentless table forgets a row only when given the tokens it was indexed with,
+        # which are derived again from the old 'kanji_search' text.
+        conn.executemany(
+            "INSERT INTO kanji_search_short (kanji_search_short, rowid, grams) VALUES ('delete', ?, ?)",
+            list(_search_rows(conn, rowid_filter, params))
+        )
+        cursor.execute(f"DELETE FROM kanji_search {rowid_filter}", params)
+    cursor.execute(f"""
+    INSERT INTO kanji_search (rowid, kanji_char, meanings, kun_readings, on_readings, example_words)
+    SELECT
+        k.id, k.kanji_char, k.meanings, k.kun_readings, k.on_readings,
+        (SELECT group_concat(ew.word || char(10) || ew.meaning_es, char(10))
+         FROM kanji_example_word_assoc kwa
+         JOIN example_words ew ON ew.id = kwa.word_id
+         WHERE kwa.kanji_id = k.id)
+    FROM kanjis k
+    {id_filter}
+    """, params)
+    refreshed = cursor.rowcount
+    conn.executemany(
+        "INSERT INTO kanji_search_short (rowid, grams) VALUES (?, ?)",
+        _search_rows(conn, rowid_filter, params)
     )
-    """)
-    # print("Table 'kanji_example_word_assoc' ensured to exist.")
-    
+    if kanji_ids is not None:
+        conn.commit()
+        return refreshed
+    # The index segments are merged by optimize_db.gather_statistics() before publishing.
+    conn.commit()
+    return cursor.execute("SELECT count(*) FROM kanji_search").fetchone()[0]
+
+def rebuild_payload_table(conn, kanji_ids=None):
+    """Precomputes the API payload of every kanji (or only of 'kanji_ids') into 'kanji_payload'.
+
+    The app serves these rows verbatim, so meaning translation and JSON
+    serialization happen here once instead of on every request.
+    """
+    cursor = conn.cursor()
+    if kanji_ids is None:
+        cursor.execute("DELETE FROM kanji_payload")
+        cursor.execute(f"SELECT {KANJI_COLUMNS} FROM kanjis k ORDER BY k.id")
+    else:
+        ids_json = json.dumps(list(kanji_ids))
+        cursor.execute("DELETE FROM kanji_payload WHERE kanji_id IN (SELECT value FROM json_each(?))", (ids_json,))
+        cursor.execute(
+            f"SELECT {KANJI_COLUMNS} FROM kanjis k WHERE k.id IN (SELECT value FROM json_each(?)) ORDER BY k.id",
+            (ids_json,)
+        )
+    payload_count = 0
+    while True:
+        rows = cursor.fetchmany(PAYLOAD_BATCH_SIZE)
+        if not rows:
+            break
+        conn.executemany(
+            "INSERT INTO kanji_payload (kanji_id, kanji_char, payload) VALUES (?, ?, ?)",
+            [(kanji_data['kanji_id'], kanji_data['kanji_char'], encode_payload(kanji_data))
+             for kanji_data in rows_to_dicts(rows, conn)]
+        )
+        payload_count += len(rows)
     conn.commit()
+    return payload_count
+
+def write_data_version(conn):
+    """Stamps the database with a new random 'data_version', so clients' cached responses get revalidated."""
+    data_version = uuid.uuid4().hex
+    conn.execute("INSERT OR REPLACE INTO dataset_meta (key, value) VALUES ('data_version', ?)", (data_version,))
+    conn.commit()
+    return data_version
+
+def rebuild_derived_tables(conn, kanji_ids=None):
+    """Regenerates every table derived from the kanji/example word data.
+
+    Must run after any change to 'kanjis', 'example_words' or their associations.
+    Pass 'kanji_ids' to only refresh the rows of the kanjis that changed.
+    """
+    return {
+        'search_index': rebuild_search_index(conn, kanji_ids),
+        'payloads': rebuild_payload_table(conn, kanji_ids),
+        'data_version': write_data_version(conn),
+    }
 
 def format_svg_filename(unicode_hex):
     """Formats the Unicode hex string to a 5-digit zero-padded SVG filename."""
@@ -76,167 +264,429 @@ def list_to_comma_separated_string(data_list):
         return ",".join(data_list)
     return None
 
-def main():
-    """Initializes the database, creates tables, and populates them with data."""
-    if not JSON_DATA_PATH.exists():
-        print(f"Error: JSON data file not found at {JSON_DATA_PATH}")
-        print("Please run the fetch_kanji_data.py script first, or ensure the JSON file path is correct.")
+def example_word_variants(kanji_entry, stats):
+    """Yields (word, reading, meaning) for every usable example word variant of a kanji record.
+
+    The meaning is the first gloss of the word's first sense. Entries and
+    variants that lack data are counted in 'stats' and skipped.
+    """
+    json_example_words_list = kanji_entry.get("example_words", [])
+    if not isinstance(json_example_words_list, list):
         return
+    for ex_word_entry_from_json in json_example_words_list:
+        stats['example_words_processed_from_json'] += 1
 
-    conn = None
-    kanjis_processed_count = 0
-    example_words_processed_from_json = 0
-    newly_inserted_example_words_count = 0
-    associations_made_count = 0
-    skipped_incomplete_json_examples = 0 # Counts JSON example word entries that couldn't be processed
-    skipped_variant_data = 0 # Counts variants skipped due to missing word/reading/meaning
-    
+        meanings_list_for_word = ex_word_entry_from_json.get("meanings", [])
+        english_meaning_for_word = None
+        if meanings_list_for_word and isinstance(meanings_list_for_word, list) and \
+           len(meanings_list_for_word) > 0 and \
+           isinstance(meanings_list_for_word[0].get("glosses"), list) and \
+           len(meanings_list_for_word[0]["glosses"]) > 0:
+            english_meaning_for_word = meanings_list_for_word[0]["glosses"][0]
+        else:
+            # This example word entry in JSON lacks a usable English meaning
+            stats['skipped_incomplete_json_examples'] += 1
+            continue
+
+        variants_list = ex_word_entry_from_json.get("variants", [])
+        if not isinstance(variants_list, list) or not variants_list:
+            # This example word entry has no variants, or variants is not a list
+            stats['skipped_incomplete_json_examples'] += 1
+            continue
+
+        for variant in variants_list:
+            written_word = variant.get("written")
+            pronounced_reading = variant.get("pronounced")
+            if not all([written_word, pronounced_reading, english_meaning_for_word]):
+                stats['skipped_variant_data'] += 1
+                continue
+            yield written_word, pronounced_reading, english_meaning_for_word
+
+def kanji_row(kanji_entry):
+    """Returns the 'kanjis' column values (without id) for a kanji record."""
+    return (
+        kanji_entry.get("kanji"),
+        kanji_entry.get("unicode"),
+        list_to_comma_separated_string(kanji_entry.get("meanings", [])),
+        list_to_comma_separated_string(kanji_entry.get("kun_readings")),
+        list_to_comma_separated_string(kanji_entry.get("on_readings")),
+        kanji_entry.get("stroke_count"),
+        kanji_entry.get("grade"),
+        kanji_entry.get("jlpt"),
+        format_svg_filename(kanji_entry.get("unicode")),
+    )
+
+def record_hash(kanji_entry):
+    """Returns a stable hash of a kanji record's content, for 'kanji_record_hash'."""
+    canonical = json.dumps(kanji_entry, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+def line_hash(line):
+    """Returns the hash of a record's raw line in the dataset file (see kanji_records.iter_record_lines())."""
+    return hashlib.sha256(line).hexdigest()
+
+def drop_secondary_indexes(conn, tables):
+    """Drops the explicitly created indexes of 'tables' and returns their SQL, for recreate_indexes().
+
+    Indexes that back UNIQUE or PRIMARY KEY constraints cannot be dropped and are kept.
+    """
+    rows = conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL "
+        "AND tbl_name IN (SELECT value FROM json_each(?))",
+        (json.dumps(list(tables)),)
+    ).fetchall()
+    for row in rows:
+        conn.execute(f'DROP INDEX "{row["name"]}"')
+    return [row['sql'] for row in rows]
+
+def recreate_indexes(conn, index_sql):
+    for sql in index_sql:
+        conn.execute(sql)
+
+def bulk_load(conn, record_lines, batch_size=BULK_BATCH_SIZE):
+    """Upserts kanji records (JSON lines, as bytes) and their example words in a single transaction.
+
+    Word ids are resolved in Python with a (word, reading, meaning) -> id map
+    seeded from the table, and new rows get explicit ids, so every insert can
+    be batched with executemany() without reading ids back. Secondary indexes
+    are dropped for the load and rebuilt once at the end. The load runs with
+    synchronous=OFF and an in-memory rollback journal, which is safe because it
+    writes to a build copy (see staged_database()) that is discarded on failure.
+
+    Returns a Counter with the load statistics.
+    """
+    stats = Counter()
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA journal_mode = MEMORY")
+    conn.execute("BEGIN")
     try:
-        conn = get_db_connection()
-        ensure_schema(conn)
+        index_sql = drop_secondary_indexes(conn, BULK_LOAD_TABLES)
 
-        with open(JSON_DATA_PATH, 'r', encoding='utf-8') as f:
-            kanji_data_list = json.load(f)
+        kanji_ids = {row['kanji_char']: row['id'] for row in conn.execute("SELECT id, kanji_char FROM kanjis")}
+        word_ids = {
+            (row['word'], row['reading'], row['meaning_es']): row['id']
+            for row in conn.execute("SELECT id, word, reading, meaning_es FROM example_words")
+        }
+        next_kanji_id = conn.execute("SELECT coalesce(max(id), 0) + 1 FROM kanjis").fetchone()[0]
+        next_word_id = conn.execute("SELECT coalesce(max(id), 0) + 1 FROM example_words").fetchone()[0]
 
-        cursor = conn.cursor()
-        print(f"Starting database population with {len(kanji_data_list)} kanji entries from JSON...")
+        kanji_rows, word_rows, assoc_rows, hash_rows = [], [], [], []
 
-        for kanji_entry in kanji_data_list:
+        def flush():
+            conn.executemany("""
+            INSERT INTO kanjis (
+                id, kanji_char, unicode, meanings, kun_readings, on_readings,
+                stroke_count, grade, jlpt_level, svg_filename
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(kanji_char) DO UPDATE SET
+                unicode=excluded.unicode,
+                meanings=excluded.meanings,
+                kun_readings=excluded.kun_readings,
+                on_readings=excluded.on_readings,
+                stroke_count=excluded.stroke_count,
+                grade=excluded.grade,
+                jlpt_level=excluded.jlpt_level,
+                svg_filename=excluded.svg_filename
+            """, kanji_rows)
+            conn.executemany(
+                "INSERT INTO example_words (id, word, reading, meaning_es, jlpt_level_word) VALUES (?, ?, ?, ?, NULL)",
+                word_rows
+            )
+            changes_before = conn.total_changes
+            conn.executemany("INSERT OR IGNORE INTO kanji_example_word_assoc (kanji_id, word_id) VALUES (?, ?)", assoc_rows)
+            stats['associations_made'] += conn.total_changes - changes_before
+            conn.executemany(
+                "INSERT OR REPLACE INTO kanji_record_hash (kanji_id, content_hash, line_hash) VALUES (?, ?, ?)",
+                hash_rows
+            )
+            kanji_rows.clear()
+            word_rows.clear()
+            assoc_rows.clear()
+            hash_rows.clear()
+
+        for line in record_lines:
+            kanji_entry = json.loads(line)
             if not kanji_entry or not kanji_entry.get("kanji") or not kanji_entry.get("unicode"):
                 continue
-            
+
             kanji_char = kanji_entry.get("kanji")
-            svg_filename = format_svg_filename(kanji_entry.get("unicode"))
-            original_meanings_list = kanji_entry.get("meanings", [])
-            meanings_to_store_str = list_to_comma_separated_string(original_meanings_list)
-            kun_readings_str = list_to_comma_separated_string(kanji_entry.get("kun_readings"))
-            on_readings_str = list_to_comma_separated_string(kanji_entry.get("on_readings"))
-            grade = kanji_entry.get("grade")
-            jlpt = kanji_entry.get("jlpt")
-
-            current_kanji_id = None
-            try:
-                cursor.execute("""
+            kanji_id = kanji_ids.get(kanji_char)
+            if kanji_id is None:
+                kanji_id = kanji_ids[kanji_char] = next_kanji_id
+                next_kanji_id += 1
+            kanji_rows.append((kanji_id,) + kanji_row(kanji_entry))
+            hash_rows.append((kanji_id, record_hash(kanji_entry), line_hash(line)))
+            stats['kanjis_processed'] += 1
+
+            for word_key in example_word_variants(kanji_entry, stats):
+                word_id = word_ids.get(word_key)
+                if word_id is None:
+                    word_id = word_ids[word_key] = next_word_id
+                    next_word_id += 1
+                    word_rows.append((word_id,) + word_key)
+                    stats['new_example_words'] += 1
+                assoc_rows.append((kanji_id, word_id))
+
+            if len(kanji_rows) >= batch_size:
+                flush()
+        flush()
+
+        recreate_indexes(conn, index_sql)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return stats
+
+def _example_word_id(conn, word_key, stats):
+    """Returns the id of an example word, inserting it if it is new."""
+    row = conn.execute(
+        "SELECT id FROM example_words WHERE word = ? AND reading = ? AND meaning_es = ?", word_key
+    ).fetchone()
+    if row:
+        return row['id']
+    stats['new_example_words'] += 1
+    return conn.execute(
+        "INSERT INTO example_words (word, reading, meaning_es, jlpt_level_word) VALUES (?, ?, ?, NULL)", word_key
+    ).lastrowid
+
+def _associated_word_ids(conn, kanji_id):
+    return {row['word_id'] for row in conn.execute(
+        "SELECT word_id FROM kanji_example_word_assoc WHERE kanji_id = ?", (kanji_id,)
+    )}
+
+def diff_load(conn, record_lines):
+    """Applies only what changed between 'record_lines' (JSON, as bytes) and the database, in one transaction.
+
+    A line whose hash was stored when its kanji was last loaded is skipped
+    without being parsed. Any other line is parsed and its content hash
+    compared with the stored one, so a record that was only reformatted is not
+    reloaded either: unchanged kanjis are skipped, new ones inserted and changed
+    ones updated, with their associations adjusted to the new word list.
+    Kanjis absent from 'record_lines' are deleted, and so are example words
+    left without any association. Database work is proportional to the number
+    of changes; only reading and hashing the lines touches the whole dataset.
+
+    Associations that do not come from the dataset (such as the curated words of
+    populate_examples.py) are dropped when their kanji changes; rerun that
+    script afterwards, as launch.py does.
+
+    Returns (stats Counter, ids of the kanjis inserted, updated or deleted).
+    """
+    stats = Counter()
+    touched_ids = []
+    conn.execute("BEGIN")
+    try:
+        known = {}
+        # Stored line hash -> kanji it was loaded for.
+        known_lines = {}
+        for row in conn.execute(
+            "SELECT k.id, k.kanji_char, h.content_hash, h.line_hash FROM kanjis k "
+            "LEFT JOIN kanji_record_hash h ON h.kanji_id = k.id"
+        ):
+            known[row['kanji_char']] = (row['id'], row['content_hash'])
+            if row['line_hash'] is not None:
+                known_lines[row['line_hash']] = row['kanji_char']
+        seen = set()
+        orphan_candidates = set()
+
+        for line in record_lines:
+            raw_hash = line_hash(line)
+            kanji_char = known_lines.get(raw_hash)
+            if kanji_char is not None:
+                seen.add(kanji_char)
+                stats['kanjis_unchanged'] += 1
+                continue
+            kanji_entry = json.loads(line)
+            if not kanji_entry or not kanji_entry.get("kanji") or not kanji_entry.get("unicode"):
+                continue
+            kanji_char = kanji_entry.get("kanji")
+            seen.add(kanji_char)
+            content_hash = record_hash(kanji_entry)
+            kanji_id, old_hash = known.get(kanji_char, (None, None))
+            if content_hash == old_hash:
+                # Same record, written differently (or loaded before line hashes were stored).
+                conn.execute("UPDATE kanji_record_hash SET line_hash = ? WHERE kanji_id = ?", (raw_hash, kanji_id))
+                stats['kanjis_unchanged'] += 1
+                continue
+
+            row = kanji_row(kanji_entry)
+            if kanji_id is None:
+                kanji_id = conn.execute("""
                 INSERT INTO kanjis (
-                    kanji_char, unicode, meanings, kun_readings, on_readings, 
+                    kanji_char, unicode, meanings, kun_readings, on_readings,
                     stroke_count, grade, jlpt_level, svg_filename
                 ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ON CONFLICT(kanji_char) DO UPDATE SET
-                    unicode=excluded.unicode,
-                    meanings=excluded.meanings,
-                    kun_readings=excluded.kun_readings,
-                    on_readings=excluded.on_readings,
-                    stroke_count=excluded.stroke_count,
-                    grade=excluded.grade,
-                    jlpt_level=excluded.jlpt_level,
-                    svg_filename=excluded.svg_filename
-                RETURNING id;
-                """, (
-                    kanji_char, kanji_entry.get("unicode"), meanings_to_store_str, 
-                    kun_readings_str, on_readings_str, kanji_entry.get("stroke_count"),
-                    grade, jlpt, svg_filename
-                ))
-                result = cursor.fetchone()
-                if result:
-                    current_kanji_id = result['id'] 
-                    kanjis_processed_count +=1 
-                else: 
-                    cursor.execute("SELECT id FROM kanjis WHERE kanji_char = ?", (kanji_char,))
-                    id_row = cursor.fetchone()
-                    if id_row:
-                        current_kanji_id = id_row['id']
-                    else:
-                        # print(f"CRITICAL: Kanji {kanji_char} was supposedly inserted/updated but ID could not be retrieved.")
-                        pass # Soft fail for this kanji's examples
-            except sqlite3.Error as e:
-                # print(f"Error processing kanji {kanji_char}: {e}")
-                continue 
-
-            if not current_kanji_id:
-                # print(f"Could not obtain ID for kanji {kanji_char}. Skipping example words.")
+                """, row).lastrowid
+                known[kanji_char] = (kanji_id, content_hash)
+                old_word_ids = set()
+                stats['kanjis_inserted'] += 1
+            else:
+                conn.execute("""
+                UPDATE kanjis SET
+                    unicode = ?, meanings = ?, kun_readings = ?, on_readings = ?,
+                    stroke_count = ?, grade = ?, jlpt_level = ?, svg_filename = ?
+                WHERE id = ?
+                """, row[1:] + (kanji_id,))
+                old_word_ids = _associated_word_ids(conn, kanji_id)
+                stats['kanjis_updated'] += 1
+
+            new_word_ids = {_example_word_id(conn, word_key, stats)
+                            for word_key in example_word_variants(kanji_entry, stats)}
+            conn.executemany(
+                "DELETE FROM kanji_example_word_assoc WHERE kanji_id = ? AND word_id = ?",
+                [(kanji_id, word_id) for word_id in old_word_ids - new_word_ids]
+            )
+            conn.executemany(
+                "INSERT INTO kanji_example_word_assoc (kanji_id, word_id) VALUES (?, ?)",
+                [(kanji_id, word_id) for word_id in new_word_ids - old_word_ids]
+            )
+            stats['associations_removed'] += len(old_word_ids - new_word_ids)
+            stats['associations_made'] += len(new_word_ids - old_word_ids)
+            orphan_candidates.update(old_word_ids - new_word_ids)
+            conn.execute(
+                "INSERT OR REPLACE INTO kanji_record_hash (kanji_id, content_hash, line_hash) VALUES (?, ?, ?)",
+                (kanji_id, content_hash, raw_hash)
+            )
+            touched_ids.append(kanji_id)
+
+        for kanji_char, (kanji_id, _) in known.items():
+            if kanji_char in seen:
                 continue
+            old_word_ids = _associated_word_ids(conn, kanji_id)
+            orphan_candidates.update(old_word_ids)
+            stats['associations_removed'] += len(old_word_ids)
+            conn.execute("DELETE FROM kanji_example_word_assoc WHERE kanji_id = ?", (kanji_id,))
+            conn.execute("DELETE FROM kanji_record_hash WHERE kanji_id = ?", (kanji_id,))
+            conn.execute("DELETE FROM kanjis WHERE id = ?", (kanji_id,))
+            stats['kanjis_deleted'] += 1
+            touched_ids.append(kanji_id)
 
-            json_example_words_list = kanji_entry.get("example_words", [])
-            if isinstance(json_example_words_list, list):
-                for ex_word_entry_from_json in json_example_words_list:
-                    example_words_processed_from_json += 1
-                    
-                    meanings_list_for_word = ex_word_entry_from_json.get("meanings", [])
-                    english_meaning_for_word = None
-                    if meanings_list_for_word and isinstance(meanings_list_for_word, list) and \
-                       len(meanings_list_for_word) > 0 and \
-                       isinstance(meanings_list_for_word[0].get("glosses"), list) and \
-                       len(meanings_list_for_word[0]["glosses"]) > 0:
-                        english_meaning_for_word = meanings_list_for_word[0]["glosses"][0]
-                    else:
-                        # This example word entry in JSON lacks a usable English meaning
-                        skipped_incomplete_json_examples +=1
-                        continue # Skip this whole example word entry from JSON
-
-                    variants_list = ex_word_entry_from_json.get("variants", [])
-                    if not isinstance(variants_list, list) or not variants_list:
-                        # This example word entry has no variants, or variants is not a list
-                        skipped_incomplete_json_examples +=1 # Count it as skipped
-                        continue # Skip this whole example word entry from JSON
-
-                    for variant in variants_list:
-                        written_word = variant.get("written")
-                        pronounced_reading = variant.get("pronounced")
-                        
-                        if not all([written_word, pronounced_reading, english_meaning_for_word]):
-                            skipped_variant_data += 1
-                            continue 
-                        
-                        current_word_id = None
-                        try:
-                            cursor.execute("""
-                            INSERT OR IGNORE INTO example_words (word, reading, meaning_es, jlpt_level_word) 
-                            VALUES (?, ?, ?, ?)
-                            """, (written_word, pronounced_reading, english_meaning_for_word, None))
-                            
-                            was_new_word_db_insertion = cursor.rowcount > 0
-                            if was_new_word_db_insertion:
-                                 newly_inserted_example_words_count +=1
-                            
-                            cursor.execute("SELECT id FROM example_words WHERE word = ? AND reading = ? AND meaning_es = ?", 
-                                           (written_word, pronounced_reading, english_meaning_for_word))
-                            word_id_row = cursor.fetchone()
-                            if word_id_row:
-                                current_word_id = word_id_row['id']
-                            else:
-                                continue
-                        except sqlite3.Error as e:
-                            continue 
-
-                        if current_word_id and current_kanji_id:
-                            try:
-                                cursor.execute("INSERT OR IGNORE INTO kanji_example_word_assoc (kanji_id, word_id) VALUES (?, ?)", 
-                                               (current_kanji_id, current_word_id))
-                                if cursor.rowcount > 0:
-                                    associations_made_count +=1
-                            except sqlite3.Error as e:
-                                pass 
-            
+        changes_before = conn.total_changes
+        conn.executemany(
+            "DELETE FROM example_words WHERE id = ? "
+            "AND NOT EXISTS (SELECT 1 FROM kanji_example_word_assoc WHERE word_id = ?)",
+            [(word_id, word_id) for word_id in orphan_candidates]
+        )
+        stats['example_words_deleted'] += conn.total_changes - changes_before
         conn.commit()
-        print(f"\nDatabase population complete.")
-        print(f"Kanjis processed/updated in DB: {kanjis_processed_count}")
-        print(f"Total example word entries (from JSON structure) processed: {example_words_processed_from_json}")
-        print(f"Example word entries (from JSON) skipped due to no meanings/variants: {skipped_incomplete_json_examples}")
-        print(f"Example word variants (within an entry) skipped due to missing data: {skipped_variant_data}")
-        print(f"New unique example word variants actually inserted into DB: {newly_inserted_example_words_count}")
-        print(f"New associations made between kanjis and word variants: {associations_made_count}")
+    except BaseException:
+        conn.rollback()
+        raise
+    return stats, touched_ids
+
+def main(full=False, page_size=None):
+    """Initializes the database, creates tables, and populates them with data.
+
+    The work happens on a build copy that replaces kanji.db only once it is
+    complete and verified. Without an existing database (or with 'full') the
+    copy starts empty and is bulk-loaded; otherwise it starts from the current
+    database and only the kanjis whose records changed are applied (see diff_load()).
+    A full build, or one that left many free pages, is analyzed and compacted
+    before publishing (see optimize_db.py), with 'page_size' if given; a small
+    change is published without that rewrite. A size report is printed.
+    """
+    json_data_path = find_kanji_data_file(DATA_DIR)
+    if json_data_path is None:
+        print(f"Error: no kanji data file (kanji_data.jsonl or kanji_data.json) found in {DATA_DIR}")
+        print("Please run the fetch_kanji_data.py script first, or ensure the JSON file path is correct.")
+        sys.exit(1)
+
+    differential = not full and database_has_kanjis(DATABASE_PATH)
+    try:
+        with staged_database(DATABASE_PATH, copy_existing=differential, page_size=page_size,
+                             publish_unchanged=page_size is not None) as conn:
+            applied_migrations = ensure_schema(conn)
+            for version, description in applied_migrations:
+                print(f"Applied schema migration {version}: {description}")
+            # New tables start empty, so after a migration every derived row is rebuilt.
+            changed = load_database(conn, json_data_path, differential, rebuild_derived=bool(applied_migrations))
+        if changed or applied_migrations or page_size is not None:
+            print(f"Published {DATABASE_PATH}.")
+            print_size_report(DATABASE_PATH)
 
+    # Any failure exits non-zero, so launch.py does not stamp the stage as done.
+    except DatabaseCheckError as e:
+        print(f"Error: the new database failed its checks ({e}); {DATABASE_PATH} was left unchanged.")
+        sys.exit(1)
     except sqlite3.Error as e:
         print(f"Database error: {e}")
+        sys.exit(1)
     except FileNotFoundError: 
-        print(f"Error: JSON data file not found at {JSON_DATA_PATH}.")
+        print(f"Error: JSON data file not found at {json_data_path}.")
+        sys.exit(1)
     except json.JSONDecodeError: 
-        print(f"Error: Could not decode JSON from {JSON_DATA_PATH}.")
+        print(f"Error: Could not decode JSON from {json_data_path}.")
+        sys.exit(1)
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
+        sys.exit(1)
+
+def database_has_kanjis(db_path):
+    """True if 'db_path' exists and its 'kanjis' table has rows."""
+    if not os.path.exists(db_path):
+        return False
+    conn = sqlite3.connect(pathlib.Path(db_path).resolve().as_uri() + "?mode=ro", uri=True)
+    try:
+        return conn.execute("SELECT 1 FROM kanjis LIMIT 1").fetchone() is not None
+    except sqlite3.Error:
+        return False
     finally:
-        if conn:
-            conn.close()
+        conn.close()
+
+def load_database(conn, json_data_path, differential, rebuild_derived=False):
+    """Loads the records of 'json_data_path' into 'conn' and prints a report.
+
+    A differential load refreshes the derived tables of the changed kanjis
+    only, or of all of them with 'rebuild_derived'. Returns False if a
+    differential load found nothing to change.
+    """
+    if differential:
+        print(f"Applying changes from {json_data_path}...")
+        started = time.perf_counter()
+        stats, touched_ids = diff_load(conn, iter_record_lines(json_data_path))
+        elapsed = time.perf_counter() - started
+        if touched_ids or rebuild_derived:
+            derived_counts = rebuild_derived_tables(conn, None if rebuild_derived else touched_ids)
+        print(f"\nDifferential update complete in {elapsed:.2f}s.")
+        print(f"Kanjis inserted: {stats['kanjis_inserted']}, updated: {stats['kanjis_updated']}, "
+              f"deleted: {stats['kanjis_deleted']}, unchanged: {stats['kanjis_unchanged']}")
+        print(f"Example words inserted: {stats['new_example_words']}, deleted (orphaned): {stats['example_words_deleted']}")
+        print(f"Associations added: {stats['associations_made']}, removed: {stats['associations_removed']}")
+        if touched_ids or rebuild_derived:
+            print(f"Search index and API payload rows refreshed: {derived_counts['payloads']}")
+            print(f"Data version: {derived_counts['data_version']}")
+        else:
+            print("Database already up to date.")
+        return bool(touched_ids) or rebuild_derived
+
+    print(f"Starting database population with kanji entries from {json_data_path}...")
+    started = time.perf_counter()
+    # Records are streamed one at a time, so memory use does not grow with the dataset.
+    stats = bulk_load(conn, iter_record_lines(json_data_path))
+    elapsed = time.perf_counter() - started
+    rows_written = stats['kanjis_processed'] + stats['new_example_words'] + stats['associations_made']
+
+    derived_counts = rebuild_derived_tables(conn)
+    print(f"\nDatabase population complete.")
+    print(f"Kanjis processed/updated in DB: {stats['kanjis_processed']}")
+    print(f"Total example word entries (from JSON structure) processed: {stats['example_words_processed_from_json']}")
+    print(f"Example word entries (from JSON) skipped due to no meanings/variants: {stats['skipped_incomplete_json_examples']}")
+    print(f"Example word variants (within an entry) skipped due to missing data: {stats['skipped_variant_data']}")
+    print(f"New unique example word variants actually inserted into DB: {stats['new_example_words']}")
+    print(f"New associations made between kanjis and word variants: {stats['associations_made']}")
+    print(f"Loaded {rows_written} rows in {elapsed:.2f}s ({rows_written / max(elapsed, 1e-9):,.0f} rows/s).")
+    print(f"Kanjis indexed for full-text search: {derived_counts['search_index']}")
+    print(f"Kanji API payloads precomputed: {derived_counts['payloads']}")
+    print(f"Data version: {derived_counts['data_version']}")
+    return True
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Creates or updates kanji.db from the fetched kanji data.")
+    parser.add_argument('--full', action='store_true',
+                        help="Rebuild from an empty database with a bulk load instead of applying only the changes "
+                             "(run populate_examples.py afterwards).")
+    parser.add_argument('--page-size', type=page_size_argument, default=None,
+                        help="Page size of the published database (default: keep SQLite's / the current one).")
+    args = parser.parse_args()
+    main(full=args.full, page_size=args.page_size)
@@ -0,0 +1,156 @@
+"""Reading and writing the kanji dataset produced by fetch_kanji_data.py.
+
+The dataset is stored as JSON Lines (one kanji record per line), optionally
+compressed according to the file suffix ('.gz' or '.xz'). Records are
+written and read one at a time, so no stage of the pipeline needs the whole
+dataset in memory. The legacy format, a single JSON array (kanji_data.json),
+is still accepted on input and is parsed incrementally as well.
+"""
+import gzip
+import json
+import lzma
+import pathlib
+
+from build_utils import atomic_output
+
+# Dataset file names looked for in the data directory, in order of preference
+# when several have the same modification time.
+KANJI_DATA_FILENAMES = ('kanji_data.jsonl', 'kanji_data.jsonl.gz', 'kanji_data.jsonl.xz', 'kanji_data.json')
+DEFAULT_KANJI_DATA_FILENAME = KANJI_DATA_FILENAMES[0]
+
+# Characters read at a time when parsing a legacy JSON array.
+READ_CHUNK_SIZE = 1 << 16
+_WHITESPACE = ' \t\r\n'
+
+
+def find_kanji_data_file(data_dir):
+    """Returns the most recently written dataset file in 'data_dir', or None if there is none."""
+    candidates = []
+    for preference, name in enumerate(KANJI_DATA_FILENAMES):
+        path = pathlib.Path(data_dir) / name
+        try:
+            candidates.append((-path.stat().st_mtime_ns, preference, path))
+        except FileNotFoundError:
+            continue
+    return min(candidates)[2] if candidates else None
+
+
+def _open_text(path, mode):
+    path = str(path)
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    if path.endswith('.xz'):
+        return lzma.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def _open_binary(path):
+    path = str(path)
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    if path.endswith('.xz'):
+        return lzma.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def iter_records(path):
+    """Yields the records of a dataset file one at a time (JSON Lines or a legacy JSON array)."""
+    with _open_text(path, 'r') as f:
+        head = f.read(READ_CHUNK_SIZE)
+        if head.lstrip(_WHITESPACE).startswith('['):
+            yield from _iter_json_array(f, head)
+            return
+        # JSON Lines: finish the line cut by the first read, then go line by line.
+        pending = head
+        while True:
+            lines = pending.split('\n')
+            for line in lines[:-1]:
+                if line.strip():
+                    yield json.loads(line)
+            rest = lines[-1]
+            more = f.readline()
+            if not more:
+                if rest.strip():
+                    yield json.loads(rest)
+                return
+            pending = rest + more
+
+
+def iter_record_lines(path):
+    """Yields the JSON text of each record of a dataset file as UTF-8 bytes, without decoding JSON Lines.
+
+    Lines of a JSON Lines file are yielded as they are (minus the line break),
+    so a consumer can recognize a record it has seen before by hashing its line
+    and only parse the ones that changed. Records of a legacy JSON array are
+    parsed and serialized again the way write_records() writes them.
+    """
+    with _open_text(path, 'r') as f:
+        is_array = f.read(READ_CHUNK_SIZE).lstrip(_WHITESPACE).startswith('[')
+    if is_array:
+        for record in iter_records(path):
+            yield json.dumps(record, ensure_ascii=False).encode('utf-8')
+        return
+    with _open_binary(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield line
+
+
+def _iter_json_array(f, buffer):
+    """Yields the elements of a top-level JSON array read from 'f', starting with the text in 'buffer'."""
+    decoder = json.JSONDecoder()
+    index = buffer.index('[') + 1
+    eof = False
+    while True:
+        # Skip separators, reading more text when the buffer runs out.
+        while True:
+            while index < len(buffer) and buffer[index] in _WHITESPACE + ',':
+                index += 1
+            if index < len(buffer) or eof:
+                break
+            buffer, index = f.read(READ_CHUNK_SIZE), 0
+            eof = not buffer
+        if index >= len(buffer):
+            raise json.JSONDecodeError("Unterminated array", buffer, index)
+        if buffer[index] == ']':
+            return
+        try:
+            value, end = decoder.raw_decode(buffer, index)
+        except json.JSONDecodeError:
+            end = None
+        # A value ending right at the buffer's end may have been cut short, so it
+        # is only accepted once the next character (or the end of file) is seen.
+        if end is None or (end == len(buffer) and not eof):
+            if eof:
+                raise json.JSONDecodeError("Invalid or truncated array element", buffer, index)
+            chunk = f.read(READ_CHUNK_SIZE)
+            eof = not chunk
+            buffer, index = buffer[index:] + chunk, 0
+            continue
+        yield value
+        index = end
+
+
+def write_records(path, records):
+    """Atomically writes 'records' to 'path' as JSON Lines, compressed if the suffix asks for it.
+
+    Returns the number of records written.
+    """
+    count = 0
+    path = str(path)
+    with atomic_output(path) as raw:
+        if path.endswith('.gz'):
+            f = gzip.GzipFile(fileobj=raw, mode='wb', mtime=0)
+        elif path.endswith('.xz'):
+            f = lzma.LZMAFile(raw, mode='wb')
+        else:
+            f = raw
+        try:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n')
+                count += 1
+        finally:
+            if f is not raw:
+                f.close()
+    return count
@@ -0,0 +1,160 @@
+"""Finalization stage for kanji.db: statistics, compaction and a size report.
+
+init_db.py and populate_examples.py run finalize_database() on their build
+copy right before it is published (see init_db.staged_database()) when it
+was built from scratch or has accumulated free pages (needs_compaction());
+small incremental changes are published without the full rewrite. Run this
+script on its own to re-finalize the live database, change its page size, or
+just print the report:
+
+    python scripts/optimize_db.py [--page-size 8192] [--report-only]
+"""
+import argparse
+import os
+import pathlib
+import sqlite3
+import sys
+
+# Define Paths
+BASE_PROJECT_DIR = pathlib.Path(__file__).resolve().parent.parent
+DATABASE_PATH = BASE_PROJECT_DIR / "kanji.db"
+
+# Page sizes SQLite accepts; any other value is silently ignored by PRAGMA page_size.
+VALID_PAGE_SIZES = tuple(1 << shift for shift in range(9, 17))
+# Share of free pages above which an incremental build is compacted before it is published.
+COMPACT_FREE_PAGE_FRACTION = 0.1
+
+def gather_statistics(conn):
+    """Refreshes the planner statistics (sqlite_stat1) and merges the FTS index segments."""
+    for table in ('kanji_search', 'kanji_search_short'):
+        conn.execute(f"INSERT INTO {table} ({table}) VALUES ('optimize')")
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.execute("PRAGMA optimize")
+    conn.commit()
+
+def compact_into(conn, target_path, page_size=None):
+    """Writes a defragmented copy of 'conn' with no free pages to 'target_path' (VACUUM INTO).
+
+    'target_path' must not exist yet (or be empty). With 'page_size', the copy
+    uses that page size instead of the source's.
+    """
+    if page_size is not None:
+        if page_size not in VALID_PAGE_SIZES:
+            raise ValueError(f"Invalid page size {page_size}; use a power of two from 512 to 65536.")
+        conn.execute(f"PRAGMA page_size = {page_size}")
+    conn.execute("VACUUM INTO ?", (os.fspath(target_path),))
+
+def finalize_database(conn, target_path, page_size=None):
+    """Gathers statistics on 'conn', then compacts it into 'target_path', the file to publish."""
+    gather_statistics(conn)
+    compact_into(conn, target_path, page_size)
+
+def needs_compaction(conn):
+    """True if more than COMPACT_FREE_PAGE_FRACTION of the pages of 'conn' are free."""
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return page_count > 0 and free_pages / page_count > COMPACT_FREE_PAGE_FRACTION
+
+def refresh_statistics(conn):
+    """Lets SQLite refresh the planner statistics that a small change may have made stale (PRAGMA optimize).
+
+    The cheap counterpart of finalize_database() for incremental builds, which
+    are published as they are: their FTS segments are merged by FTS5's own
+    automerge and ANALYZE only reruns on tables whose row count moved a lot.
+    """
+    conn.execute("PRAGMA optimize")
+    conn.commit()
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+def size_report(conn):
+    """Returns one (name, kind, rows, bytes) tuple per table and index, largest first.
+
+    Sizes come from the 'dbstat' virtual table; when SQLite was built without
+    it, 'bytes' is None and only the row counts are reported. Virtual tables
+    (the FTS index) store their data in shadow tables, listed on their own.
+    """
+    try:
+        sizes = dict(conn.execute("SELECT name, sum(pgsize) FROM dbstat GROUP BY name"))
+    except sqlite3.OperationalError:
+        sizes = None
+    row_counts = {}
+    report = []
+    objects = conn.execute(
+        "SELECT name, type, tbl_name, sql FROM sqlite_master WHERE type IN ('table', 'index') ORDER BY name"
+    ).fetchall()
+    for name, object_type, table_name, sql in objects:
+        if table_name not in row_counts:
+            row_counts[table_name] = conn.execute(f"SELECT count(*) FROM {_quote(table_name)}").fetchone()[0]
+        if object_type == 'table' and (sql or '').upper().startswith('CREATE VIRTUAL TABLE'):
+            kind = 'virtual'
+        else:
+            kind = object_type
+        # An index holds one entry per row of its table (none of the indexes here are partial).
+        report.append((name, kind, row_counts[table_name], sizes.get(name) if sizes is not None else None))
+    if sizes is not None:
+        # The schema table itself is not listed in sqlite_master.
+        listed = {name for name, _, _, _ in report}
+        report.extend((name, 'schema', None, size) for name, size in sizes.items() if name not in listed)
+    report.sort(key=lambda entry: (-(entry[3] or 0), entry[0]))
+    return report
+
+def print_size_report(db_path=None):
+    """Prints the file size and the per-table/index size and row counts of 'db_path'."""
+    db_path = db_path or DATABASE_PATH
+    conn = sqlite3.connect(pathlib.Path(db_path).resolve().as_uri() + "?mode=ro", uri=True)
+    try:
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        report = size_report(conn)
+    finally:
+        conn.close()
+
+    total_bytes = page_size * page_count
+    print(f"\n{db_path}: {total_bytes / 1024:,.0f} KiB "
+          f"({page_count} pages of {page_size} bytes, {free_pages} free)")
+    if report and report[0][3] is None:
+        print("(SQLite was built without the dbstat table: sizes per table are not available.)")
+    print(f"{'Name':<44} {'Kind':<8} {'Rows':>9} {'KiB':>9} {'%':>6}")
+    for name, kind, rows, size in report:
+        rows_text = f"{rows:,}" if rows is not None else "-"
+        size_text = f"{size / 1024:,.0f}" if size is not None else "-"
+        share_text = f"{100 * size / total_bytes:.1f}" if size is not None and total_bytes else "-"
+        print(f"{name:<44} {kind:<8} {rows_text:>9} {size_text:>9} {share_text:>6}")
+
+def page_size_argument(value):
+    """argparse type for --page-size."""
+    page_size = int(value)
+    if page_size not in VALID_PAGE_SIZES:
+        raise argparse.ArgumentTypeError(f"must be a power of two from 512 to 65536, got {value}")
+    return page_size
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Refreshes the planner statistics of kanji.db, compacts it and prints a size report.")
+    parser.add_argument('database', nargs='?', default=str(DATABASE_PATH), help="Database to optimize (default: kanji.db).")
+    parser.add_argument('--page-size', type=page_size_argument, default=None,
+                        help="Rewrite the database with this page size (default: keep the current one).")
+    parser.add_argument('--report-only', action='store_true', help="Only print the size report.")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.database):
+        print(f"Error: database not found at {args.database}. Run init_db.py first.")
+        sys.exit(1)
+    if not args.report_only:
+        # Imported here: init_db imports this module for its own finalization step.
+        from init_db import DatabaseCheckError, staged_database
+        try:
+            with staged_database(args.database, page_size=args.page_size, publish_unchanged=True, compact=True):
+                pass
+        except DatabaseCheckError as e:
+            print(f"Error: the database failed its checks ({e}); it was left unchanged.")
+            sys.exit(1)
+        print(f"Optimized and published {args.database}.")
+    print_size_report(args.database)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import hashlib
+import json
+import pathlib
+import struct
+import sys
+
+from build_utils import atomic_output
+
+# Define Paths
+BASE_PROJECT_DIR = pathlib.Path(__file__).resolve().parent.parent
+SVG_DIR = BASE_PROJECT_DIR / 'data' / 'kanjivg_svgs'
+PACK_PATH = BASE_PROJECT_DIR / 'data' / 'kanjivg_svgs.pack'
+
+# The pack format is defined (and read) by the app.
+sys.path.insert(0, str(BASE_PROJECT_DIR))
+from app.svg_store import HEADER_FORMAT, HEADER_SIZE, PACK_MAGIC # noqa: E402
+
+# Loose files that go into the pack: the SVGs and their precompressed siblings.
+PACKED_PATTERNS = ('*.svg', '*.svg.gz', '*.svg.br')
+
+def write_pack(pack_path, entries):
+    """
+    Writes a pack file from (name, data) pairs, returning the number of data bytes.
+    The pack is written to a temporary file and renamed into place, so the running
+    app never sees half of it.
+    """
+    index = {}
+    with atomic_output(pack_path) as pack_file:
+        pack_file.write(b'\0' * HEADER_SIZE) # Patched once the index position is known
+        offset = HEADER_SIZE
+        for name, data in entries:
+            pack_file.write(data)
+            index[name] = [offset, len(data), hashlib.sha1(data).hexdigest()]
+            offset += len(data)
+        index_bytes = json.dumps(index, separators=(',', ':')).encode('utf-8')
+        pack_file.write(index_bytes)
+        pack_file.seek(0)
+        pack_file.write(struct.pack(HEADER_FORMAT, PACK_MAGIC, offset, len(index_bytes)))
+    return offset - HEADER_SIZE
+
+def pack_svgs(svg_dir=SVG_DIR, pack_path=PACK_PATH):
+    """
+    Consolidates every SVG (and compressed variant) of 'svg_dir' into one pack file
+    with a filename -> (offset, length, sha1) index.
+    Run it after download_svgs.py, set_svg_animation_loop.py and compress_svgs.py.
+    """
+    if not svg_dir.exists():
+        print(f"SVG directory not found: {svg_dir}")
+        return
+
+    files = sorted({path for pattern in PACKED_PATTERNS for path in svg_dir.glob(pattern)})
+    if not files:
+        print(f"No SVG files found in {svg_dir}")
+        return
+
+    data_size = write_pack(pack_path, ((path.name, path.read_bytes()) for path in files))
+    print(f"Packed {len(files)} files ({data_size} bytes) into {pack_path}")
+
+if __name__ == '__main__':
+    print("Starting SVG packing...")
+    pack_svgs()
+    print("SVG packing finished.")
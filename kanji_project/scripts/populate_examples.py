@@ -1,8 +1,7 @@
 import sqlite3
-import json
-import os
+import sys
 
-DATABASE_PATH = os.path.join("kanji_project", "kanji.db")
+from init_db import DatabaseCheckError, rebuild_derived_tables, staged_database
 
 initial_example_data = [
     # Kanjis: 一
@@ -26,89 +25,94 @@ initial_example_data = [
     { "word": "大きい", "reading": "おおきい", "meaning_es": "Grande", "jlpt_level_word": 5, "associated_kanji_chars": ["大"] },
 ]
 
-def get_db_connection():
-    """Establishes a connection to the SQLite database."""
-    # Correct path assuming script is in kanji_project/scripts/ and DB is in kanji_project/
-    db_file_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'kanji.db'))
-    conn = sqlite3.connect(db_file_path)
-    return conn
-
 def main():
-    conn = None
     words_attempted = 0
     words_inserted = 0
     assoc_attempted = 0
     assoc_inserted = 0
+    # Kanjis que reciben palabras nuevas: solo sus filas derivadas cambian.
+    touched_kanji_ids = set()
     
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        # Se trabaja sobre una copia que sustituye a kanji.db solo si todo va bien,
+        # así la aplicación en marcha nunca ve la base de datos a medio actualizar.
+        with staged_database() as conn:
+            cursor = conn.cursor()
 
-        for example in initial_example_data:
-            words_attempted += 1
-            try:
-                cursor.execute("""
-                    INSERT OR IGNORE INTO example_words (word, reading, meaning_es, jlpt_level_word)
-                    VALUES (?, ?, ?, ?)
-                """, (example["word"], example["reading"], example["meaning_es"], example.get("jlpt_level_word")))
+            for example in initial_example_data:
+                words_attempted += 1
+                try:
+                    cursor.execute("""
+                        INSERT OR IGNORE INTO example_words (word, reading, meaning_es, jlpt_level_word)
+                        VALUES (?, ?, ?, ?)
+                    """, (example["word"], example["reading"], example["meaning_es"], example.get("jlpt_level_word")))
                 
-                if cursor.rowcount > 0:
-                    words_inserted += 1
+                    if cursor.rowcount > 0:
+                        words_inserted += 1
                 
-                # Get the word_id (even if it was ignored, we need it for association)
-                # If INSERT OR IGNORE and it was ignored, lastrowid is not updated reliably across all SQLite versions for this.
-                # So, we query for the id.
-                cursor.execute("SELECT id FROM example_words WHERE word = ? AND reading = ? AND meaning_es = ?", 
-                               (example["word"], example["reading"], example["meaning_es"]))
-                word_row = cursor.fetchone()
-                if not word_row:
-                    print(f"Aviso: No se pudo obtener el ID para la palabra '{example['word']}', omitiendo asociaciones.")
-                    continue
-                word_id = word_row[0]
+                    # Get the word_id (even if it was ignored, we need it for association)
+                    # If INSERT OR IGNORE and it was ignored, lastrowid is not updated reliably across all SQLite versions for this.
+                    # So, we query for the id.
+                    cursor.execute("SELECT id FROM example_words WHERE word = ? AND reading = ? AND meaning_es = ?", 
+                                   (example["word"], example["reading"], example["meaning_es"]))
+                    word_row = cursor.fetchone()
+                    if not word_row:
+                        print(f"Aviso: No se pudo obtener el ID para la palabra '{example['word']}', omitiendo asociaciones.")
+                        continue
+                    word_id = word_row[0]
 
-                for kanji_char in example["associated_kanji_chars"]:
-                    assoc_attempted += 1
-                    cursor.execute("SELECT id FROM kanjis WHERE kanji_char = ?", (kanji_char,))
-                    kanji_row = cursor.fetchone()
+                    for kanji_char in example["associated_kanji_chars"]:
+                        assoc_attempted += 1
+                        cursor.execute("SELECT id FROM kanjis WHERE kanji_char = ?", (kanji_char,))
+                        kanji_row = cursor.fetchone()
                     
-                    if kanji_row:
-                        kanji_id = kanji_row[0]
-                        try:
-                            cursor.execute("""
-                                INSERT OR IGNORE INTO kanji_example_word_assoc (kanji_id, word_id)
-                                VALUES (?, ?)
-                            """, (kanji_id, word_id))
-                            if cursor.rowcount > 0:
-                                assoc_inserted += 1
-                        except sqlite3.IntegrityError as e:
-                             print(f"Aviso: Error de integridad al asociar kanji '{kanji_char}' con palabra '{example['word']}'. Puede que ya exista. Error: {e}")
-                        except Exception as e_assoc:
-                            print(f"Error inesperado al asociar kanji '{kanji_char}' con palabra '{example['word']}': {e_assoc}")
-                    else:
-                        print(f"Aviso: Kanji '{kanji_char}' no encontrado en la tabla 'kanjis'. No se creará asociación para la palabra '{example['word']}'.")
+                        if kanji_row:
+                            kanji_id = kanji_row[0]
+                            try:
+                                cursor.execute("""
+                                    INSERT OR IGNORE INTO kanji_example_word_assoc (kanji_id, word_id)
+                                    VALUES (?, ?)
+                                """, (kanji_id, word_id))
+                                if cursor.rowcount > 0:
+                                    assoc_inserted += 1
+                                    touched_kanji_ids.add(kanji_id)
+                            except sqlite3.IntegrityError as e:
+                                 print(f"Aviso: Error de integridad al asociar kanji '{kanji_char}' con palabra '{example['word']}'. Puede que ya exista. Error: {e}")
+                            except Exception as e_assoc:
+                                print(f"Error inesperado al asociar kanji '{kanji_char}' con palabra '{example['word']}': {e_assoc}")
+                        else:
+                            print(f"Aviso: Kanji '{kanji_char}' no encontrado en la tabla 'kanjis'. No se creará asociación para la palabra '{example['word']}'.")
                         
-            except sqlite3.IntegrityError as e:
-                # This might happen if a unique constraint on example_words is violated (e.g. if we add one)
-                print(f"Error de integridad al insertar palabra '{example['word']}'. Puede que ya exista o falte un campo NOT NULL. Error: {e}")
-            except Exception as e_word:
-                print(f"Error inesperado al procesar palabra '{example['word']}': {e_word}")
+                except sqlite3.IntegrityError as e:
+                    # This might happen if a unique constraint on example_words is violated (e.g. if we add one)
+                    print(f"Error de integridad al insertar palabra '{example['word']}'. Puede que ya exista o falte un campo NOT NULL. Error: {e}")
+                except Exception as e_word:
+                    print(f"Error inesperado al procesar palabra '{example['word']}': {e_word}")
 
 
-        conn.commit()
-        print("\nPoblamiento de palabras de ejemplo completado.")
-        print(f"Palabras procesadas: {words_attempted}")
-        print(f"Palabras nuevas insertadas: {words_inserted}")
-        print(f"Asociaciones intentadas: {assoc_attempted}")
-        print(f"Asociaciones nuevas creadas: {assoc_inserted}")
+            conn.commit()
+            # Las nuevas palabras deben aparecer también en el índice de búsqueda
+            # y en las respuestas precalculadas de la API de sus kanjis; el resto
+            # de filas no cambia. Sin cambios no se publica nada.
+            if touched_kanji_ids:
+                rebuild_derived_tables(conn, sorted(touched_kanji_ids))
+            print("\nPoblamiento de palabras de ejemplo completado.")
+            print(f"Palabras procesadas: {words_attempted}")
+            print(f"Palabras nuevas insertadas: {words_inserted}")
+            print(f"Asociaciones intentadas: {assoc_attempted}")
+            print(f"Asociaciones nuevas creadas: {assoc_inserted}")
 
+    # Cualquier fallo termina con un código distinto de cero, para que launch.py
+    # no dé la etapa por completada.
+    except DatabaseCheckError as e:
+        print(f"Error: la nueva base de datos no superó las comprobaciones ({e}); kanji.db no se ha modificado.")
+        sys.exit(1)
     except sqlite3.Error as e:
         print(f"Error de base de datos: {e}")
+        sys.exit(1)
     except Exception as e:
         print(f"Error inesperado: {e}")
-    finally:
-        if conn:
-            conn.close()
-            print("Conexión a la base de datos cerrada.")
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
@@ -1,80 +1,141 @@
-import os
-import xml.etree.ElementTree as ET
-from pathlib import Path
-
-# Define Paths
-# Assuming this script is in kanji_project/scripts/
-# So, BASE_DIR is kanji_project/scripts, .parent is kanji_project
-BASE_DIR = Path(__file__).resolve().parent 
-SVG_DIR = BASE_DIR.parent / 'data' / 'kanjivg_svgs'
-
-# Namespace for SVG files (KanjiVG uses the standard SVG namespace)
-SVG_NAMESPACE = "http://www.w3.org/2000/svg"
-# Register globally for cleaner output XML (no ns0: prefixes if default ns)
-ET.register_namespace('', SVG_NAMESPACE) 
-
-def set_animation_to_loop():
-    if not SVG_DIR.exists():
-        print(f"SVG directory not found: {SVG_DIR}")
-        return
-
-    svg_files = list(SVG_DIR.glob('*.svg'))
-    if not svg_files:
-        print(f"No SVG files found in {SVG_DIR}")
-        return
-
-    total_files = len(svg_files)
-    print(f"Found {total_files} SVG files to process in {SVG_DIR}...")
-    modified_count = 0
-    error_count = 0
-
-    for i, svg_file_path in enumerate(svg_files):
-        try:
-            # Print progress sparsely
-            if (i + 1) % 500 == 0 or (i + 1) == total_files:
-                print(f"Processing file {i + 1}/{total_files}: {svg_file_path.name}...")
-            
-            tree = ET.parse(str(svg_file_path))
-            root = tree.getroot()
-            
-            animations_found_in_file = False
-            
-            # Find all <animate> elements
-            for anim_element in root.findall(f".//{{{SVG_NAMESPACE}}}animate"):
-                anim_element.set("repeatCount", "indefinite")
-                animations_found_in_file = True
-            
-            # Find all <animateMotion> elements
-            for anim_motion_element in root.findall(f".//{{{SVG_NAMESPACE}}}animateMotion"):
-                anim_motion_element.set("repeatCount", "indefinite")
-                animations_found_in_file = True
-
-            # Find all <animateTransform> elements
-            for anim_transform_element in root.findall(f".//{{{SVG_NAMESPACE}}}animateTransform"):
-                anim_transform_element.set("repeatCount", "indefinite")
-                animations_found_in_file = True
-
-            if animations_found_in_file:
-                # Overwrite the file with the modified XML tree,
-                # including XML declaration and UTF-8 encoding.
-                tree.write(str(svg_file_path), encoding="utf-8", xml_declaration=True)
-                modified_count += 1
-            
-        except ET.ParseError as e:
-            print(f"Error parsing XML in {svg_file_path.name}: {e}")
-            error_count += 1
-        except Exception as e:
-            print(f"An unexpected error occurred with {svg_file_path.name}: {e}")
-            error_count += 1
-            
-    print(f"\nProcessing complete.")
-    print(f"Successfully modified animation loops in {modified_count} SVG files.")
-    if error_count > 0:
-        print(f"Encountered errors with {error_count} SVG files.")
-
-if __name__ == '__main__':
-    print("Starting SVG animation loop modification...")
-    # Need to ensure correct working directory if running this script directly
-    # For now, assuming it's run from the project root or paths are correctly resolved by Path(__file__)
-    set_animation_to_loop()
-    print("SVG animation loop modification finished.") 
\ No newline at end of file
+import argparse
+import json
+import os
+import sys
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from build_utils import atomic_write_bytes, sha256_bytes
+
+# Define Paths
+# Assuming this script is in kanji_project/scripts/
+# So, BASE_DIR is kanji_project/scripts, .parent is kanji_project
+BASE_DIR = Path(__file__).resolve().parent
+SVG_DIR = BASE_DIR.parent / 'data' / 'kanjivg_svgs'
+# Records, per SVG, the size, mtime and content hash it had after the last run,
+# so files that have not changed since are skipped.
+MANIFEST_PATH = BASE_DIR.parent / 'data' / 'svg_animation_manifest.json'
+
+# Namespace for SVG files (KanjiVG uses the standard SVG namespace)
+SVG_NAMESPACE = "http://www.w3.org/2000/svg"
+# Register globally for cleaner output XML (no ns0: prefixes if default ns)
+ET.register_namespace('', SVG_NAMESPACE)
+
+ANIMATION_TAGS = ('animate', 'animateMotion', 'animateTransform')
+# Below this many files to process, the pool start-up costs more than it saves.
+MIN_FILES_FOR_POOL = 64
+
+def _stat_key(path):
+    stat_result = os.stat(path)
+    return [stat_result.st_size, stat_result.st_mtime_ns]
+
+def process_svg(svg_file_path):
+    """
+    Sets repeatCount="indefinite" on every animation element of one SVG, rewriting
+    it atomically if anything changed. Runs in a worker process.
+    Returns (name, modified, manifest entry or None, error message or None).
+    """
+    svg_file_path = Path(svg_file_path)
+    try:
+        tree = ET.parse(str(svg_file_path))
+        root = tree.getroot()
+
+        animations_found_in_file = False
+        for tag in ANIMATION_TAGS:
+            for anim_element in root.iter(f"{{{SVG_NAMESPACE}}}{tag}"):
+                if anim_element.get("repeatCount") != "indefinite":
+                    anim_element.set("repeatCount", "indefinite")
+                    animations_found_in_file = True
+
+        if animations_found_in_file:
+            # Write the modified XML tree, including XML declaration and UTF-8 encoding,
+            # through a temporary file so the server never reads a half-written SVG.
+            data = ET.tostring(root, encoding="utf-8", xml_declaration=True)
+            atomic_write_bytes(svg_file_path, data)
+        else:
+            data = svg_file_path.read_bytes()
+        return svg_file_path.name, animations_found_in_file, _stat_key(svg_file_path) + [sha256_bytes(data)], None
+    except ET.ParseError as e:
+        return svg_file_path.name, False, None, f"Error parsing XML in {svg_file_path.name}: {e}"
+    except Exception as e:
+        return svg_file_path.name, False, None, f"An unexpected error occurred with {svg_file_path.name}: {e}"
+
+def load_manifest():
+    try:
+        with open(MANIFEST_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def _is_unchanged(svg_file_path, entry):
+    """True if the file still matches its manifest entry: same size and mtime, or else same content."""
+    if not entry:
+        return False
+    stat_key = _stat_key(svg_file_path)
+    if stat_key == entry[:2]:
+        return True
+    if sha256_bytes(svg_file_path.read_bytes()) == entry[2]:
+        entry[:2] = stat_key # Touched but identical: refresh the fast-path key
+        return True
+    return False
+
+def set_animation_to_loop(workers=None, force=False):
+    if not SVG_DIR.exists():
+        print(f"SVG directory not found: {SVG_DIR}")
+        return
+
+    svg_files = sorted(SVG_DIR.glob('*.svg'))
+    if not svg_files:
+        print(f"No SVG files found in {SVG_DIR}")
+        return
+
+    manifest = {} if force else load_manifest()
+    # Forget files that no longer exist.
+    current_names = {path.name for path in svg_files}
+    manifest = {name: entry for name, entry in manifest.items() if name in current_names}
+
+    pending = [path for path in svg_files if not _is_unchanged(path, manifest.get(path.name))]
+    total_files = len(svg_files)
+    print(f"Found {total_files} SVG files in {SVG_DIR}; {len(pending)} new or changed since the last run.")
+
+    modified_count = 0
+    error_count = 0
+    if len(pending) >= MIN_FILES_FOR_POOL and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(process_svg, map(str, pending), chunksize=32))
+    else:
+        results = [process_svg(path) for path in pending]
+
+    for name, modified, entry, error in results:
+        if error:
+            print(error)
+            error_count += 1
+            manifest.pop(name, None)
+            continue
+        manifest[name] = entry
+        if modified:
+            modified_count += 1
+
+    atomic_write_bytes(MANIFEST_PATH, json.dumps(manifest, separators=(',', ':')).encode('utf-8'))
+
+    print(f"\nProcessing complete.")
+    print(f"Successfully modified animation loops in {modified_count} SVG files.")
+    print(f"Skipped {total_files - len(pending)} unchanged SVG files.")
+    if error_count > 0:
+        # Exit non-zero so launch.py does not stamp the stage; the failed files are
+        # left out of the manifest and processed again next time.
+        print(f"Encountered errors with {error_count} SVG files.")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Makes the animations of the KanjiVG SVGs loop forever.")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Worker processes (default: one per CPU; 1 disables the pool).")
+    parser.add_argument('--force', action='store_true',
+                        help="Ignore the manifest and process every SVG.")
+    args = parser.parse_args()
+
+    print("Starting SVG animation loop modification...")
+    set_animation_to_loop(workers=args.workers, force=args.force)
+    print("SVG animation loop modification finished.")
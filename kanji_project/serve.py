@@ -0,0 +1,92 @@
+"""Production entry point: serves the app with several worker processes.
+
+On POSIX systems with gunicorn installed (see requirements.txt), the app is
+created and warmed up once in the master process (app/warmup.py) and then
+forked into SERVE_WORKERS workers of SERVE_THREADS threads each, which share
+the warmed caches copy-on-write. Elsewhere (Windows, or without gunicorn) it
+falls back to Werkzeug's threaded server in a single process, without the
+debugger or the reloader of run.py.
+
+    python serve.py [--host 0.0.0.0] [--port 8000] [--workers 4] [--threads 8]
+"""
+import argparse
+import os
+import time
+
+from app import create_app
+from app.warmup import warm_up
+from config import Config
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError: # Windows, or gunicorn is not installed.
+    BaseApplication = None
+
+def build_app():
+    """Creates the app and warms its caches, printing what was loaded and how long it took."""
+    started = time.perf_counter()
+    app = create_app()
+    loaded = warm_up(app)
+    print(f"App ready in {time.perf_counter() - started:.2f}s "
+          f"({loaded['kanji_payloads']} kanji payloads cached, {loaded['packs']} packs mapped).")
+    if loaded['snapshot']:
+        snapshot_stats = loaded['snapshot']
+        resident = snapshot_stats['resident_bytes_added']
+        print(f"Kanji snapshot: {snapshot_stats['kanjis']} kanjis loaded in {snapshot_stats['load_ms']} ms, "
+              f"about {snapshot_stats['approximate_bytes'] / (1024 * 1024):.1f} MiB"
+              + (f" ({resident / (1024 * 1024):+.1f} MiB resident)." if resident is not None else "."))
+    return app
+
+def serve_with_gunicorn(app, host, port, workers, threads):
+    class KanjiApplication(BaseApplication):
+        """Runs the already-built 'app' instead of importing one from a module path."""
+
+        def __init__(self, options):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return app
+
+    KanjiApplication({
+        'bind': f"{host}:{port}",
+        'workers': workers,
+        'threads': threads,
+        'worker_class': 'gthread' if threads > 1 else 'sync',
+        # The app is loaded once in the master, so workers start from the warm caches.
+        'preload_app': True,
+    }).run()
+
+def serve_with_werkzeug(app, host, port):
+    from werkzeug.serving import run_simple
+    run_simple(host, port, app, threaded=True, use_reloader=False, use_debugger=False)
+
+def main():
+    parser = argparse.ArgumentParser(description="Serves the kanji app for production use.")
+    parser.add_argument('--host', default=Config.SERVE_HOST,
+                        help=f"Address to listen on (default: {Config.SERVE_HOST}).")
+    parser.add_argument('--port', type=int, default=Config.SERVE_PORT,
+                        help=f"Port to listen on (default: {Config.SERVE_PORT}).")
+    parser.add_argument('--workers', type=int, default=Config.SERVE_WORKERS,
+                        help="Worker processes (default: SERVE_WORKERS, 0 = one per CPU core).")
+    parser.add_argument('--threads', type=int, default=Config.SERVE_THREADS,
+                        help=f"Threads per worker (default: {Config.SERVE_THREADS}).")
+    args = parser.parse_args()
+    workers = args.workers or os.cpu_count() or 1
+    app = build_app()
+
+    if BaseApplication is not None:
+        print(f"Serving on http://{args.host}:{args.port}/ with gunicorn "
+              f"({workers} workers x {max(1, args.threads)} threads).")
+        serve_with_gunicorn(app, args.host, args.port, workers, max(1, args.threads))
+    else:
+        print(f"gunicorn is not available; serving on http://{args.host}:{args.port}/ "
+              f"with Werkzeug's threaded server (one process).")
+        serve_with_werkzeug(app, args.host, args.port)
+
+if __name__ == '__main__':
+    main()
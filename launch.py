@@ -1,8 +1,13 @@
+import argparse
+import hashlib
+import json
 import os
 import subprocess
 import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
-import sqlite3
 
 # Define Paths
 BASE_DIR = Path(__file__).resolve().parent
@@ -10,14 +15,37 @@ PROJECT_DIR = BASE_DIR / 'kanji_project'
 VENV_DIR = PROJECT_DIR / 'venv'
 REQUIREMENTS_FILE = PROJECT_DIR / 'requirements.txt'
 RUN_PY_FILE = PROJECT_DIR / 'run.py'
+SERVE_PY_FILE = PROJECT_DIR / 'serve.py' # Production server (multi-process with gunicorn where available)
 DATA_DIR = PROJECT_DIR / 'data'
-KANJI_DATA_JSON = DATA_DIR / 'kanji_data.json' # Updated path
+KANJI_DATA_FILE = DATA_DIR / 'kanji_data.jsonl' # Written by fetch_kanji_data.py (see scripts/kanji_records.py)
 DB_FILE = PROJECT_DIR / 'kanji.db'
 FETCH_SCRIPT = PROJECT_DIR / 'scripts' / 'fetch_kanji_data.py'
 INIT_DB_SCRIPT = PROJECT_DIR / 'scripts' / 'init_db.py'
 POPULATE_EXAMPLES_SCRIPT = PROJECT_DIR / 'scripts' / 'populate_examples.py'
 DOWNLOAD_SVGS_SCRIPT = PROJECT_DIR / 'scripts' / 'download_svgs.py'
+SET_SVG_ANIMATION_LOOP_SCRIPT = PROJECT_DIR / 'scripts' / 'set_svg_animation_loop.py'
+COMPRESS_SVGS_SCRIPT = PROJECT_DIR / 'scripts' / 'compress_svgs.py'
+PACK_SVGS_SCRIPT = PROJECT_DIR / 'scripts' / 'pack_svgs.py'
+BUILD_STROKE_DOCS_SCRIPT = PROJECT_DIR / 'scripts' / 'build_stroke_docs.py'
 SVG_DIR = PROJECT_DIR / 'data' / 'kanjivg_svgs'
+SVG_PACK_FILE = DATA_DIR / 'kanjivg_svgs.pack'
+STROKES_PACK_FILE = DATA_DIR / 'kanjivg_strokes.pack'
+# Content digests of every build stage's inputs and outputs, and of requirements.txt.
+STAMP_FILE = DATA_DIR / 'build_stamps.json'
+STAMP_FORMAT_VERSION = 1
+
+SVG_SCRIPTS = [DOWNLOAD_SVGS_SCRIPT, SET_SVG_ANIMATION_LOOP_SCRIPT, COMPRESS_SVGS_SCRIPT, PACK_SVGS_SCRIPT,
+               BUILD_STROKE_DOCS_SCRIPT]
+DATABASE_SCRIPTS = [INIT_DB_SCRIPT, POPULATE_EXAMPLES_SCRIPT]
+# Modules the stage scripts import; a change to them reruns the stages.
+SHARED_SCRIPT_MODULES = [PROJECT_DIR / 'scripts' / name for name in ('build_utils.py', 'http_utils.py', 'kanji_records.py')]
+DATABASE_MODULES = [PROJECT_DIR / 'scripts' / 'optimize_db.py'] + [
+    PROJECT_DIR / 'app' / name for name in ('migrations.py', 'payloads.py', 'translation_data.py')]
+
+# The data scripts only need the standard library, so their helpers can be used here.
+sys.path.insert(0, str(PROJECT_DIR / 'scripts'))
+from build_utils import atomic_write_bytes # noqa: E402
+from kanji_records import find_kanji_data_file # noqa: E402
 
 
 # Determine Virtual Environment Python and Pip Executables
@@ -30,7 +58,7 @@ else:
 
 # Function to Create Virtual Environment
 def create_venv():
-    """Creates a virtual environment if it doesn't exist."""
+    """Creates a virtual environment if it doesn't exist. Returns True if it was created."""
     if not VENV_DIR.exists() or not python_exe_in_venv.exists():
         print(f"Creating virtual environment in {VENV_DIR}...")
         try:
@@ -39,6 +67,7 @@ def create_venv():
                 print(f"Error creating virtual environment: {process_result.stderr}")
                 sys.exit(1)
             print("Virtual environment created.")
+            return True
         except subprocess.CalledProcessError as e:
             print(f"Error creating virtual environment: {e.stderr}")
             sys.exit(1)
@@ -47,11 +76,11 @@ def create_venv():
             sys.exit(1)
     else:
         print(f"Virtual environment found at {VENV_DIR}.")
+    return False
 
 # Function to Install Dependencies
-def install_dependencies():
-    """Installs dependencies from requirements.txt."""
-    print(f"Installing/verifying dependencies from {REQUIREMENTS_FILE}...")
+def install_dependencies(stamps, hasher, venv_created=False):
+    """Installs dependencies from requirements.txt, unless it is unchanged since the last successful install."""
     if not REQUIREMENTS_FILE.exists():
         print(f"Error: {REQUIREMENTS_FILE} not found.")
         # Create an empty requirements.txt if it does not exist, as per project setup
@@ -64,6 +93,11 @@ def install_dependencies():
             print(f"Error creating {REQUIREMENTS_FILE}: {e}")
             sys.exit(1)
 
+    requirements_digest = hasher.digest([REQUIREMENTS_FILE])
+    if not venv_created and stamps.get('requirements') == requirements_digest:
+        print(f"Dependencies from {REQUIREMENTS_FILE} already installed.")
+        return
+    print(f"Installing/verifying dependencies from {REQUIREMENTS_FILE}...")
 
     if not pip_exe_in_venv.exists():
         print(f"Error: pip executable not found at {pip_exe_in_venv}.")
@@ -76,10 +110,12 @@ def install_dependencies():
             print(f"Error installing dependencies: {process_result.stderr}")
             sys.exit(1)
         print("Dependencies installed/verified.")
+        stamps['requirements'] = requirements_digest
     except subprocess.CalledProcessError as e:
         # Allow for no requirements to be installed if requirements.txt is empty
         if "Requirement file contains no requirements" in e.stdout or "Requirement file contains no requirements" in e.stderr:
              print("No dependencies listed in requirements.txt.")
+             stamps['requirements'] = requirements_digest
         elif e.returncode != 0 :
             print(f"Error installing dependencies: {e.stderr}")
             sys.exit(1)
@@ -89,11 +125,12 @@ def install_dependencies():
 
 
 # Function to Run Application
-def run_application():
-    """Runs the Flask application."""
-    print(f"Starting Flask application from {RUN_PY_FILE}...")
-    if not RUN_PY_FILE.exists():
-        print(f"Error: {RUN_PY_FILE} not found.")
+def run_application(production=False, serve_args=()):
+    """Runs the Flask application: the development server, or serve.py (with 'serve_args') in production mode."""
+    entry_file = SERVE_PY_FILE if production else RUN_PY_FILE
+    print(f"Starting Flask application from {entry_file}...")
+    if not entry_file.exists():
+        print(f"Error: {entry_file} not found.")
         sys.exit(1)
 
     if not python_exe_in_venv.exists():
@@ -103,9 +140,9 @@ def run_application():
     
     try:
         os.chdir(PROJECT_DIR)
-        subprocess.run([str(python_exe_in_venv), str(RUN_PY_FILE.name)], cwd=PROJECT_DIR)
+        subprocess.run([str(python_exe_in_venv), str(entry_file.name), *serve_args], cwd=PROJECT_DIR)
     except FileNotFoundError:
-        print(f"Error: The Python executable '{python_exe_in_venv}' or run script '{RUN_PY_FILE.name}' was not found.")
+        print(f"Error: The Python executable '{python_exe_in_venv}' or run script '{entry_file.name}' was not found.")
         sys.exit(1)
     except Exception as e:
         print(f"An error occurred while trying to run the application: {e}")
@@ -113,23 +150,185 @@ def run_application():
     finally:
         print("Flask application has stopped or could not be started.")
 
-# Helper function to check if a table exists in the database
-def check_db_table_exists(conn, table_name):
-    """Checks if a specific table exists in the SQLite database."""
+# Build Pipeline
+class Stage:
+    """One step of the data build: 'scripts' run in order, after the stages named in 'deps'.
+
+    'inputs' and 'outputs' are callables returning the files and directories
+    whose contents are stamped. A stage is skipped when its inputs and outputs
+    still match the stamp of its last successful run. A stage without inputs
+    (the network download) only runs when one of its outputs is missing.
+    """
+
+    def __init__(self, name, scripts, deps=(), inputs=None, outputs=None):
+        self.name = name
+        self.scripts = scripts
+        self.deps = tuple(deps)
+        self.inputs = inputs
+        self.outputs = outputs
+
+class ContentHasher:
+    """SHA-256 digests of files and directories, reusing the stamped digest of a file whose size and mtime are unchanged."""
+
+    def __init__(self, cached_files):
+        self.cached_files = cached_files
+        self.seen_files = {}
+        self._lock = threading.Lock()
+
+    def file_digest(self, path):
+        stat = path.stat()
+        key = str(path)
+        cached = self.cached_files.get(key)
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            digest = cached[2]
+        else:
+            digest = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+            digest = digest.hexdigest()
+        with self._lock:
+            self.seen_files[key] = [stat.st_size, stat.st_mtime_ns, digest]
+        return digest
+
+    def digest(self, paths):
+        """Returns one digest covering the contents of 'paths' (a missing path counts as such)."""
+        combined = hashlib.sha256()
+        for path in paths:
+            path = Path(path)
+            if path.is_dir():
+                for file_path in sorted(p for p in path.rglob('*') if p.is_file()):
+                    combined.update(f"{file_path.relative_to(path)}\0{self.file_digest(file_path)}\n".encode('utf-8'))
+            elif path.is_file():
+                combined.update(f"{path.name}\0{self.file_digest(path)}\n".encode('utf-8'))
+            else:
+                combined.update(f"{path.name}\0missing\n".encode('utf-8'))
+        return combined.hexdigest()
+
+def load_stamps():
+    """Reads the stamp file, or returns empty stamps if there is none (or it is unreadable)."""
     try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?;", (table_name,))
-        return cursor.fetchone() is not None
-    except sqlite3.Error as e:
-        print(f"Database error when checking for table {table_name}: {e}")
-        return False # Assume table doesn't exist or DB is inaccessible
+        with open(STAMP_FILE, encoding='utf-8') as f:
+            stamps = json.load(f)
+        if stamps.get('version') == STAMP_FORMAT_VERSION:
+            return stamps
+    except (OSError, ValueError):
+        pass
+    return {'version': STAMP_FORMAT_VERSION, 'files': {}, 'stages': {}}
+
+def save_stamps(stamps, hasher):
+    """Writes the stamps, keeping the file digests of this run only so the cache does not grow forever."""
+    stamps['files'] = hasher.seen_files
+    try:
+        DATA_DIR.mkdir(parents=True, exist_ok=True)
+        atomic_write_bytes(STAMP_FILE, json.dumps(stamps, indent=1, sort_keys=True).encode('utf-8'))
+    except OSError as e:
+        print(f"Warning: could not write {STAMP_FILE}: {e}")
+
+def _kanji_data_files():
+    kanji_data_file = find_kanji_data_file(DATA_DIR)
+    return [kanji_data_file or KANJI_DATA_FILE]
+
+_print_lock = threading.Lock()
+
+def _stage_print(stage, message):
+    with _print_lock:
+        print(f"[{stage.name}] {message}", flush=True)
+
+def run_stage(stage, hasher, stamps):
+    """Runs 'stage' unless it is up to date. Returns ('ran' | 'skipped' | 'failed', seconds)."""
+    outputs = stage.outputs()
+    inputs_digest = hasher.digest(stage.inputs()) if stage.inputs else None
+    outputs_exist = all(Path(path).exists() for path in outputs)
+    stamp = stamps['stages'].get(stage.name)
+    if outputs_exist and (
+        stage.inputs is None
+        or (stamp and stamp['inputs'] == inputs_digest and stamp['outputs'] == hasher.digest(outputs))
+    ):
+        _stage_print(stage, "Up to date, skipping.")
+        return 'skipped', 0.0
+
+    script_env = os.environ.copy()
+    script_env['PYTHONIOENCODING'] = 'utf-8'
+    started = time.perf_counter()
+    for script in stage.scripts:
+        if not script.exists():
+            _stage_print(stage, f"Error: script {script} not found. Cannot proceed.")
+            return 'failed', time.perf_counter() - started
+        _stage_print(stage, f"Running {script.name}...")
+        try:
+            # Output is relayed line by line, prefixed with the stage name, since stages run side by side.
+            with subprocess.Popen(
+                [str(python_exe_in_venv), str(script)], cwd=BASE_DIR, env=script_env,
+                stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, encoding='utf-8', errors='replace'
+            ) as process:
+                for line in process.stdout:
+                    _stage_print(stage, line.rstrip())
+        except FileNotFoundError:
+            _stage_print(stage, f"Error: The Python executable '{python_exe_in_venv}' was not found.")
+            return 'failed', time.perf_counter() - started
+        if process.returncode != 0:
+            _stage_print(stage, f"Error: {script.name} exited with status {process.returncode}.")
+            return 'failed', time.perf_counter() - started
+    elapsed = time.perf_counter() - started
+    stamps['stages'][stage.name] = {
+        'inputs': inputs_digest,
+        'outputs': hasher.digest(stage.outputs()),
+        'seconds': round(elapsed, 3),
+    }
+    _stage_print(stage, f"Done in {elapsed:.1f}s.")
+    return 'ran', elapsed
+
+def run_pipeline(stages, hasher, stamps):
+    """Runs 'stages' in dependency order, independent ones concurrently. Returns {name: (status, seconds)}."""
+    results = {}
+    pending = list(stages)
+    running = {}
+    with ThreadPoolExecutor(max_workers=len(stages)) as executor:
+        while pending or running:
+            # Start every stage whose dependencies succeeded; stop starting new ones after a failure.
+            if not any(status == 'failed' for status, _ in results.values()):
+                for stage in [stage for stage in pending if all(
+                        results.get(dep, ('',))[0] in ('ran', 'skipped') for dep in stage.deps)]:
+                    pending.remove(stage)
+                    running[executor.submit(run_stage, stage, hasher, stamps)] = stage
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage = running.pop(future)
+                try:
+                    results[stage.name] = future.result()
+                except Exception as e:
+                    _stage_print(stage, f"An unexpected error occurred: {e}")
+                    results[stage.name] = ('failed', 0.0)
+    for stage in pending:
+        results[stage.name] = ('not run', 0.0)
+    return results
+
+BUILD_STAGES = [
+    # Only fetched when no dataset exists; rerun fetch_kanji_data.py by hand to refresh it.
+    Stage('fetch', [FETCH_SCRIPT], outputs=_kanji_data_files),
+    # Each chain edits its own files in place (SVGs / kanji.db), so it is stamped as one stage.
+    Stage('svgs', SVG_SCRIPTS, deps=['fetch'],
+          inputs=lambda: _kanji_data_files() + SVG_SCRIPTS + SHARED_SCRIPT_MODULES,
+          outputs=lambda: [SVG_DIR, SVG_PACK_FILE, STROKES_PACK_FILE]),
+    Stage('database', DATABASE_SCRIPTS, deps=['fetch'],
+          inputs=lambda: _kanji_data_files() + DATABASE_SCRIPTS + SHARED_SCRIPT_MODULES + DATABASE_MODULES,
+          outputs=lambda: [DB_FILE]),
+]
 
 # Function to Setup Database
-def setup_database():
-    """Ensures data directory exists, fetches Kanji data, and initializes the database if necessary."""
+def setup_database(stamps, hasher):
+    """Ensures data directory exists and brings the kanji data, SVGs and database up to date.
+
+    The SVG and database stages both only depend on the fetched data, so they
+    run at the same time. Stages whose stamped inputs and outputs are unchanged
+    are skipped, which makes a relaunch with nothing to rebuild near-instant.
+    """
     print("Starting database setup...")
 
-    # Step 1: Ensure DATA_DIR exists
+    # Ensure DATA_DIR exists
     if not DATA_DIR.exists():
         print(f"Data directory {DATA_DIR} not found. Creating it...")
         try:
@@ -141,144 +340,38 @@ def setup_database():
     else:
         print(f"Data directory {DATA_DIR} found.")
 
-    # Step 2: Run fetch_kanji_data.py if necessary
-    if not KANJI_DATA_JSON.exists():
-        print(f"{KANJI_DATA_JSON} not found. Running {FETCH_SCRIPT.name}...")
-        if not FETCH_SCRIPT.exists():
-            print(f"Error: Fetch script {FETCH_SCRIPT} not found. Cannot proceed with data fetching.")
-            sys.exit(1)
-        
-        try:
-            # Prepare environment for the script
-            script_env = os.environ.copy()
-            script_env['PYTHONIOENCODING'] = 'utf-8'
-            
-            process_result = subprocess.run(
-                [str(python_exe_in_venv), str(FETCH_SCRIPT)], 
-                cwd=BASE_DIR, check=True, capture_output=True, text=True, env=script_env, encoding='utf-8'
-            )
-            print(f"{FETCH_SCRIPT.name} completed.")
-        except subprocess.CalledProcessError as e:
-            print(f"Error running {FETCH_SCRIPT.name}: {e.stderr}")
-            sys.exit(1)
-        except FileNotFoundError:
-            print(f"Error: The Python executable '{python_exe_in_venv}' or script '{FETCH_SCRIPT}' was not found.")
-            sys.exit(1)
-    else:
-        print(f"{KANJI_DATA_JSON} found.")
-
-    # Step 2.5: Run download_svgs.py if necessary
-    # Check if SVG_DIR exists and is not empty
-    svgs_missing = True
-    if SVG_DIR.is_dir() and any(SVG_DIR.iterdir()):
-        print(f"SVG directory {SVG_DIR} found and is not empty. Skipping SVG download.")
-        svgs_missing = False
-    elif not SVG_DIR.is_dir():
-        print(f"SVG directory {SVG_DIR} not found.")
-    else: # SVG_DIR exists but is empty
-        print(f"SVG directory {SVG_DIR} found but is empty.")
-
-    if svgs_missing:
-        print(f"Running {DOWNLOAD_SVGS_SCRIPT.name} to download SVGs...")
-        if not DOWNLOAD_SVGS_SCRIPT.exists():
-            print(f"Error: SVG Download script {DOWNLOAD_SVGS_SCRIPT} not found. Cannot proceed.")
-            sys.exit(1)
-        
-        try:
-            script_env = os.environ.copy()
-            script_env['PYTHONIOENCODING'] = 'utf-8'
-            
-            process_result = subprocess.run(
-                [str(python_exe_in_venv), str(DOWNLOAD_SVGS_SCRIPT)],
-                cwd=BASE_DIR, check=True, capture_output=True, text=True, env=script_env, encoding='utf-8'
-            )
-            # print(process_result.stdout) # Optional: print script output
-            # if process_result.stderr: # Optional: print script error output
-            #     print(f"Errors from {DOWNLOAD_SVGS_SCRIPT.name}:\n{process_result.stderr}", file=sys.stderr)
-            print(f"{DOWNLOAD_SVGS_SCRIPT.name} completed.")
-        except subprocess.CalledProcessError as e:
-            print(f"Error running {DOWNLOAD_SVGS_SCRIPT.name}: {e.stderr}")
-            sys.exit(1)
-        except FileNotFoundError:
-            print(f"Error: The Python executable '{python_exe_in_venv}' or script '{DOWNLOAD_SVGS_SCRIPT}' was not found.")
-            sys.exit(1)
-
-    # Step 3: Run init_db.py and populate_examples.py if necessary
-    db_needs_initialization = True
-    if DB_FILE.exists():
-        print(f"Database file {DB_FILE} found.")
-        conn = None # Ensure conn is defined for finally block
-        try:
-            conn = sqlite3.connect(str(DB_FILE))
-            if check_db_table_exists(conn, 'kanjis'):
-                db_needs_initialization = False
-                print("Database and 'kanjis' table found.")
-            else:
-                print("'kanjis' table not found in the database. Database will be initialized.")
-        except sqlite3.Error as e:
-            print(f"Error connecting to database {DB_FILE} or checking table: {e}. Will attempt to re-initialize.")
-            db_needs_initialization = True # Force re-initialization on error
-        finally:
-            if conn:
-                conn.close()
-    else:
-        print(f"Database file {DB_FILE} not found. Database will be initialized.")
-
-    if db_needs_initialization:
-        print("Database requires initialization. Running initialization scripts...")
-        
-        # Run init_db.py
-        if not INIT_DB_SCRIPT.exists():
-            print(f"Error: Init DB script {INIT_DB_SCRIPT} not found. Cannot proceed.")
-            sys.exit(1)
-        try:
-            # Ensure script_env is defined for INIT_DB_SCRIPT, containing PYTHONIOENCODING='utf-8'
-            script_env_init_db = os.environ.copy()
-            script_env_init_db['PYTHONIOENCODING'] = 'utf-8'
-
-            print(f"Running {INIT_DB_SCRIPT.name} with direct console output for debugging...")
-            subprocess.run(
-                [str(python_exe_in_venv), str(INIT_DB_SCRIPT)],
-                cwd=BASE_DIR,
-                env=script_env_init_db, 
-                check=False # Allow script to run and print even if it has errors
-            )
-            # No process_result.stdout or .stderr to print here as output is direct to console
-            # No explicit check for process_result.returncode as check=False
-            print(f"{INIT_DB_SCRIPT.name} execution attempt finished.") # Indicate script has run
-        except subprocess.CalledProcessError as e:
-            print(f"Error running {INIT_DB_SCRIPT.name}: {e.stderr}")
-            sys.exit(1)
-        except FileNotFoundError:
-            print(f"Error: The Python executable '{python_exe_in_venv}' or script '{INIT_DB_SCRIPT}' was not found.")
-            sys.exit(1)
+    started = time.perf_counter()
+    try:
+        results = run_pipeline(BUILD_STAGES, hasher, stamps)
+    finally:
+        save_stamps(stamps, hasher)
 
-        # Run populate_examples.py
-        if not POPULATE_EXAMPLES_SCRIPT.exists():
-            print(f"Error: Populate examples script {POPULATE_EXAMPLES_SCRIPT} not found. Cannot proceed.")
-            sys.exit(1)
-        try:
-            # For POPULATE_EXAMPLES_SCRIPT, keep current settings (capture output) unless specified otherwise
-            # If it also needs PYTHONIOENCODING, its script_env should be set similarly
-            script_env_populate_db = os.environ.copy()
-            script_env_populate_db['PYTHONIOENCODING'] = 'utf-8'
-            process_result = subprocess.run(
-                [str(python_exe_in_venv), str(POPULATE_EXAMPLES_SCRIPT)],
-                cwd=BASE_DIR, check=True, capture_output=True, text=True, env=script_env_populate_db, encoding='utf-8'
-            )
-            print(f"{POPULATE_EXAMPLES_SCRIPT.name} completed.")
-        except subprocess.CalledProcessError as e:
-            print(f"Error running {POPULATE_EXAMPLES_SCRIPT.name}: {e.stderr}")
-            sys.exit(1)
-        except FileNotFoundError:
-            print(f"Error: The Python executable '{python_exe_in_venv}' or script '{POPULATE_EXAMPLES_SCRIPT}' was not found.")
-            sys.exit(1)
-        print("Database setup complete.")
-    else:
-        print("Database already appears to be set up.")
+    print("\n--- Build Stages ---")
+    for stage in BUILD_STAGES:
+        status, seconds = results[stage.name]
+        print(f"{stage.name:<10} {status:<8} {seconds:8.1f}s")
+    print(f"{'total':<10} {'':<8} {time.perf_counter() - started:8.1f}s")
+    print("--------------------\n")
+    if any(status != 'ran' and status != 'skipped' for status, _ in results.values()):
+        print("Database setup failed; see the stage output above.")
+        sys.exit(1)
+    print("Database setup complete.")
 
 # Main Execution Block
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Sets up the environment and data, then starts the kanji app.")
+    parser.add_argument('--production', action='store_true',
+                        help="Serve with serve.py (several worker processes) instead of the development server.")
+    parser.add_argument('--host', help="Address to listen on (production mode).")
+    parser.add_argument('--port', type=int, help="Port to listen on (production mode).")
+    parser.add_argument('--workers', type=int, help="Worker processes, 0 = one per CPU core (production mode).")
+    parser.add_argument('--threads', type=int, help="Threads per worker (production mode).")
+    args = parser.parse_args()
+    serve_args = []
+    for option in ('host', 'port', 'workers', 'threads'):
+        if getattr(args, option) is not None:
+            serve_args += [f"--{option}", str(getattr(args, option))]
+
     # Ensure project directory exists, create if not. This is good practice.
     if not PROJECT_DIR.exists():
         print(f"Project directory {PROJECT_DIR} not found. Creating it...")
@@ -289,7 +382,9 @@ if __name__ == '__main__':
             print(f"Error creating project directory {PROJECT_DIR}: {e}")
             sys.exit(1)
             
-    create_venv()
-    install_dependencies()
-    setup_database() # Call the new database setup function
-    run_application()
+    stamps = load_stamps()
+    hasher = ContentHasher(stamps['files'])
+    venv_created = create_venv()
+    install_dependencies(stamps, hasher, venv_created)
+    setup_database(stamps, hasher) # Also saves the stamps
+    run_application(production=args.production, serve_args=serve_args)
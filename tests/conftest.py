@@ -0,0 +1,85 @@
+"""Shared fixtures. The data scripts import each other as top-level modules, so
+their directory (and the project, for the 'app' package) is put on sys.path."""
+import http.server
+import pathlib
+import sys
+import threading
+import time
+
+import pytest
+
+ROOT_DIR = pathlib.Path(__file__).resolve().parent.parent
+PROJECT_DIR = ROOT_DIR / 'kanji_project'
+SCRIPTS_DIR = PROJECT_DIR / 'scripts'
+for path in (ROOT_DIR, PROJECT_DIR, SCRIPTS_DIR):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+
+class StandInServer:
+    """A local HTTP server answering GETs from canned responses, logging every request.
+
+    'routes' maps a path to a list of (status, headers, body) responses, used in
+    order; the last one is repeated. Unknown paths get 404. 'delay' seconds are
+    waited before each answer.
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.requests = [] # (monotonic time, path)
+        self.delay = 0.0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                with server._lock:
+                    server.requests.append((time.monotonic(), self.path))
+                    responses = server.routes.get(self.path)
+                    if responses:
+                        status, headers, body = responses.pop(0) if len(responses) > 1 else responses[0]
+                    else:
+                        status, headers, body = 404, {}, b'not found'
+                if server.delay:
+                    time.sleep(server.delay)
+                if isinstance(body, str):
+                    body = body.encode('utf-8')
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    def set(self, path, *responses):
+        """Answers 'path' with 'responses' ((status, headers, body) tuples, or a body for a 200)."""
+        with self._lock:
+            self.routes[path] = [
+                response if isinstance(response, tuple) else (200, {}, response) for response in responses
+            ]
+
+    def paths(self):
+        with self._lock:
+            return [path for _, path in self.requests]
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def stand_in_server():
+    server = StandInServer()
+    yield server
+    server.close()
@@ -0,0 +1,47 @@
+"""compress_svgs.py keeps the precompressed variants in step with the SVGs."""
+import gzip
+import os
+
+import pytest
+
+import compress_svgs
+
+
+@pytest.fixture
+def svg_dir(tmp_path, monkeypatch):
+    svg_dir = tmp_path / 'kanjivg_svgs'
+    svg_dir.mkdir()
+    monkeypatch.setattr(compress_svgs, 'SVG_DIR', svg_dir)
+    monkeypatch.setattr(compress_svgs, 'brotli', None) # Results do not depend on the optional module.
+    return svg_dir
+
+
+def test_variants_follow_svg_contents(svg_dir):
+    svg_path = svg_dir / '04e00.svg'
+    gz_path = svg_dir / '04e00.svg.gz'
+    svg_path.write_bytes(b'<svg>one</svg>')
+    compress_svgs.compress_all_svgs()
+    assert gzip.decompress(gz_path.read_bytes()) == b'<svg>one</svg>'
+    built_at = gz_path.stat().st_mtime_ns
+
+    # Unchanged content is not recompressed, even if the SVG is touched.
+    os.utime(svg_path, ns=(built_at + 10**9, built_at + 10**9))
+    compress_svgs.compress_all_svgs()
+    assert gz_path.stat().st_mtime_ns == built_at
+
+    # New content is, even with an mtime older than the variant's.
+    svg_path.write_bytes(b'<svg>changed</svg>')
+    os.utime(svg_path, ns=(built_at - 10**9, built_at - 10**9))
+    compress_svgs.compress_all_svgs()
+    assert gzip.decompress(gz_path.read_bytes()) == b'<svg>changed</svg>'
+
+
+def test_orphaned_and_stale_variants_are_removed(svg_dir, capsys):
+    (svg_dir / '04e00.svg').write_bytes(b'<svg>one</svg>')
+    (svg_dir / '04e8c.svg.gz').write_bytes(gzip.compress(b'<svg>gone</svg>'))
+    (svg_dir / '04e8c.svg.br').write_bytes(b'gone')
+    (svg_dir / '04e00.svg.br').write_bytes(b'built from an unknown version')
+    compress_svgs.compress_all_svgs()
+    assert sorted(path.name for path in svg_dir.iterdir()) == [
+        '04e00.svg', '04e00.svg.gz', compress_svgs.MANIFEST_FILENAME]
+    assert 'stale or orphaned removed: 3' in capsys.readouterr().out
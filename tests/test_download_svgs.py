@@ -0,0 +1,132 @@
+"""download_svgs.py against a local stand-in of the KanjiVG host and local release archives."""
+import functools
+import io
+import tarfile
+import time
+import zipfile
+
+import pytest
+
+import download_svgs
+from http_utils import HttpClient
+from kanji_records import write_records
+
+KANJI_CHARS = '一二三四五六七八'
+
+
+def svg_for(kanji_char):
+    return f'<svg id="kvg:{ord(kanji_char):05x}"/>'.encode('utf-8')
+
+
+@pytest.fixture
+def svg_paths(tmp_path, monkeypatch):
+    """Points the script at a temporary dataset of KANJI_CHARS and an empty SVG directory."""
+    data_dir = tmp_path / 'data'
+    svg_dir = data_dir / 'kanjivg_svgs'
+    data_dir.mkdir()
+    write_records(data_dir / 'kanji_data.jsonl',
+                  [{'kanji': kanji_char, 'unicode': f'{ord(kanji_char):x}'} for kanji_char in KANJI_CHARS])
+    monkeypatch.setattr(download_svgs, 'DATA_DIR', data_dir)
+    monkeypatch.setattr(download_svgs, 'SVG_OUTPUT_DIR', svg_dir)
+    monkeypatch.setattr(download_svgs, 'HttpClient', functools.partial(HttpClient, max_retries=2, backoff_base=0.001))
+    return svg_dir
+
+
+def serve_svgs(server, kanji_chars):
+    for kanji_char in kanji_chars:
+        server.set(f'/kanji/{ord(kanji_char):05x}.svg', svg_for(kanji_char))
+
+
+def test_missing_svgs_are_downloaded_concurrently(stand_in_server, svg_paths, capsys):
+    serve_svgs(stand_in_server, KANJI_CHARS[:-1]) # The last one answers 404.
+    stand_in_server.delay = 0.3
+    started = time.monotonic()
+    download_svgs.download_all_svgs(base_url=stand_in_server.url + '/kanji', requests_per_second=0, concurrency=8)
+    elapsed = time.monotonic() - started
+    # Eight requests of 0.3 s each would take 2.4 s one after another.
+    assert elapsed < 1.2
+    for kanji_char in KANJI_CHARS[:-1]:
+        assert (svg_paths / f'{ord(kanji_char):05x}.svg').read_bytes() == svg_for(kanji_char)
+    assert not (svg_paths / f'{ord(KANJI_CHARS[-1]):05x}.svg').exists()
+    output = capsys.readouterr().out
+    assert 'Successfully downloaded: 7' in output
+    assert 'Not found at source (404): 1' in output
+
+
+def test_existing_svgs_are_not_downloaded_again(stand_in_server, svg_paths):
+    serve_svgs(stand_in_server, KANJI_CHARS)
+    svg_paths.mkdir(parents=True)
+    existing = svg_paths / f'{ord(KANJI_CHARS[0]):05x}.svg'
+    existing.write_bytes(b'<svg>kept</svg>')
+    download_svgs.download_all_svgs(base_url=stand_in_server.url + '/kanji', requests_per_second=0, concurrency=4)
+    assert f'/kanji/{existing.name}' not in stand_in_server.paths()
+    assert len(stand_in_server.paths()) == len(KANJI_CHARS) - 1
+    assert existing.read_bytes() == b'<svg>kept</svg>'
+
+    # Everything is on disk now, so a second run makes no request at all.
+    download_svgs.download_all_svgs(base_url=stand_in_server.url + '/kanji', requests_per_second=0, concurrency=4)
+    assert len(stand_in_server.paths()) == len(KANJI_CHARS) - 1
+
+
+def test_server_errors_exit_non_zero(stand_in_server, svg_paths, capsys):
+    serve_svgs(stand_in_server, KANJI_CHARS)
+    failing = f'/kanji/{ord(KANJI_CHARS[0]):05x}.svg'
+    stand_in_server.set(failing, (503, {}, 'down'))
+    with pytest.raises(SystemExit) as excinfo:
+        download_svgs.download_all_svgs(base_url=stand_in_server.url + '/kanji', requests_per_second=0, concurrency=4)
+    assert excinfo.value.code == 1
+    assert stand_in_server.paths().count(failing) == 3 # Retried before giving up.
+    assert len(list(svg_paths.iterdir())) == len(KANJI_CHARS) - 1
+    assert 'Other errors: 1' in capsys.readouterr().out
+
+    # The next run only asks for the SVG that failed.
+    serve_svgs(stand_in_server, KANJI_CHARS)
+    stand_in_server.requests.clear()
+    download_svgs.download_all_svgs(base_url=stand_in_server.url + '/kanji', requests_per_second=0, concurrency=4)
+    assert stand_in_server.paths() == [failing]
+
+
+def write_archive(path, members):
+    """Writes 'members' (name -> bytes) as a zip or tar.gz archive, according to the suffix of 'path'."""
+    if path.suffix == '.zip':
+        with zipfile.ZipFile(path, 'w') as archive:
+            for name, data in members.items():
+                archive.writestr(name, data)
+        return
+    with tarfile.open(path, 'w:gz') as archive:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+
+
+@pytest.mark.parametrize('archive_name', ['kanjivg.zip', 'kanjivg.tar.gz'])
+def test_svgs_are_imported_from_a_release_archive(tmp_path, svg_paths, archive_name):
+    archive_path = tmp_path / archive_name
+    members = {f'kanji/{ord(kanji_char):05x}.svg': svg_for(kanji_char) for kanji_char in KANJI_CHARS}
+    # Variants and files outside 'kanji/' with other names are left alone.
+    members['kanji/04e00-Kaisho.svg'] = b'<svg>variant</svg>'
+    members['README.md'] = b'KanjiVG'
+    write_archive(archive_path, members)
+    download_svgs.download_all_svgs(archive_path=str(archive_path))
+    assert sorted(path.name for path in svg_paths.iterdir()) == sorted(
+        f'{ord(kanji_char):05x}.svg' for kanji_char in KANJI_CHARS)
+    assert (svg_paths / '04e00.svg').read_bytes() == svg_for('一')
+
+
+@pytest.mark.parametrize('archive_name', ['kanjivg.zip', 'kanjivg.tar.gz'])
+def test_archive_members_with_unsafe_paths_are_rejected(tmp_path, svg_paths, capsys, archive_name):
+    archive_path = tmp_path / archive_name
+    write_archive(archive_path, {
+        '../04e00.svg': b'<svg>outside</svg>',
+        '/abs/04e8c.svg': b'<svg>absolute</svg>',
+        'kanji/../../04e09.svg': b'<svg>climbing</svg>',
+        'kanji/056db.svg': svg_for('四'),
+    })
+    download_svgs.download_all_svgs(archive_path=str(archive_path))
+    assert [path.name for path in svg_paths.iterdir()] == ['056db.svg']
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted([archive_name, 'data'])
+    output = capsys.readouterr().out
+    for name in ('../04e00.svg', '/abs/04e8c.svg', 'kanji/../../04e09.svg'):
+        assert f"archive member '{name}' has an unsafe path" in output
+    assert "SVG 04e00.svg for Kanji '一' not found in the archive" in output
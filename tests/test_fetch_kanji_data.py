@@ -0,0 +1,191 @@
+"""fetch_kanji_data.py and http_utils.py against a local stand-in of kanjiapi.dev."""
+import functools
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import time
+from urllib.parse import quote
+
+import pytest
+
+import fetch_kanji_data
+import http_utils
+from conftest import SCRIPTS_DIR
+from http_utils import HttpClient
+from kanji_records import iter_records
+
+
+def kanji_json(kanji_char):
+    return json.dumps({
+        'kanji': kanji_char, 'grade': 1, 'stroke_count': 1, 'meanings': ['one'],
+        'kun_readings': ['ひと'], 'on_readings': ['イチ'], 'jlpt': 5, 'unicode': f"{ord(kanji_char):x}",
+    })
+
+
+def words_json(kanji_char):
+    return json.dumps([{'meanings': [{'glosses': [f"{kanji_char} word"]}],
+                        'variants': [{'written': kanji_char + 'つ', 'pronounced': 'ひとつ'}]}])
+
+
+def serve_api(server, kanji_chars):
+    server.set('/v1/kanji/all', json.dumps(kanji_chars))
+    for kanji_char in kanji_chars:
+        server.set(quote(f'/v1/kanji/{kanji_char}'), kanji_json(kanji_char))
+        server.set(quote(f'/v1/words/{kanji_char}'), words_json(kanji_char))
+
+
+@pytest.fixture
+def fetch_paths(tmp_path, monkeypatch):
+    """Points the fetcher's journal and output at a temporary directory, with fast retries."""
+    monkeypatch.setattr(fetch_kanji_data, 'OUTPUT_DIR', str(tmp_path))
+    monkeypatch.setattr(fetch_kanji_data, 'JOURNAL_FILE', str(tmp_path / 'journal.jsonl'))
+    monkeypatch.setattr(fetch_kanji_data, 'HttpClient',
+                        functools.partial(HttpClient, max_retries=2, backoff_base=0.001))
+    return tmp_path
+
+
+def run_fetch(server, tmp_path, **kwargs):
+    output_file = tmp_path / 'kanji_data.jsonl'
+    fetch_kanji_data.main(base_url=server.url + '/v1', requests_per_second=0, concurrency=4,
+                          output_file=str(output_file), **kwargs)
+    return [record['kanji'] for record in iter_records(output_file)]
+
+
+def test_rate_limit_spaces_requests(stand_in_server):
+    stand_in_server.set('/ping', 'ok')
+    # A bucket of 10 per second allows a burst of 10, then one request every 0.1 s.
+    with HttpClient(requests_per_second=10, max_per_host=4) as client:
+        started = time.monotonic()
+        for _ in range(15):
+            assert client.get(stand_in_server.url + '/ping').status_code == 200
+        elapsed = time.monotonic() - started
+    assert elapsed >= 0.45
+    assert len(stand_in_server.paths()) == 15
+
+
+def test_retry_after_is_honoured(stand_in_server):
+    stand_in_server.set('/busy', (429, {'Retry-After': '1'}, 'slow down'), 'ok')
+    with HttpClient(requests_per_second=0, backoff_base=0.001) as client:
+        started = time.monotonic()
+        response = client.get(stand_in_server.url + '/busy')
+        elapsed = time.monotonic() - started
+    assert response.status_code == 200
+    assert stand_in_server.paths() == ['/busy', '/busy']
+    assert elapsed >= 0.9
+
+
+def test_server_errors_are_retried(stand_in_server):
+    stand_in_server.set('/flaky', (503, {}, 'down'), (502, {}, 'down'), 'ok')
+    stand_in_server.set('/broken', (500, {}, 'down'))
+    with HttpClient(requests_per_second=0, max_retries=3, backoff_base=0.001) as client:
+        assert client.get(stand_in_server.url + '/flaky').status_code == 200
+        # Once the retries run out, the last response is returned as is.
+        assert client.get(stand_in_server.url + '/broken').status_code == 500
+    assert stand_in_server.paths().count('/flaky') == 3
+    assert stand_in_server.paths().count('/broken') == 4
+
+
+def test_client_errors_are_not_retried(stand_in_server):
+    with HttpClient(requests_per_second=0, backoff_base=0.001) as client:
+        assert client.get(stand_in_server.url + '/missing').status_code == 404
+    assert stand_in_server.paths() == ['/missing']
+
+
+def test_fetch_resumes_from_journal(stand_in_server, fetch_paths):
+    kanji_chars = ['一', '二', '三']
+    serve_api(stand_in_server, kanji_chars)
+    stand_in_server.set(quote('/v1/kanji/三'), (503, {}, 'down'))
+
+    assert run_fetch(stand_in_server, fetch_paths) == ['一', '二']
+    assert set(fetch_kanji_data.load_journal(fetch_kanji_data.JOURNAL_FILE)) == {'一', '二'}
+
+    # Second run: only the failed kanji is requested again.
+    serve_api(stand_in_server, kanji_chars)
+    stand_in_server.requests.clear()
+    assert run_fetch(stand_in_server, fetch_paths) == kanji_chars
+    assert sorted(stand_in_server.paths()) == sorted(
+        ['/v1/kanji/all', quote('/v1/kanji/三'), quote('/v1/words/三')])
+
+
+def test_failed_example_words_are_not_journaled(stand_in_server, fetch_paths):
+    serve_api(stand_in_server, ['一', '二'])
+    stand_in_server.set(quote('/v1/words/二'), (503, {}, 'down'))
+    assert run_fetch(stand_in_server, fetch_paths) == ['一']
+    assert set(fetch_kanji_data.load_journal(fetch_kanji_data.JOURNAL_FILE)) == {'一'}
+
+    serve_api(stand_in_server, ['一', '二'])
+    assert run_fetch(stand_in_server, fetch_paths) == ['一', '二']
+    records = list(iter_records(fetch_paths / 'kanji_data.jsonl'))
+    assert records[1]['example_words'] == json.loads(words_json('二'))
+
+
+def test_missing_example_words_are_saved_empty(stand_in_server, fetch_paths):
+    serve_api(stand_in_server, ['一'])
+    stand_in_server.set(quote('/v1/words/一'), (404, {}, 'not found'))
+    assert run_fetch(stand_in_server, fetch_paths) == ['一']
+    assert next(iter_records(fetch_paths / 'kanji_data.jsonl'))['example_words'] == []
+
+
+def test_empty_kanji_list_exits_non_zero(stand_in_server, fetch_paths):
+    serve_api(stand_in_server, [])
+    with pytest.raises(SystemExit) as excinfo:
+        run_fetch(stand_in_server, fetch_paths)
+    assert excinfo.value.code == 1
+    assert not (fetch_paths / 'kanji_data.jsonl').exists()
+
+
+def test_nothing_fetched_exits_non_zero(stand_in_server, fetch_paths):
+    serve_api(stand_in_server, ['一', '二'])
+    for kanji_char in ('一', '二'):
+        stand_in_server.set(quote(f'/v1/kanji/{kanji_char}'), (503, {}, 'down'))
+    with pytest.raises(SystemExit) as excinfo:
+        run_fetch(stand_in_server, fetch_paths)
+    assert excinfo.value.code == 1
+    # No empty output is left behind for launch.py to take as a finished download.
+    assert not (fetch_paths / 'kanji_data.jsonl').exists()
+
+
+def test_refresh_ttl_refetches_old_records(stand_in_server, fetch_paths):
+    serve_api(stand_in_server, ['一', '二'])
+    run_fetch(stand_in_server, fetch_paths)
+    stand_in_server.requests.clear()
+    run_fetch(stand_in_server, fetch_paths, refresh_ttl=0)
+    assert quote('/v1/kanji/一') in stand_in_server.paths()
+    assert quote('/v1/kanji/二') in stand_in_server.paths()
+
+
+def test_interrupt_stops_queued_fetches(stand_in_server, tmp_path):
+    # The script keeps its data next to its own directory, so it runs from a copy.
+    scripts_dir = tmp_path / 'scripts'
+    scripts_dir.mkdir()
+    for name in ('fetch_kanji_data.py', 'http_utils.py', 'build_utils.py', 'kanji_records.py'):
+        shutil.copy(SCRIPTS_DIR / name, scripts_dir / name)
+    kanji_chars = [chr(0x4e00 + i) for i in range(200)]
+    serve_api(stand_in_server, kanji_chars)
+    stand_in_server.delay = 0.05
+    journal_path = tmp_path / 'data' / 'kanji_fetch_journal.jsonl'
+
+    process = subprocess.Popen(
+        [sys.executable, str(scripts_dir / 'fetch_kanji_data.py'), '--base-url', stand_in_server.url + '/v1',
+         '--rate', '0', '--concurrency', '4'],
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=dict(os.environ, PYTHONIOENCODING='utf-8'))
+    try:
+        deadline = time.monotonic() + 20
+        while not (journal_path.exists() and journal_path.read_bytes().count(b'\n') >= 4):
+            assert time.monotonic() < deadline, "the fetch never started journaling"
+            time.sleep(0.02)
+        process.send_signal(signal.SIGINT)
+        interrupted = time.monotonic()
+        output, _ = process.communicate(timeout=20)
+    finally:
+        process.kill()
+    # Only the requests in flight are finished, not the ~2.5 s left of the queue.
+    assert time.monotonic() - interrupted < 1.5
+    assert process.returncode == 130, output.decode('utf-8', 'replace')
+    journaled = journal_path.read_bytes().count(b'\n')
+    assert 4 <= journaled < len(kanji_chars)
+    requested = sum(1 for path in stand_in_server.paths() if path.startswith('/v1/kanji/%'))
+    assert requested <= journaled + 4
@@ -0,0 +1,47 @@
+"""init_db.py and populate_examples.py exit non-zero when they fail, leaving kanji.db alone."""
+import sqlite3
+
+import pytest
+
+import init_db
+import populate_examples
+
+
+@pytest.fixture
+def database_path(tmp_path, monkeypatch):
+    """Points both scripts at a database and data directory in a temporary directory."""
+    path = tmp_path / 'kanji.db'
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+    monkeypatch.setattr(init_db, 'DATABASE_PATH', path)
+    monkeypatch.setattr(init_db, 'DATA_DIR', data_dir)
+    return path
+
+
+def test_init_db_without_data_exits_non_zero(database_path, capsys):
+    with pytest.raises(SystemExit) as excinfo:
+        init_db.main()
+    assert excinfo.value.code == 1
+    assert 'no kanji data file' in capsys.readouterr().out
+    assert not database_path.exists()
+
+
+def test_init_db_with_invalid_data_exits_non_zero(database_path):
+    (database_path.parent / 'data' / 'kanji_data.jsonl').write_text('{"kanji": "一", \n')
+    with pytest.raises(SystemExit) as excinfo:
+        init_db.main()
+    assert excinfo.value.code == 1
+    assert not database_path.exists()
+
+
+def test_populate_examples_failing_checks_exits_non_zero(database_path, capsys):
+    # A database with the schema but no kanjis fails verify_database() once words are added.
+    conn = sqlite3.connect(database_path)
+    init_db.ensure_schema(conn)
+    conn.close()
+    before = database_path.read_bytes()
+    with pytest.raises(SystemExit) as excinfo:
+        populate_examples.main()
+    assert excinfo.value.code == 1
+    assert 'no kanjis loaded' in capsys.readouterr().out
+    assert database_path.read_bytes() == before
@@ -0,0 +1,79 @@
+"""launch.py's build stages: a stage is stamped only when all its scripts succeed."""
+import shutil
+import sys
+
+import pytest
+
+import launch
+from conftest import SCRIPTS_DIR
+from kanji_records import write_records
+
+
+@pytest.fixture
+def stage_files(tmp_path, monkeypatch):
+    """An input and an output file for a test stage; scripts run with this interpreter."""
+    monkeypatch.setattr(launch, 'python_exe_in_venv', sys.executable)
+    input_path = tmp_path / 'input.txt'
+    output_path = tmp_path / 'output.txt'
+    input_path.write_text('input')
+    output_path.write_text('output')
+    return input_path, output_path
+
+
+def make_stage(tmp_path, stage_files, *exit_codes):
+    scripts = []
+    for index, exit_code in enumerate(exit_codes):
+        script = tmp_path / f'step{index}.py'
+        script.write_text(f"import sys\nprint('step {index}')\nsys.exit({exit_code})\n")
+        scripts.append(script)
+    input_path, output_path = stage_files
+    return launch.Stage('test', scripts, inputs=lambda: [input_path], outputs=lambda: [output_path])
+
+
+def test_failing_stage_is_not_stamped(tmp_path, stage_files):
+    stage = make_stage(tmp_path, stage_files, 0, 1)
+    stamps = {'stages': {}}
+    status, _ = launch.run_stage(stage, launch.ContentHasher({}), stamps)
+    assert status == 'failed'
+    assert 'test' not in stamps['stages']
+    # Nothing was stamped, so the next launch runs it again instead of skipping it.
+    status, _ = launch.run_stage(stage, launch.ContentHasher({}), stamps)
+    assert status == 'failed'
+
+
+def test_successful_stage_is_stamped_and_then_skipped(tmp_path, stage_files):
+    stage = make_stage(tmp_path, stage_files, 0, 0)
+    stamps = {'stages': {}}
+    assert launch.run_stage(stage, launch.ContentHasher({}), stamps)[0] == 'ran'
+    assert 'test' in stamps['stages']
+    assert launch.run_stage(stage, launch.ContentHasher({}), stamps)[0] == 'skipped'
+
+    stage_files[0].write_text('changed input')
+    assert launch.run_stage(stage, launch.ContentHasher({}), stamps)[0] == 'ran'
+
+
+def test_svg_stage_is_not_stamped_after_a_server_error(tmp_path, monkeypatch, stand_in_server):
+    # download_svgs.py keeps its data next to its own directory, so it runs from a copy.
+    monkeypatch.setattr(launch, 'python_exe_in_venv', sys.executable)
+    scripts_dir = tmp_path / 'scripts'
+    scripts_dir.mkdir()
+    for name in ('download_svgs.py', 'http_utils.py', 'build_utils.py', 'kanji_records.py'):
+        shutil.copy(SCRIPTS_DIR / name, scripts_dir / name)
+    data_path = tmp_path / 'data' / 'kanji_data.jsonl'
+    svg_dir = tmp_path / 'data' / 'kanjivg_svgs'
+    data_path.parent.mkdir()
+    write_records(data_path, [{'kanji': '一', 'unicode': '4e00'}, {'kanji': '二', 'unicode': '4e8c'}])
+    stand_in_server.set('/kanji/04e00.svg', '<svg/>')
+    # Retry-After: 0 keeps the script's retries from sleeping.
+    stand_in_server.set('/kanji/04e8c.svg', (503, {'Retry-After': '0'}, 'down'))
+    monkeypatch.setenv('KANJIVG_BASE_URL', stand_in_server.url + '/kanji/')
+    stage = launch.Stage('svgs', [scripts_dir / 'download_svgs.py'],
+                         inputs=lambda: [data_path], outputs=lambda: [svg_dir])
+
+    stamps = {'stages': {}}
+    assert launch.run_stage(stage, launch.ContentHasher({}), stamps)[0] == 'failed'
+    assert 'svgs' not in stamps['stages']
+
+    stand_in_server.set('/kanji/04e8c.svg', '<svg/>')
+    assert launch.run_stage(stage, launch.ContentHasher({}), stamps)[0] == 'ran'
+    assert sorted(path.name for path in svg_dir.iterdir()) == ['04e00.svg', '04e8c.svg']
@@ -0,0 +1,66 @@
+"""The HTTP API and file routes (app/routes.py) against a small temporary database."""
+import json
+
+import pytest
+
+import init_db
+from app import create_app, db
+
+KANJI_CHARS = '一二三'
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    database_path = tmp_path / 'kanji.db'
+    conn = init_db.get_db_connection(database_path)
+    init_db.ensure_schema(conn)
+    init_db.bulk_load(conn, (json.dumps({'kanji': kanji_char, 'unicode': f'{ord(kanji_char):x}', 'meanings': ['one']},
+                                        ensure_ascii=False).encode('utf-8') for kanji_char in KANJI_CHARS))
+    init_db.rebuild_derived_tables(conn)
+    conn.close()
+    monkeypatch.setattr(db, 'DATABASE_PATH', database_path)
+    app = create_app()
+    app.root_path = str(tmp_path / 'app') # Puts the data directory at tmp_path / 'data'.
+    yield app.test_client()
+    db.close_thread_connection()
+
+
+def test_kanji_etag_revalidation(client):
+    response = client.get('/api/kanji/一')
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert client.get('/api/kanji/一', headers={'If-None-Match': etag}).status_code == 304
+    assert client.get('/api/kanji/一', headers={'If-None-Match': '*'}).status_code == 304
+
+
+def test_star_if_none_match_does_not_hide_unknown_kanjis(client):
+    response = client.get('/api/kanji/x', headers={'If-None-Match': '*'})
+    assert response.status_code == 404
+    assert 'ETag' not in response.headers
+
+
+def test_svg_variants_are_only_served_through_accept_encoding(client, tmp_path):
+    svg_dir = tmp_path / 'data' / 'kanjivg_svgs'
+    svg_dir.mkdir(parents=True)
+    (svg_dir / '04e00.svg').write_bytes(b'<svg/>')
+    (svg_dir / '04e00.svg.gz').write_bytes(b'gzipped')
+    (svg_dir / '04e00.svg.br').write_bytes(b'brotli')
+
+    response = client.get('/data/svgs/04e00.svg', headers={'Accept-Encoding': 'gzip'})
+    assert (response.data, response.content_encoding) == (b'gzipped', 'gzip')
+    assert response.mimetype == 'image/svg+xml'
+    response = client.get('/data/svgs/04e00.svg', headers={'Accept-Encoding': 'identity'})
+    assert (response.data, response.content_encoding) == (b'<svg/>', None)
+    for name in ('04e00.svg.gz', '04e00.svg.br'):
+        assert client.get(f'/data/svgs/{name}').status_code == 404
+
+
+def test_oversized_analysis_bodies_are_rejected_before_reading(client):
+    app = client.application
+    app.config.update(ANALYZE_MAX_TEXT_LENGTH=10, MAX_CONTENT_LENGTH=40)
+    assert client.post('/api/analyze/text', data='一二三'.encode('utf-8'), content_type='text/plain').status_code == 200
+    assert client.post('/api/analyze/text', data='一' * 11, content_type='text/plain').status_code == 413
+
+    response = client.post('/api/analyze/text', data=b'x' * 41, content_type='text/plain')
+    assert response.status_code == 413
+    assert response.json['error'] == 'Request body is too large (41 bytes), the maximum is 40'
@@ -0,0 +1,72 @@
+"""The in-memory snapshot answers searches exactly like the SQL indexes (app/snapshot.py)."""
+import json
+import random
+import sqlite3
+
+import pytest
+
+import init_db
+from app import routes
+from app.snapshot import KanjiSnapshot
+
+WORDS = ['water', 'Water', 'WATERFALL', 'fire', 'tree', 'aaa', 'aaaa', 'banana', 'one two', 'ichi', 'Ōsaka', 'ÉTÉ']
+KANA = [chr(code) for code in range(0x3041, 0x3097)]
+
+
+def kanji_records(count=120):
+    rng = random.Random(11)
+    kanji_chars = [chr(0x4e00 + index) for index in range(count)]
+    for kanji_char in kanji_chars:
+        example_words = []
+        for _ in range(rng.randint(0, 6)):
+            word = kanji_char + ''.join(rng.choice(kanji_chars) for _ in range(rng.randint(0, 2)))
+            reading = ''.join(rng.choice(KANA) for _ in range(rng.randint(2, 4)))
+            gloss = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 4)))
+            example_words.append({'meanings': [{'glosses': [gloss]}], 'variants': [{'written': word, 'pronounced': reading}]})
+        yield {
+            'kanji': kanji_char, 'unicode': f'{ord(kanji_char):x}', 'grade': 1, 'stroke_count': 1, 'jlpt': 5,
+            'meanings': rng.sample(WORDS, 2), 'kun_readings': [rng.choice(KANA) * 2], 'on_readings': ['イチ'],
+            'example_words': example_words,
+        }
+
+
+@pytest.fixture(scope='module')
+def conn(tmp_path_factory):
+    path = tmp_path_factory.mktemp('snapshot') / 'kanji.db'
+    conn = init_db.get_db_connection(path)
+    init_db.ensure_schema(conn)
+    init_db.bulk_load(conn, (json.dumps(record, ensure_ascii=False).encode('utf-8') for record in kanji_records()))
+    init_db.rebuild_derived_tables(conn)
+    yield conn
+    conn.close()
+
+
+def search_terms(conn):
+    rng = random.Random(5)
+    terms = set(WORDS) | {'a', 'A', 'aa', 'ね', 'イチ', 'zzz', '%', 'er ', 'ōsa', 'été', 'one two', 'e t'}
+    for row in conn.execute("SELECT meanings, example_words FROM kanji_search"):
+        for text in filter(None, row):
+            for _ in range(3):
+                start = rng.randrange(len(text))
+                term = text[start:start + rng.randint(1, 7)].strip()
+                if term:
+                    terms.add(term)
+    return sorted(terms)
+
+
+@pytest.mark.parametrize('limit', [routes.SEARCH_RESULT_LIMIT, 1000])
+def test_snapshot_search_matches_sql(conn, limit, monkeypatch):
+    monkeypatch.setattr(routes, 'SEARCH_RESULT_LIMIT', limit)
+    snapshot = KanjiSnapshot.load(conn, None)
+    terms = search_terms(conn)
+    assert len(terms) > 200
+    for term in terms:
+        assert snapshot.search_ids(term, limit) == routes._search_kanji_ids(conn.cursor(), term), term
+
+
+def test_snapshot_lookups(conn):
+    snapshot = KanjiSnapshot.load(conn, None)
+    payload = conn.execute("SELECT kanji_id, payload FROM kanji_payload WHERE kanji_char = '一'").fetchone()
+    assert snapshot.get_payload('一') == payload[1].encode('utf-8')
+    assert snapshot.get_payloads_by_id([payload[0], -1]) == {payload[0]: payload[1].encode('utf-8')}
+    assert snapshot.get_payloads(['一', 'x']) == {'一': payload[1].encode('utf-8')}